@@ -0,0 +1,7 @@
+"""
+Offline replay harness for the video pipeline.
+
+Runs the Script -> TTS -> Broll -> Render -> Upload chain in-process against
+deterministic stand-ins for Bedrock, Polly, S3, DynamoDB, Secrets Manager and
+YouTube. See harness/replay.py (single job) and harness/bench.py (baseline).
+"""
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Bulk script generation benchmark: per-job scriptFn calls vs. one Bedrock
+batch-inference job fanned out by batchFn.
+
+Both paths run against the in-process stand-ins. The per-job path pays
+``--latency`` seconds of simulated model time per call; the batch path's
+model time happens inside Bedrock and is not simulated, so its figures are
+the fan-in/fan-out overhead our code adds (JSONL build, S3 writes, cache
+entries, job-state transactions, execution starts).
+
+    python -m harness.batch_bench --jobs 500 --latency 0.5
+"""
+import argparse
+import json
+import time
+
+from harness import replay
+
+
+def _jobs(n: int):
+    return [{"jobId": f"bulk-{i:05d}", "topic": f"Bulk topic number {i} on dividend investing"} for i in range(n)]
+
+
+def per_job(jobs, words: int, latency: float) -> float:
+    env = replay.ReplayEnv(words=words, bedrock_latency=latency, trace_memory=False)
+    call = env._lambda("scriptFn")
+    t0 = time.perf_counter()
+    for job in jobs:
+        call(dict(job))
+    return time.perf_counter() - t0
+
+
+def batched(jobs, words: int, fail_every: int):
+    env = replay.ReplayEnv(words=words, trace_memory=False)
+    env.bedrock_batch.fail_every = fail_every
+    out = env.script_batch(jobs, batch_id="bench")
+    written = sum(1 for j in jobs if (replay.BUCKET, f"jobs/{j['jobId']}/script.txt") in env.s3.objects)
+    done = sum(1 for j in jobs if (env.table.get_item(Key={"jobId": j["jobId"]}).get("Item") or {})
+               .get("status") == "SCRIPT_DONE")
+    out.update(written=written, script_done=done, executions=len(env.sfn.executions),
+               bedrock_invokes=env.bedrock.calls["invoke_model"])
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Per-job vs. batch-inference script generation.")
+    ap.add_argument("--jobs", type=int, default=500)
+    ap.add_argument("--words", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.0,
+                    help="simulated seconds per on-demand invoke_model call (per-job path only)")
+    ap.add_argument("--fail-every", type=int, default=0, help="make every Nth batch record fail")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    jobs = _jobs(args.jobs)
+    serial = per_job(jobs, args.words, args.latency)
+    batch = batched(jobs, args.words, args.fail_every)
+    report = {"jobs": args.jobs, "per_job_s": serial, "batch": batch}
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+
+    print(f"{args.jobs} jobs, {args.words}-word scripts")
+    print(f"per-job scriptFn     : {serial:8.3f}s  ({args.jobs / serial:8.1f} jobs/s, "
+          f"{args.latency:.2f}s model latency per call)")
+    print(f"batch submit         : {batch['submit_s']:8.3f}s")
+    if "fanout_s" in batch:
+        print(f"batch fan-out        : {batch['fanout_s']:8.3f}s  ({args.jobs / batch['fanout_s']:8.1f} jobs/s)")
+    print(f"batch total (no model time): {batch['total_s']:.3f}s")
+    print(f"scripts written {batch['written']}, SCRIPT_DONE {batch['script_done']}, "
+          f"pipelines started {batch['executions']}, on-demand invokes {batch['bedrock_invokes']}")
+
+
+if __name__ == "__main__":
+    main()
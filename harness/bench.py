@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Baseline benchmark: replay jobs with scripts of varying length and report
+per-stage latency, S3 bytes moved and peak memory.
+
+    python -m harness.bench                       # table to stdout
+    python -m harness.bench --out baseline.json   # also save raw numbers
+    python -m harness.bench --compare baseline.json
+    python -m harness.bench --trace-memory        # Python heap peaks (separate pass)
+
+Latency runs leave tracemalloc off: tracing every allocation slows the
+stages it measures. Every performance change should quote the
+before/after from this script.
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+from harness.replay import BUCKET, ReplayEnv, critical_path
+
+DEFAULT_WORDS = [150, 450, 1500, 4500]
+
+
+def bench(words_list, repeats: int = 3, trace_memory: bool = False):
+    """
+    Returns {words: {"stages": {stage: {seconds, s3_read, s3_written, py_peak_kib,
+    rss_hwm_kib}}, "serial_s": float, "critical_path_s": float}}.
+    """
+    report = {}
+    for words in words_list:
+        env = ReplayEnv(words=words, trace_memory=trace_memory)
+        runs = []
+        for i in range(repeats):
+            # Handlers log freely; keep the report readable.
+            with contextlib.redirect_stdout(io.StringIO()):
+                # Distinct topics per run so the script cache doesn't short-circuit Bedrock.
+                runs.append(env.run_job(f"bench-{words}-{i:02d}", f"Benchmark topic {words} run {i}"))
+        per_stage = {}
+        for idx, first in enumerate(runs[0]):
+            if first.skipped:
+                per_stage[first.stage] = {"skipped": True}
+                continue
+            samples = [run[idx] for run in runs]
+            per_stage[first.stage] = {
+                "seconds": statistics.median(s.seconds for s in samples),
+                "s3_read": samples[-1].s3_read,
+                "s3_written": samples[-1].s3_written,
+                "py_peak_kib": max(s.py_peak_kib for s in samples),
+                "rss_hwm_kib": max(s.rss_hwm_kib for s in samples),
+            }
+        medians = {k: v.get("seconds", 0.0) for k, v in per_stage.items()}
+        report[str(words)] = {
+            "stages": per_stage,
+            "serial_s": sum(medians.values()),
+            "critical_path_s": critical_path(medians),
+        }
+    return report
+
+
+def bench_render_worker(jobs: int = 6, concurrency: int = 2):
+    """
+    One-shot renders back to back vs the warm worker (asset cache + concurrency)
+    over the same prepared jobs. Returns {"one_shot_s", "worker_s", "jobs", "concurrency"}.
+    """
+    env = ReplayEnv(words=450, trace_memory=False)
+    if not env.has_ffmpeg:
+        return {"skipped": True}
+    job_ids = [f"worker-{i:02d}" for i in range(jobs)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for job_id in job_ids:
+            for _, fn, _ in env.stages()[:3]:  # Script, TTS, Broll
+                fn({"jobId": job_id, "topic": "Worker benchmark"})
+        t0 = time.perf_counter()
+        for job_id in job_ids:
+            env.renderer.render_job(job_id, BUCKET)
+        one_shot = time.perf_counter() - t0
+        with tempfile.TemporaryDirectory() as cache:
+            worker = env.render_worker(job_ids, concurrency=concurrency, cache_dir=cache)
+    failed = [t for t, r in env.sfn.results.items() if r[0] != "success"]
+    if failed:
+        raise RuntimeError(f"worker renders failed: {failed}")
+    return {"one_shot_s": one_shot, "worker_s": worker, "jobs": jobs, "concurrency": concurrency}
+
+
+def format_report(report, baseline=None) -> str:
+    lines = []
+    for words, entry in report.items():
+        stages = entry["stages"]
+        lines.append(f"== script ~{words} words ==")
+        lines.append(f"{'stage':<8} {'median_s':>9} {'s3_read':>12} {'s3_written':>12} "
+                     f"{'py_peak_KiB':>12} {'rss_hwm_KiB':>12}" + ("   vs baseline" if baseline else ""))
+        for stage, m in stages.items():
+            if m.get("skipped"):
+                lines.append(f"{stage:<8} skipped (no ffmpeg)")
+                continue
+            line = (f"{stage:<8} {m['seconds']:>9.3f} {m['s3_read']:>12} {m['s3_written']:>12} "
+                    f"{m['py_peak_kib']:>12} {m['rss_hwm_kib']:>12}")
+            base = (baseline or {}).get(words, {}).get("stages", {}).get(stage)
+            if base and not base.get("skipped") and base["seconds"] > 0:
+                line += f"   {m['seconds'] / base['seconds']:.2f}x"
+            lines.append(line)
+        lines.append(f"serial {entry['serial_s']:.3f}s, critical path {entry['critical_path_s']:.3f}s")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline pipeline benchmark.")
+    ap.add_argument("--words", type=int, nargs="+", default=DEFAULT_WORDS)
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--trace-memory", action="store_true",
+                    help="record the Python heap peak per stage with tracemalloc (inflates the "
+                         "timings; run it as a separate pass from the latency baseline)")
+    ap.add_argument("--out", help="write raw results to this JSON file")
+    ap.add_argument("--compare", help="baseline JSON from an earlier --out")
+    ap.add_argument("--render-worker", type=int, metavar="JOBS",
+                    help="also compare JOBS one-shot renders against the warm worker pool")
+    ap.add_argument("--concurrency", type=int, default=2, help="worker concurrency for --render-worker")
+    args = ap.parse_args(argv)
+
+    report = bench(args.words, args.repeats, trace_memory=args.trace_memory)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    sys.stdout.write(format_report(report, baseline))
+    if args.render_worker:
+        w = bench_render_worker(args.render_worker, args.concurrency)
+        report["render_worker"] = w
+        if w.get("skipped"):
+            print("render worker: skipped (no ffmpeg)")
+        else:
+            print(f"render worker: {w['jobs']} jobs one-shot {w['one_shot_s']:.3f}s, "
+                  f"worker x{w['concurrency']} {w['worker_s']:.3f}s "
+                  f"({w['one_shot_s'] / w['worker_s']:.2f}x)")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
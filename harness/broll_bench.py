@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+B-roll acquisition benchmark: services/broll_pexels.py against the local
+Pexels/CDN stand-in (harness/pexels_standin.py), with ``--latency`` per
+request, ``--connect`` per new connection (TCP + TLS handshakes) and
+``--bandwidth`` per connection.
+
+  serial      one download at a time
+  no-pool     concurrent, but every request opens a new connection
+  pooled      concurrent over the shared keep-alive pool (what brollFn runs)
+  rerun       the same job again: every clip is already stored
+  overlap     a job with other terms whose results overlap the first job's,
+              including re-uploads of the same footage under new ids
+
+"4K bytes" is what fetching each chosen video's tallest rendition would
+have cost instead of the smallest one at --height.
+
+    python -m harness.broll_bench --clips 6 --latency 0.03 --connect 0.08 --bandwidth 25
+"""
+import argparse
+import time
+
+from harness import stubs
+from harness.pexels_standin import PexelsStandIn, make_library
+from harness.replay import BUCKET, _load
+
+TERMS = ["city skyline", "stock market", "coins"]
+OVERLAP_TERMS = ["interest rates", "real estate", "dividends"]
+
+
+class _NoKeepAlive:
+    """The pool's interface, closing the connection after every response."""
+
+    def __init__(self, http):
+        self.http = http
+
+    def request(self, method, url, headers=None, **kwargs):
+        return self.http.request(method, url, headers={**(headers or {}), "Connection": "close"}, **kwargs)
+
+
+def run(pexels, srv, s3, http, terms, args, library, workers=None):
+    client = pexels.PexelsClient(srv.api_key, http, base_url=srv.url)
+    srv.reset_counters()
+    t0 = time.perf_counter()
+    clips = pexels.acquire(client, s3, BUCKET, terms, count=args.clips, height=args.height,
+                           workers=workers or args.workers,
+                           part_size=args.part_mib * 1024 * 1024, log=lambda msg: None)
+    wall = time.perf_counter() - t0
+    tallest = {v["id"]: max(v["video_files"], key=lambda f: f["height"])["size"] for v in library}
+    return {"wall": wall, "clips": len(clips), "connections": srv.connections, "requests": srv.requests,
+            "fetched": sum(c["fetched"] for c in clips), "cdn": srv.bytes_sent,
+            "full": sum(tallest[c["pexelsId"]] for c in clips),
+            "source": sum(c["dedup"] == "source" for c in clips),
+            "content": sum(c["dedup"] == "content" for c in clips)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Concurrent pooled B-roll acquisition vs. serial and unpooled fetches.")
+    ap.add_argument("--clips", type=int, default=6)
+    ap.add_argument("--videos", type=int, default=16, help="stand-in library size")
+    ap.add_argument("--height", type=int, default=720)
+    ap.add_argument("--workers", type=int, default=6)
+    ap.add_argument("--mbps", type=float, default=5.0, help="720p bitrate of the stand-in files")
+    ap.add_argument("--latency", type=float, default=0.03, help="seconds per request")
+    ap.add_argument("--connect", type=float, default=0.08, help="seconds to open a connection")
+    ap.add_argument("--bandwidth", type=float, default=25.0, help="MB/s per connection")
+    ap.add_argument("--part-mib", type=int, default=8)
+    args = ap.parse_args(argv)
+
+    pexels = _load("bench_broll_pexels", "services/broll_pexels.py")
+    library = make_library(args.videos, mbps_720p=args.mbps, duplicates=3)
+    with PexelsStandIn(library, latency=args.latency, connect=args.connect, bandwidth=args.bandwidth * 1e6) as srv:
+        rows = []
+        serial_s3 = stubs.FakeS3()
+        rows.append(("serial", run(pexels, srv, serial_s3, pexels.pool(1), TERMS, args, library, workers=1)))
+        rows.append(("no-pool", run(pexels, srv, stubs.FakeS3(), _NoKeepAlive(pexels.pool(args.workers)),
+                                    TERMS, args, library)))
+        s3, http = stubs.FakeS3(), pexels.pool(args.workers)
+        rows.append(("pooled", run(pexels, srv, s3, http, TERMS, args, library)))
+        rows.append(("rerun", run(pexels, srv, s3, http, TERMS, args, library)))
+        rows.append(("overlap", run(pexels, srv, s3, http, OVERLAP_TERMS, args, library)))
+        stored = sum(len(o["Body"]) for (_, k), o in s3.objects.items() if k.startswith(pexels.PREFIX))
+        open_uploads = len(s3.uploads)
+
+    print(f"{args.clips} clips at >= {args.height}p, {args.workers} workers, {args.latency}s/request, "
+          f"{args.connect}s/connection, {args.bandwidth:g} MB/s per connection")
+    print(f"{'mode':<8} {'wall':>7} {'clips':>5} {'conns':>5} {'reqs':>5} {'fetched':>9} {'4K bytes':>9} "
+          f"{'stored':>6} {'dedup':>5}")
+    for mode, r in rows:
+        print(f"{mode:<8} {r['wall']:>6.2f}s {r['clips']:>5} {r['connections']:>5} {r['requests']:>5} "
+              f"{r['fetched'] / 1e6:>7.1f}MB {r['full'] / 1e6:>7.1f}MB {r['source']:>6} {r['content']:>5}")
+    print(f"bucket after pooled+rerun+overlap: {stored / 1e6:.1f} MB under {pexels.PREFIX}, "
+          f"{open_uploads} unfinished multipart upload(s)")
+
+
+if __name__ == "__main__":
+    main()
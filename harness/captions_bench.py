@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Caption timing benchmark for services/captions.py.
+
+Narrations are synthesized with known timing: every word is a tone whose
+length follows its letters (numbers by how they are read), with pauses of
+varying length at sentence and clause marks and occasional short gaps
+between words, chunked exactly as tts_handler chunks scripts. Each cue
+boundary is then placed three ways and compared with the true one (the
+middle of the pause between the two cues):
+
+  chars     chunk time split in proportion to characters
+  estimate  split by the speech_rate estimate only
+  aligned   boundaries placed on pauses in the PCM (what tts_handler runs)
+
+It also times cue generation per narration against what burning the same
+captions into the video costs the renderer (a libass ``subtitles`` filter on
+an otherwise identical 720p encode), when ffmpeg has the filter.
+
+    python -m harness.captions_bench --narrations 10 --words 450
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+from harness import stubs
+from harness.replay import _load
+
+RATE = 16000
+POOL = ("market yields income portfolio dividend property trust investors returns risk tax interest "
+        "rates leverage sector growth office retail housing payout capital account allowance pension "
+        "liquidity valuation exposure inflation currency diversified strategy").split()
+NUMBERS = ("2024", "2025", "3.5%", "12", "$100", "40%", "1.2", "90")
+
+
+def make_script(rng: random.Random, words: int) -> str:
+    sentences, n = [], 0
+    while n < words:
+        length = rng.randint(6, 30)
+        toks = [rng.choice(NUMBERS) if rng.random() < 0.06 else rng.choice(POOL) for _ in range(length)]
+        for i in range(3, length - 2, rng.randint(5, 9)):
+            toks[i] += rng.choice((",", ",", ";", " —"))
+        sentences.append(" ".join(toks).capitalize() + rng.choice((".", ".", ".", "?", "!")))
+        n += length
+    return " ".join(sentences)
+
+
+def _silence(seconds: float) -> bytes:
+    return b"\0\0" * int(seconds * RATE)
+
+
+def narrate(captions, speech_rate, text: str, rng: random.Random):
+    """(pcm, true boundaries between cue segments as chunk-relative seconds)."""
+    pcm, t, bounds = bytearray(_silence(0.05)), 0.05, []
+    parts = captions.segments(text)
+    for p, part in enumerate(parts):
+        words = part.split()
+        for w, word in enumerate(words):
+            core = word.strip(".,;:!?—")
+            if not core:
+                continue  # a dash: the pause was taken after the previous word
+            dur = (0.12 + 0.055 * len(core)) * rng.uniform(0.85, 1.15)
+            if any(c.isdigit() for c in core):
+                dur = 0.28 * speech_rate._number_words(core) * rng.uniform(0.9, 1.1)
+            pcm += stubs.synthetic_pcm(dur, RATE, freq=rng.uniform(120, 260))
+            t += int(dur * RATE) / RATE
+            last = w == len(words) - 1
+            if word[-1] in ".!?":
+                gap = rng.uniform(0.35, 0.6)
+            elif word[-1] in ",;:" or (not last and words[w + 1] == "—"):
+                gap = rng.uniform(0.15, 0.28)
+            else:
+                gap = rng.uniform(0.02, 0.14) if rng.random() < 0.3 else 0.0
+            pause_start = t
+            pcm += _silence(gap)
+            t += int(gap * RATE) / RATE
+            if last and p < len(parts) - 1:
+                bounds.append((pause_start + t) / 2)
+    pcm += _silence(0.3)
+    return bytes(pcm), bounds
+
+
+def _by_chars(text_parts, seconds):
+    total = sum(len(p) for p in text_parts)
+    out, acc = [], 0.0
+    for p in text_parts[:-1]:
+        acc += seconds * len(p) / total
+        out.append(acc)
+    return out
+
+
+def bench(narrations: int, words: int, seed: int):
+    captions = _load("bench_captions", "services/captions.py")
+    speech_rate = _load("bench_speech_rate", "services/speech_rate.py")
+    svc_chunk = _load("bench_chunk_app", "services/app.py")._chunk_text_for_polly
+    rng = random.Random(seed)
+    errors = {"chars": [], "estimate": [], "aligned": []}
+    align_ms, cue_counts, seconds_total = [], [], 0.0
+    for _ in range(narrations):
+        chunks = svc_chunk(make_script(rng, words), max_len=2500)
+        chunk_pcm, truth = [], []
+        for text in chunks:
+            pcm, bounds = narrate(captions, speech_rate, text, rng)
+            chunk_pcm.append(pcm)
+            truth.append(bounds)
+        seconds_total += sum(len(p) for p in chunk_pcm) / (2 * RATE)
+
+        t0 = time.perf_counter()
+        cues = captions.align(chunks, chunk_pcm, RATE)
+        align_ms.append((time.perf_counter() - t0) * 1000)
+        cue_counts.append(len(cues))
+        real_silences = captions.silences
+        captions.silences = lambda pcm, rate: []
+        try:
+            plain = captions.align(chunks, chunk_pcm, RATE)
+        finally:
+            captions.silences = real_silences
+
+        i = 0
+        for text, pcm, bounds in zip(chunks, chunk_pcm, truth):
+            n = len(captions.segments(text))
+            aligned = [c[1] for c in cues[i:i + n - 1]]
+            estimate = [c[1] for c in plain[i:i + n - 1]]
+            offset = cues[i][0]
+            chars = _by_chars(captions.segments(text), len(pcm) / (2 * RATE))
+            for name, got in (("aligned", aligned), ("estimate", estimate), ("chars", chars)):
+                rel = [g - offset for g in got] if name != "chars" else got
+                errors[name].extend(abs(g - b) for g, b in zip(rel, bounds))
+            i += n
+    return errors, align_ms, cue_counts, seconds_total / narrations, captions
+
+
+def burn_in_cost(captions, seconds: float, tmp: str):
+    """(plain encode s, encode with burned-in subtitles s), or None without libass."""
+    if not shutil.which("ffmpeg"):
+        return None
+    filters = subprocess.run(["ffmpeg", "-hide_banner", "-filters"], capture_output=True, text=True).stdout
+    if " subtitles " not in filters:
+        return None
+    cues = [(i * 4.0, i * 4.0 + 3.8, f"Caption line number {i} with a few more words") for i in range(int(seconds // 4))]
+    srt = os.path.join(tmp, "c.srt")
+    with open(srt, "w", encoding="utf-8") as f:
+        f.write(captions.srt(cues))
+    src = f"testsrc2=size=1280x720:rate=30:duration={seconds}"
+    out = []
+    for vf in ("null", f"subtitles={srt}"):
+        t0 = time.perf_counter()
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", src, "-vf", vf, "-c:v", "libx264",
+                        "-preset", "veryfast", "-crf", "23", os.path.join(tmp, "o.mp4")], check=True)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def _row(name, errs):
+    errs = sorted(errs)
+    within = sum(e <= 0.25 for e in errs) / len(errs)
+    return f"{name:<9} {statistics.mean(errs):>8.3f}s {errs[int(0.95 * (len(errs) - 1))]:>8.3f}s {within:>8.0%}"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Caption boundary accuracy and cost versus burned-in subtitles.")
+    ap.add_argument("--narrations", type=int, default=10)
+    ap.add_argument("--words", type=int, default=450)
+    ap.add_argument("--seed", type=int, default=11)
+    ap.add_argument("--burn-seconds", type=float, default=60.0, help="encode length for the burn-in comparison")
+    args = ap.parse_args(argv)
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    errors, align_ms, cue_counts, avg_sec, captions = bench(args.narrations, args.words, args.seed)
+    print(f"{args.narrations} narrations of ~{args.words} words (~{avg_sec:.0f}s, "
+          f"{statistics.mean(cue_counts):.0f} cues each), {len(errors['aligned'])} cue boundaries")
+    print(f"{'method':<9} {'mean err':>9} {'p95 err':>9} {'<=0.25s':>8}")
+    for name in ("chars", "estimate", "aligned"):
+        print(_row(name, errors[name]))
+    print(f"cue generation: {statistics.median(align_ms):.1f} ms per narration (median)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cost = burn_in_cost(captions, args.burn_seconds, tmp)
+    if cost is None:
+        print("burn-in comparison skipped (needs ffmpeg with the libass subtitles filter)")
+    else:
+        print(f"{args.burn_seconds:g}s 720p encode: {cost[0]:.2f}s plain, {cost[1]:.2f}s with burned-in subtitles "
+              f"(+{cost[1] - cost[0]:.2f}s per render, per variant)")
+
+
+if __name__ == "__main__":
+    main()
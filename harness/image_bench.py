@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Renderer image benchmark: image size and container-start-to-first-ffmpeg-frame.
+
+Builds renderer/ (unless --no-build), then runs the container with
+``--startup-probe`` several times and times, from ``docker run`` until the
+probe line appears, how long a fresh container takes to get a frame out of
+ffmpeg. The in-container figure (interpreter start to first frame) is
+reported alongside so image pull/create cost can be separated from Python
+start-up.
+
+    python -m harness.image_bench --runs 5
+    python -m harness.image_bench --tag renderer:old --no-build   # compare another image
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PROBE = re.compile(r"\[PROBE\] first frame ([\d.]+)s")
+
+
+def build(tag: str, context: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(["docker", "build", "-t", tag, context], check=True)
+    return time.perf_counter() - t0
+
+
+def image_size(tag: str) -> int:
+    out = subprocess.run(["docker", "image", "inspect", "-f", "{{.Size}}", tag],
+                         check=True, capture_output=True, text=True)
+    return int(out.stdout.strip())
+
+
+def probe_once(tag: str):
+    """Returns (wall seconds from docker run to probe line, in-container seconds)."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(["docker", "run", "--rm", tag, "--startup-probe"],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    inside = None
+    for line in proc.stdout:
+        m = _PROBE.search(line)
+        if m:
+            wall = time.perf_counter() - t0
+            inside = float(m.group(1))
+            break
+    proc.wait()
+    if inside is None:
+        raise RuntimeError(f"{tag} never printed the start-up probe line (exit {proc.returncode})")
+    return wall, inside
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Renderer image size and start-up benchmark.")
+    ap.add_argument("--tag", default="renderer:bench")
+    ap.add_argument("--context", default=os.path.join(ROOT, "renderer"))
+    ap.add_argument("--no-build", action="store_true", help="measure an existing image")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    build_s = None if args.no_build else build(args.tag, args.context)
+    size = image_size(args.tag)
+    samples = [probe_once(args.tag) for _ in range(args.runs)]
+    report = {
+        "tag": args.tag,
+        "build_s": build_s,
+        "image_bytes": size,
+        "start_to_first_frame_s": statistics.median(w for w, _ in samples),
+        "python_start_to_first_frame_s": statistics.median(i for _, i in samples),
+        "runs": args.runs,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"image {args.tag}: {size / 1024 ** 2:.1f} MiB")
+    if build_s is not None:
+        print(f"build: {build_s:.1f}s")
+    print(f"container start -> first ffmpeg frame (median of {args.runs}): "
+          f"{report['start_to_first_frame_s']:.3f}s "
+          f"(python start -> first frame {report['python_start_to_first_frame_s']:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
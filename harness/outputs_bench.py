@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Multi-output render benchmark: one ``split`` pass (render.build_outputs) vs.
+one ffmpeg run per deliverable, each decoding the inputs again.
+
+Inputs are local (synthetic 720p B-roll and a sine-tone narration), so the
+numbers are pure ffmpeg time. The per-deliverable commands use the same
+filters and encoder settings as build_outputs.
+
+    python -m harness.outputs_bench --seconds 60 --runs 3
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import wave
+
+from harness import stubs
+from harness.replay import _load, make_broll_mp4
+
+
+def _ffmpeg(cmd):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", *cmd], check=True)
+
+
+def separate_commands(render, timeline: str, tmp: str):
+    """Argument lists for producing each deliverable on its own."""
+    audio = ["-map", "1:a:0", "-c:a", "aac", "-shortest"]
+    thumbs = os.path.join(tmp, "sep-thumbs")
+    os.makedirs(thumbs, exist_ok=True)
+    _, main_args, _ = render.build_outputs(timeline, [], tmp, audio="1:a:0")
+    return {
+        "main": ["-filter_complex", f"{timeline},split=1[smain]", *main_args[:-1], os.path.join(tmp, "sep-main.mp4")],
+        "preview": ["-filter_complex", f"{timeline},scale=-2:360,fps=24[v]", "-map", "[v]", *audio, "-b:a", "64k",
+                    "-c:v", "libx264", "-preset", "veryfast", "-b:v", "400k", "-maxrate", "500k",
+                    "-bufsize", "1000k", os.path.join(tmp, "sep-preview.mp4")],
+        "thumbnails": ["-filter_complex", f"{timeline},scale=640:-2,select='isnan(prev_selected_t)"
+                       f"+gt(scene,0.3)*gte(t-prev_selected_t,1)+gte(t-prev_selected_t,{render.THUMB_INTERVAL})'[v]",
+                       "-map", "[v]", "-fps_mode", "vfr", "-frames:v", str(render.THUMB_COUNT),
+                       "-f", "image2", os.path.join(thumbs, "t_%02d.jpg")],
+        "vertical": ["-filter_complex", f"{timeline},crop=trunc(ih*9/16/2)*2:ih,scale=1080:1920,setsar=1[v]",
+                     "-map", "[v]", *audio, "-b:a", "192k",
+                     "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", os.path.join(tmp, "sep-vertical.mp4")],
+    }
+
+
+def bench(seconds: int, runs: int):
+    render = _load("bench_render", "renderer/render.py")
+    outputs = list(render.OUTPUT_KINDS)
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = os.path.join(tmp, "broll.mp4")
+        voice = os.path.join(tmp, "voice.wav")
+        make_broll_mp4(clip, seconds=seconds)
+        with wave.open(voice, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(16000)
+            wf.writeframes(stubs.synthetic_pcm(seconds))
+        inputs = ["-i", clip, "-i", voice]
+        timeline = f"[0:v]trim=start=0:end={seconds},setpts=PTS-STARTPTS"
+
+        def one_pass():
+            graph, args, _ = render.build_outputs(timeline, outputs, os.path.join(tmp, "one"), audio="1:a:0")
+            _ffmpeg([*inputs, "-filter_complex", graph, *args])
+
+        cmds = separate_commands(render, timeline, tmp)
+        per_output = {}
+
+        def separate():
+            for kind, cmd in cmds.items():
+                t0 = time.perf_counter()
+                _ffmpeg([*inputs, *cmd])
+                per_output.setdefault(kind, []).append(time.perf_counter() - t0)
+
+        def timed(fn):
+            t0 = time.perf_counter()
+            fn()
+            return time.perf_counter() - t0
+
+        os.makedirs(os.path.join(tmp, "one"), exist_ok=True)
+        single = statistics.median(timed(one_pass) for _ in range(runs))
+        apart = statistics.median(timed(separate) for _ in range(runs))
+    return {
+        "seconds": seconds, "one_pass_s": single, "separate_s": apart,
+        "per_output_s": {k: statistics.median(v) for k, v in per_output.items()},
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Single-decode multi-output render vs. one run per deliverable.")
+    ap.add_argument("--seconds", type=int, default=30, help="length of the synthetic timeline")
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    r = bench(args.seconds, args.runs)
+    print(f"{r['seconds']}s timeline: main + preview + thumbnails + vertical")
+    print(f"one split pass : {r['one_pass_s']:.2f}s")
+    print(f"separate runs  : {r['separate_s']:.2f}s  ("
+          + ", ".join(f"{k} {v:.2f}s" for k, v in r["per_output_s"].items()) + ")")
+    print(f"speed-up       : {r['separate_s'] / r['one_pass_s']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Local HTTP stand-in for the Pexels video API and its file CDN.
+
+A real server (HTTP/1.1 keep-alive, ranged responses), so
+services/broll_pexels.py runs its actual urllib3 request path:
+
+    GET /videos/search?query=<term>&per_page=<n>    Authorization: <api key>
+    GET /video-files/<fileId>.mp4                  Range: bytes=a-b -> 206, else 200
+
+The library is a list of videos shaped like the API's (``id``, ``duration``,
+``video_files`` with ``id``/``width``/``height``/``file_type``); ``size``
+and ``content`` on a file are stand-in only. A search returns a
+deterministic slice of the library per query, so different terms overlap
+the way real searches do. File bodies are pseudo-random bytes seeded by
+``content`` (files sharing a seed are byte-identical, like a Pexels
+re-upload) unless ``bodies`` maps a file id to real bytes.
+
+Every request sleeps ``latency`` seconds and every new connection
+``connect`` seconds (the handshakes a pool saves); ``bandwidth`` (bytes/s
+per connection) paces file bodies. ``connections``, ``requests`` and
+``bytes_sent`` count what the client cost the "CDN".
+
+    with PexelsStandIn(make_library(12)) as srv:
+        client = broll_pexels.PexelsClient(srv.api_key, broll_pexels.pool(), base_url=srv.url)
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BLOCK = 1024 * 1024
+RENDITIONS = ((640, 360, 0.25), (1280, 720, 1.0), (1920, 1080, 2.25), (3840, 2160, 9.0))  # size vs 720p
+
+
+def make_library(videos: int = 12, seconds: int = 15, mbps_720p: float = 3.0, duplicates: int = 2,
+                 seed: int = 7) -> list:
+    """
+    ``videos`` clips, each in four renditions (360p-2160p) sized by pixel
+    count from ``mbps_720p``. The last ``duplicates`` videos re-upload
+    earlier ones: same bytes under new video and file ids.
+    """
+    rng = random.Random(seed)
+    library = []
+    for v in range(videos):
+        vid = 1000 + v
+        source = vid - (videos - duplicates) if v >= videos - duplicates else vid
+        duration = seconds + rng.randint(0, 10)
+        files = []
+        for r, (w, h, scale) in enumerate(RENDITIONS):
+            files.append({"id": vid * 10 + r, "quality": "hd" if h >= 720 else "sd", "file_type": "video/mp4",
+                          "width": w, "height": h, "fps": 30,
+                          "size": int(mbps_720p * scale * duration * 1e6 / 8),
+                          "content": f"{source}-{r}"})
+        if source != vid:
+            # A re-upload is byte-identical, duration included.
+            duration = next(x["duration"] for x in library if x["id"] == source)
+            for f, orig in zip(files, next(x["video_files"] for x in library if x["id"] == source)):
+                f["size"] = orig["size"]
+        library.append({"id": vid, "width": 3840, "height": 2160, "duration": duration,
+                        "url": f"https://www.pexels.com/video/{vid}/", "video_files": files})
+    return library
+
+
+def _block(seed: str, index: int) -> bytes:
+    return random.Random(f"{seed}:{index}").randbytes(BLOCK)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.standin.lock:
+            self.server.standin.connections += 1
+        time.sleep(self.server.standin.connect)
+
+    def do_GET(self):
+        standin = self.server.standin
+        with standin.lock:
+            standin.requests += 1
+        time.sleep(standin.latency)
+        url = urlparse(self.path)
+        if url.path == "/videos/search":
+            if self.headers.get("Authorization") != standin.api_key:
+                return self._reply(401, b'{"error": "invalid api key"}', "application/json")
+            q = parse_qs(url.query)
+            with standin.lock:
+                standin.searches += 1
+            body = json.dumps(standin.search(q.get("query", [""])[0], int(q.get("per_page", ["15"])[0])))
+            return self._reply(200, body.encode("utf-8"), "application/json")
+        if url.path.startswith("/video-files/"):
+            f = standin.files.get(url.path.rsplit("/", 1)[-1].split(".")[0])
+            if f is None:
+                return self._reply(404, b"not found", "text/plain")
+            return self._file(f)
+        self._reply(404, b"{}", "application/json")
+
+    def _file(self, f: dict):
+        standin = self.server.standin
+        size = standin.size(f)
+        start, end, status = 0, size - 1, 200
+        rng = self.headers.get("Range")
+        if rng and standin.ranges and rng.startswith("bytes="):
+            a, _, b = rng[len("bytes="):].partition("-")
+            start, end, status = int(a), min(int(b) if b else size - 1, size - 1), 206
+            if start >= size:
+                return self._reply(416, b"", "text/plain", {"Content-Range": f"bytes */{size}"})
+        self.send_response(status)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        pos = start
+        while pos <= end:
+            piece = standin.read(f, pos, min(end + 1, pos + BLOCK) - pos)
+            t0 = time.perf_counter()
+            try:
+                self.wfile.write(piece)
+            except ConnectionError:
+                self.close_connection = True  # the client gave up on this file (e.g. over its size limit)
+                return
+            if standin.bandwidth:
+                time.sleep(max(0.0, len(piece) / standin.bandwidth - (time.perf_counter() - t0)))
+            pos += len(piece)
+            with standin.lock:
+                standin.bytes_sent += len(piece)
+
+    def _reply(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PexelsStandIn:
+    """API and CDN on one 127.0.0.1:<ephemeral port>, served from a daemon thread."""
+
+    def __init__(self, library: list, latency: float = 0.0, connect: float = 0.0, bandwidth: float = None,
+                 ranges: bool = True, bodies: dict = None, api_key: str = "standin-key"):
+        self.library = library
+        self.latency, self.connect, self.bandwidth, self.ranges = latency, connect, bandwidth, ranges
+        self.bodies = {str(k): v for k, v in (bodies or {}).items()}
+        self.api_key = api_key
+        self.files = {str(f["id"]): f for v in library for f in v["video_files"]}
+        self.connections = self.requests = self.searches = self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def reset_counters(self):
+        with self.lock:
+            self.connections = self.requests = self.searches = self.bytes_sent = 0
+
+    def size(self, f: dict) -> int:
+        body = self.bodies.get(str(f["id"]))
+        return len(body) if body is not None else f["size"]
+
+    def read(self, f: dict, pos: int, n: int) -> bytes:
+        body = self.bodies.get(str(f["id"]))
+        if body is not None:
+            return body[pos:pos + n]
+        out, index = bytearray(), pos // BLOCK
+        while len(out) < n + pos % BLOCK:
+            out += _block(f["content"], index)
+            index += 1
+        return bytes(out[pos % BLOCK:pos % BLOCK + n])
+
+    def search(self, query: str, per_page: int) -> dict:
+        """A deterministic, query-dependent window over the library (wrapping)."""
+        start = int(hashlib.md5(query.encode("utf-8")).hexdigest(), 16) % max(1, len(self.library))
+        picked = [self.library[(start + i) % len(self.library)] for i in range(min(per_page, len(self.library)))]
+        videos = []
+        for v in picked:
+            files = [{k: f[k] for k in ("id", "quality", "file_type", "width", "height", "fps")}
+                     for f in v["video_files"]]
+            for out, f in zip(files, v["video_files"]):
+                out["link"] = f"{self.url}/video-files/{f['id']}.mp4"
+            videos.append({**{k: v[k] for k in ("id", "width", "height", "duration", "url")}, "video_files": files})
+        return {"page": 1, "per_page": per_page, "total_results": len(self.library), "videos": videos}
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Fit the render cost model (services/render_sizing.py) on local synthetic renders.
+
+Each deliverable profile is rendered at several timeline lengths with the
+renderer's own filter graph and encoder settings (render.build_outputs),
+pinned to 1 core and, where the host has them, to 2 and 4 cores with
+``taskset``, keeping the fastest of ``--repeats`` runs; one encode-once +
+audio mux run measures the per-variant cost. Synthetic renders have no
+downloads, so base_s and per_clip_s come only from real samples, and alpha
+only from a host with more than one core; otherwise they are kept from the
+packaged model.
+The samples have the layout the renderer writes to
+metrics/render-cost/<jobId>.json, so real jobs can be folded in:
+
+    aws s3 sync s3://$MEDIA_BUCKET/metrics/render-cost/ samples/
+    python -m harness.render_cost_bench --samples samples/ --write
+
+``--write`` replaces services/render_cost_model.json (the packaged default);
+upload the file to s3://$MEDIA_BUCKET/config/render-cost-model.json to
+override a deployed stack without redeploying.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+import wave
+
+from harness import stubs
+from harness.replay import _load, make_broll_mp4
+
+PROFILES = ([], ["preview", "thumbnails"], ["preview", "thumbnails", "vertical"])
+EXAMPLE_JOBS = (("15s remux-like", 15, 1), ("3 min", 180, 1), ("10 min, 6 clips", 600, 6))
+
+
+def _pin(cores: int):
+    return ["taskset", "-c", f"0-{cores - 1}"] if shutil.which("taskset") else []
+
+
+def _core_counts(limit: int):
+    have = os.cpu_count() or 1
+    counts = [c for c in (1, 2, 4) if c <= have and c <= limit]
+    return counts if shutil.which("taskset") else [1]
+
+
+def measure(render, seconds_list, cores_list, tmp: str, repeats: int = 3):
+    longest = max(seconds_list)
+    clip = os.path.join(tmp, "broll.mp4")
+    voice = os.path.join(tmp, "voice.wav")
+    make_broll_mp4(clip, seconds=longest)
+    with wave.open(voice, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(stubs.synthetic_pcm(longest))
+
+    samples = []
+    for outputs in PROFILES:
+        profile = "+".join(["main", *sorted(outputs)])
+        for cores in cores_list:
+            for seconds in seconds_list:
+                work = tempfile.mkdtemp(dir=tmp)
+                timeline = f"[0:v]trim=start=0:end={seconds},setpts=PTS-STARTPTS"
+                graph, args, files = render.build_outputs(timeline, outputs, work, audio="1:a:0")
+                encode, rss = None, 0
+                for _ in range(max(1, repeats)):
+                    t0 = time.perf_counter()
+                    rss = max(rss, render.run_ffmpeg([*_pin(cores), "ffmpeg", "-y", "-v", "error", "-i", clip,
+                                                      "-i", voice, "-filter_complex", graph, *args]))
+                    took = time.perf_counter() - t0
+                    encode = took if encode is None else min(encode, took)
+                samples.append({"profile": profile, "cores": cores, "clips": 1, "variants": 1,
+                                "outputSec": seconds, "encodeSec": round(encode, 3), "rssMiB": rss})
+                print(f"  {profile:<36} {cores} core(s) {seconds:>4}s -> {encode:6.2f}s  {rss} MiB", flush=True)
+
+                if outputs == [] and cores == 1 and seconds == longest:
+                    # Encode-once variants: the same video plus one stream-copy/AAC mux per extra narration.
+                    t1 = time.perf_counter()
+                    render.run_ffmpeg(["ffmpeg", "-y", "-v", "error", "-i", files["main"], "-i", voice,
+                                       "-map", "0:v:0", "-map", "1:a:0", "-shortest", "-c:v", "copy",
+                                       "-c:a", "aac", "-b:a", "192k", os.path.join(work, "mux.mp4")])
+                    samples.append({"profile": profile, "cores": 1, "clips": 1, "variants": 2,
+                                    "outputSec": seconds, "encodeSec": round(encode + time.perf_counter() - t1, 3),
+                                    "rssMiB": rss})
+    return samples
+
+
+def load_samples(directory: str):
+    out = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            out.append(json.load(f))
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fit the render cost model used to size render tasks.")
+    ap.add_argument("--seconds", type=int, nargs="+", default=[5, 10, 20], help="synthetic timeline lengths")
+    ap.add_argument("--max-cores", type=int, default=4)
+    ap.add_argument("--repeats", type=int, default=3, help="runs per render; the fastest is kept")
+    ap.add_argument("--samples", help="directory of real metrics/render-cost/*.json samples to include")
+    ap.add_argument("--no-synthetic", action="store_true", help="fit from --samples only")
+    ap.add_argument("--write", action="store_true", help="write services/render_cost_model.json")
+    args = ap.parse_args(argv)
+
+    render = _load("cost_render", "renderer/render.py")
+    sizing = _load("cost_sizing", "services/render_sizing.py")
+    render.log = lambda msg: None  # keep the ffmpeg command lines out of the report
+
+    samples = []
+    if not args.no_synthetic:
+        cores = _core_counts(args.max_cores)
+        print(f"Synthetic renders on {cores} core(s):")
+        with tempfile.TemporaryDirectory() as tmp:
+            samples += measure(render, sorted(args.seconds), cores, tmp, args.repeats)
+    if args.samples:
+        real = load_samples(args.samples)
+        print(f"{len(real)} real sample(s) from {args.samples}")
+        samples += real
+    if not samples:
+        raise SystemExit("no samples")
+
+    try:
+        base = sizing.load_model()
+    except FileNotFoundError:
+        base = None
+    model = sizing.fit(samples, base=base)
+    print(json.dumps(model, indent=2))
+    if len({s["cores"] for s in samples}) == 1:
+        print(f"(alpha kept at {model['alpha']}: all samples ran on {samples[0]['cores']} core(s))")
+    if not any("wallSec" in s for s in samples):
+        print(f"(base_s {model['base_s']} and per_clip_s {model['per_clip_s']} kept: no wall times; "
+              f"add real samples with --samples)")
+
+    print(f"\n{'job':<18} {'profile':<36} " + "  ".join(f"{name:>8}" for name, _, _ in sizing.SIZES) + "  choice")
+    for label, seconds, clips in EXAMPLE_JOBS:
+        for outputs in PROFILES:
+            profile = sizing.profile_of(outputs)
+            preds = [sizing.predict(model, seconds, clips, profile, vcpu) for _, vcpu, _ in sizing.SIZES]
+            choice = sizing.choose(model, seconds, clips, profile)
+            print(f"{label:<18} {profile:<36} " + "  ".join(f"{p:>7.0f}s" for p in preds) + f"  {choice['size']}")
+
+    if args.write:
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "services", "render_cost_model.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(model, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
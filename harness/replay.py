@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Replay one job through Script -> TTS -> Broll -> Render -> Upload in-process.
+
+The real handler modules (services/app.py, renderer/render.py,
+lambdas/uploadFn/app.py) are imported unchanged; only their module-level
+clients are swapped for the stand-ins in harness/stubs.py. The render stage
+needs ``ffmpeg`` on PATH and is skipped (and reported as such) without it.
+
+    python -m harness.replay --words 450
+"""
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict, field
+
+from harness import stubs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUCKET = "replay-media"
+TABLE = "replay-jobs"
+PIPELINE_ARN = "arn:aws:states:us-east-1:000000000000:stateMachine:replay-pipeline"
+BROLL_KEY = "broll/default.mp4"
+
+# Stage -> prerequisites. Mirrors the state machine in infra/lib/workflow-stack.ts
+# (TTS and Broll are parallel branches of the Prepare state).
+PIPELINE_DAG = {
+    "Script": [],
+    "TTS": ["Script"],
+    "Broll": ["Script"],
+    "Render": ["TTS", "Broll"],
+    "Upload": ["Render"],
+}
+
+
+def _load(name: str, rel_path: str):
+    """Import a handler file under a unique module name (two of them are app.py)."""
+    path = os.path.join(ROOT, rel_path)
+    sys.path.insert(0, os.path.dirname(path))
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        mod = importlib.util.module_from_spec(spec)
+        sys.modules[name] = mod
+        spec.loader.exec_module(mod)
+        return mod
+    finally:
+        sys.path.pop(0)
+
+
+class _Context:
+    """The only Lambda context attribute the dispatcher reads."""
+
+    def __init__(self, function_name: str):
+        self.function_name = function_name
+
+
+@dataclass
+class StageResult:
+    stage: str
+    seconds: float
+    s3_read: int
+    s3_written: int
+    py_peak_kib: int
+    rss_hwm_kib: int
+    skipped: bool = False
+    result: dict = field(default_factory=dict)
+
+
+def _rss_hwm_kib() -> int:
+    # ru_maxrss is KiB on Linux; children covers ffmpeg.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, kids)
+
+
+def make_broll_mp4(path: str, seconds: int = 15):
+    """Synthetic 720p test pattern used as broll/default.mp4."""
+    subprocess.run(
+        ["ffmpeg", "-y", "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={seconds}",
+         "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, check=True,
+    )
+
+
+class ReplayEnv:
+    """
+    Wires stand-ins into freshly imported handler modules. One env can replay
+    many jobs; the fake bucket/table persist between them.
+    """
+
+    def __init__(self, words: int = 300, bedrock_latency: float = 0.0,
+                 polly_latency: float = 0.0, trace_memory: bool = False,
+                 words_spread: float = 0.0, script_candidates: int = 1, script_rounds: int = 1):
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "replay")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "replay")
+        os.environ["MEDIA_BUCKET"] = BUCKET
+        os.environ["JOBS_TABLE"] = TABLE
+
+        self.trace_memory = trace_memory
+        self.has_ffmpeg = shutil.which("ffmpeg") is not None
+
+        self.s3 = stubs.FakeS3()
+        self.table = stubs.FakeTable("jobId", name=TABLE,
+                                     indexes={"byInflightStatus": ("inflightStatus", "updatedAt")})
+        self.bedrock = stubs.FakeBedrock(words=words, latency=bedrock_latency, spread=words_spread)
+        self.polly = stubs.FakePolly(latency=polly_latency)
+        self.secrets = stubs.FakeSecrets({
+            "youtube/oauth": {"refresh_token": "r", "client_id": "c", "client_secret": "s"},
+        })
+        self.youtube = stubs.FakeYouTube()
+        self.bedrock_batch = stubs.FakeBedrockBatch(self.s3, words=words)
+        self.sfn = stubs.FakeStepFunctions()
+
+        # One draft per job unless asked: the stage timings stay comparable across benches.
+        self.script_candidates, self.script_rounds = script_candidates, script_rounds
+
+        self.services = _load("replay_services_app", "services/app.py")
+        self.renderer = _load("replay_render", "renderer/render.py")
+        self.uploader = _load("replay_upload_app", "lambdas/uploadFn/app.py")
+        self._patch()
+        self._seed()
+
+    def _patch(self):
+        svc = self.services
+        svc.MEDIA_BUCKET = BUCKET
+        svc.s3 = svc._s3 = self.s3
+        svc.bedrock = self.bedrock
+        svc.polly = self.polly
+        svc.secrets = self.secrets
+        svc.ddb = self.table
+        svc.bedrock_ctl = self.bedrock_batch
+        svc.sfn = self.sfn
+        svc.PIPELINE_ARN = PIPELINE_ARN
+        svc.BATCH_ROLE_ARN = "arn:aws:iam::000000000000:role/replay-bedrock-batch"
+        svc.SCRIPT_CANDIDATES = self.script_candidates
+        svc.SCRIPT_ROUNDS = self.script_rounds
+
+        self.renderer.s3 = self.s3
+        self.renderer.JOBS_TABLE = TABLE
+        self.renderer._ddb = self.table.meta.client
+
+        up = self.uploader
+        up.MEDIA_BUCKET = BUCKET
+        up.S3 = self.s3
+        up.SECRETS = self.secrets
+        up.JOBS_TABLE = TABLE
+        up.DDB = self.table.meta.client
+        up.MediaFileUpload = stubs.FakeMediaFileUpload
+        up._youtube_service = lambda secret: self.youtube
+
+    def _seed(self):
+        if not self.has_ffmpeg:
+            # brollFn checks that every clip exists; Render and Upload are skipped
+            # without ffmpeg, so a placeholder object is enough.
+            self.s3.put_object(Bucket=BUCKET, Key=BROLL_KEY, Body=b"placeholder: no ffmpeg", ContentType="video/mp4")
+            self.s3.bytes_written = 0
+            return
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "default.mp4")
+            make_broll_mp4(path)
+            self.s3.upload_file(path, BUCKET, BROLL_KEY, ExtraArgs={"ContentType": "video/mp4"})
+        # Seeding is setup, not pipeline traffic.
+        self.s3.bytes_written = 0
+
+    # -- stages --
+    def _lambda(self, fn_name: str):
+        return lambda job: self.services.handler(job, _Context(fn_name))
+
+    def _render(self, job: dict):
+        os.environ["JOB_ID"] = job["jobId"]
+        self.renderer.main()
+        return {"outKey": f"jobs/{job['jobId']}/out.mp4"}
+
+    def _upload(self, job: dict):
+        return self.uploader.lambda_handler({"jobId": job["jobId"]}, None)
+
+    def stages(self):
+        return [
+            ("Script", self._lambda("scriptFn"), False),
+            ("TTS", self._lambda("ttsFn"), False),
+            ("Broll", self._lambda("brollFn"), False),
+            ("Render", self._render, True),
+            ("Upload", self._upload, True),
+        ]
+
+    def _run_stage(self, name: str, fn, job: dict) -> StageResult:
+        r0, w0 = self.s3.bytes_read, self.s3.bytes_written
+        if self.trace_memory:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        try:
+            out = fn(job) or {}
+        finally:
+            elapsed = time.perf_counter() - t0
+            peak = 0
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+        return StageResult(
+            stage=name,
+            seconds=elapsed,
+            s3_read=self.s3.bytes_read - r0,
+            s3_written=self.s3.bytes_written - w0,
+            py_peak_kib=peak // 1024,
+            rss_hwm_kib=_rss_hwm_kib(),
+            result=out,
+        )
+
+    def render_worker(self, job_ids, concurrency: int = 2, cache_dir: str = None) -> float:
+        """
+        Queue already-prepared jobs and drain them with render.worker_loop.
+        Returns wall seconds; callbacks land in ``self.sfn.results``.
+        """
+        self.sqs = stubs.FakeSQS()
+        for job_id in job_ids:
+            self.sqs.send_message(QueueUrl="replay-render",
+                                  MessageBody=json.dumps({"jobId": job_id, "taskToken": f"token-{job_id}"}))
+        self.renderer.ASSET_CACHE_DIR = cache_dir
+        t0 = time.perf_counter()
+        try:
+            self.renderer.worker_loop("replay-render", concurrency=concurrency, max_idle_polls=1,
+                                      sqs=self.sqs, sfn=self.sfn)
+        finally:
+            self.renderer.ASSET_CACHE_DIR = None
+        return time.perf_counter() - t0
+
+    def script_batch(self, jobs, batch_id: str = "replay"):
+        """
+        Drive batchFn the way the ScriptBatch state machine does:
+        submit -> poll until done -> fanout. Returns {phase: seconds, ...}
+        plus the submit/fanout results.
+        """
+        call = self._lambda("batchFn")
+        t0 = time.perf_counter()
+        sub = call({"action": "submit", "batchId": batch_id, "jobs": jobs})
+        t1 = time.perf_counter()
+        out = {"submit_s": t1 - t0, "submit": sub, "polls": 0}
+        if "jobArn" in sub:
+            while not call({"action": "poll", "jobArn": sub["jobArn"]})["done"]:
+                out["polls"] += 1
+            t2 = time.perf_counter()
+            out["fanout"] = call({"action": "fanout", "batchId": batch_id})
+            out["fanout_s"] = time.perf_counter() - t2
+        out["total_s"] = time.perf_counter() - t0
+        return out
+
+    def run_job(self, job_id: str, topic: str):
+        job = {"jobId": job_id, "topic": topic}
+        results = []
+        for name, fn, needs_ffmpeg in self.stages():
+            if needs_ffmpeg and not self.has_ffmpeg:
+                results.append(StageResult(name, 0.0, 0, 0, 0, _rss_hwm_kib(), skipped=True))
+                continue
+            results.append(self._run_stage(name, fn, job))
+        return results
+
+
+def critical_path(seconds: dict, dag: dict = PIPELINE_DAG) -> float:
+    """
+    Wall time of the workflow if every stage starts as soon as its
+    prerequisites finish. ``seconds`` maps stage -> measured duration.
+    """
+    finish = {}
+
+    def _finish(stage):
+        if stage not in finish:
+            start = max((_finish(dep) for dep in dag.get(stage, [])), default=0.0)
+            finish[stage] = start + seconds.get(stage, 0.0)
+        return finish[stage]
+
+    return max((_finish(stage) for stage in dag), default=0.0)
+
+
+def format_results(results) -> str:
+    lines = [f"{'stage':<8} {'seconds':>9} {'s3_read':>12} {'s3_written':>12} {'py_peak_KiB':>12} {'rss_hwm_KiB':>12}"]
+    for r in results:
+        if r.skipped:
+            lines.append(f"{r.stage:<8} {'skipped (no ffmpeg)':>9}")
+            continue
+        lines.append(f"{r.stage:<8} {r.seconds:>9.3f} {r.s3_read:>12} {r.s3_written:>12} "
+                     f"{r.py_peak_kib:>12} {r.rss_hwm_kib:>12}")
+    total = sum(r.seconds for r in results)
+    lines.append(f"{'serial':<8} {total:>9.3f}")
+    lines.append(f"{'critical':<8} {critical_path({r.stage: r.seconds for r in results}):>9.3f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay one job through the pipeline offline.")
+    ap.add_argument("--job-id", default="replay-0001")
+    ap.add_argument("--topic", default="Investments in REITs for 2025: risks, yields, tax treatment (US/CA/UK/EU/AU/NZ)")
+    ap.add_argument("--words", type=int, default=300, help="length of the canned Bedrock script")
+    ap.add_argument("--bedrock-latency", type=float, default=0.0)
+    ap.add_argument("--polly-latency", type=float, default=0.0)
+    ap.add_argument("--trace-memory", action="store_true",
+                    help="record the Python heap peak per stage (tracemalloc slows every stage down)")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args(argv)
+
+    env = ReplayEnv(words=args.words, bedrock_latency=args.bedrock_latency,
+                    polly_latency=args.polly_latency, trace_memory=args.trace_memory)
+    results = env.run_job(args.job_id, args.topic)
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2, default=str))
+    else:
+        print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
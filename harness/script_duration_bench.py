@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Duration targeting benchmark for script_handler: how often the chosen script
+lands in the brief's target range, and what that costs in drafts and wall
+time, for one-shot generation versus n-best candidates and regeneration.
+
+Drafts come from FakeBedrock with a length spread (real models miss a
+requested word count by a similar margin) and ``--latency`` per call, so
+concurrent candidates show their wall-time cost. Each job's script is
+narrated with FakePolly afterwards, which feeds the speech-rate calibration
+the next job's estimates use; "est err" compares the estimate the script
+stage made with the narration's actual length. One candidate in one round
+is the plain, untargeted prompt; its drafts are scored against the brief's
+range here, with the calibration as it stands.
+
+    python -m harness.script_duration_bench --jobs 20 --spread 0.35
+"""
+import argparse
+import statistics
+import time
+
+from harness.replay import ReplayEnv, _Context
+
+MODES = ((1, 1), (1, 2), (3, 1), (3, 2))   # (candidates, rounds)
+
+
+def run_mode(candidates: int, rounds: int, jobs: int, words: int, spread: float, latency: float):
+    env = ReplayEnv(words=words, words_spread=spread, bedrock_latency=latency, trace_memory=False,
+                    script_candidates=candidates, script_rounds=rounds)
+    svc = env.services
+    svc.print = lambda *a, **k: None  # keep the per-job log lines out of the report
+    in_range, walls, errors = 0, [], []
+    for n in range(jobs):
+        job = {"jobId": f"dur-{candidates}x{rounds}-{n:03d}", "topic": f"Duration bench topic {n}",
+               "scriptCache": False}
+        t0 = time.perf_counter()
+        out = svc.handler(job, _Context("scriptFn"))
+        walls.append(time.perf_counter() - t0)
+        if "inRange" not in out:  # untargeted: score the draft the way the targeted modes do
+            text = svc._s3_get_text(svc.MEDIA_BUCKET, out["scriptKey"])
+            miss, _, est = svc._score_script(text, svc._speech_coefs(svc._script_voices(job)),
+                                             svc._target_range())
+            out.update(inRange=miss == 0.0, estimatedSec=est)
+        in_range += out["inRange"]
+        svc.handler(job, _Context("ttsFn"))
+        manifest = svc.job_manifest.load(env.s3, svc.MEDIA_BUCKET, job["jobId"], env.table)[0]
+        seconds = manifest["artifacts"]["voice"]["seconds"]
+        errors.append(abs(list(out["estimatedSec"].values())[0] - seconds) / seconds)
+    return {
+        "mode": f"{candidates} x {rounds}",
+        "in_range": in_range / jobs,
+        "drafts_per_job": env.bedrock.calls["invoke_model"] / jobs,
+        "wall_p50": statistics.median(walls),
+        "wall_max": max(walls),
+        "est_err": statistics.mean(errors),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="In-range rate and cost of n-best script generation.")
+    ap.add_argument("--jobs", type=int, default=20)
+    ap.add_argument("--words", type=int, default=500, help="mean draft length (~200 s at 2.5 words/s)")
+    ap.add_argument("--spread", type=float, default=0.35, help="draft length spread, +/- fraction")
+    ap.add_argument("--latency", type=float, default=0.2, help="simulated seconds per Bedrock call")
+    args = ap.parse_args(argv)
+
+    print(f"{args.jobs} jobs, drafts of {args.words} words +/- {args.spread:.0%}, {args.latency}s per call")
+    print(f"{'cand x rounds':<14} {'in range':>8} {'drafts/job':>10} {'wall p50':>9} {'max':>7} {'est err':>8}")
+    for candidates, rounds in MODES:
+        r = run_mode(candidates, rounds, args.jobs, args.words, args.spread, args.latency)
+        print(f"{r['mode']:<14} {r['in_range']:>8.0%} {r['drafts_per_job']:>10.2f} {r['wall_p50']:>8.3f}s "
+              f"{r['wall_max']:>6.3f}s {r['est_err']:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
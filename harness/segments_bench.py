@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Branded segment benchmark: a job framed by an intro and an outro, rendered
+two ways with the renderer's own encoder settings (renderer/render.py).
+
+  reencode  intro + middle + outro through one concat filter, all encoded per job
+  segments  only the middle encoded in the locked format, then joined with the
+            pre-encoded segments by the concat demuxer (stream copy)
+
+Reports wall time per job for several middle lengths; the segments are
+encoded once up front, as the library would be.
+
+    python -m harness.segments_bench --intro 8 --outro 12 --middle 10 30 60
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from harness.replay import _load, make_broll_mp4
+
+
+def _source(path: str, seconds: float, size: str = "1280x720"):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=30:duration={seconds}",
+                    "-f", "lavfi", "-i", f"sine=f=440:r=48000:d={seconds}", "-shortest",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", path], check=True)
+
+
+def _voice(path: str, seconds: float):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"sine=f=220:r=16000:d={seconds}",
+                    "-c:a", "pcm_s16le", path], check=True)
+
+
+def _locked(render, fmt, src: str, dst: str):
+    """What render.encode_segment runs, without the upload."""
+    render.run_ffmpeg(["ffmpeg", "-y", "-v", "error", "-i", src,
+                       "-filter_complex", f"[0:v]{render.locked_video_filter(fmt)}[v]", "-map", "[v]", "-map", "0:a:0",
+                       *render.locked_video_args(fmt), *render.locked_audio_args(fmt), dst])
+
+
+def bench(intro_s: float, outro_s: float, middles, tmp: str):
+    render = _load("segments_render", "renderer/render.py")
+    render.log = lambda msg: None
+    fmt = render.segment_format()
+    intro_src, outro_src = os.path.join(tmp, "intro_src.mp4"), os.path.join(tmp, "outro_src.mp4")
+    _source(intro_src, intro_s)
+    _source(outro_src, outro_s)
+    intro, outro = os.path.join(tmp, "intro.mp4"), os.path.join(tmp, "outro.mp4")
+    t0 = time.perf_counter()
+    _locked(render, fmt, intro_src, intro)
+    _locked(render, fmt, outro_src, outro)
+    library_s = time.perf_counter() - t0
+
+    rows = []
+    for middle_s in middles:
+        clip, voice = os.path.join(tmp, f"clip{middle_s}.mp4"), os.path.join(tmp, f"voice{middle_s}.wav")
+        make_broll_mp4(clip, seconds=middle_s)
+        _voice(voice, middle_s)
+        timeline = f"[0:v]trim=start=0:end={middle_s},setpts=PTS-STARTPTS"
+
+        # Per-job compositing: the branding is decoded and encoded again every time.
+        t0 = time.perf_counter()
+        lock = render.locked_video_filter(fmt)
+        graph = (f"[2:v]{lock}[v0];{timeline},{lock}[v1];[3:v]{lock}[v2];"
+                 f"[2:a]aresample=48000[a0];[1:a]aresample=48000,aformat=channel_layouts=stereo[a1];"
+                 f"[3:a]aresample=48000[a2];[v0][a0][v1][a1][v2][a2]concat=n=3:v=1:a=1[v][a]")
+        render.run_ffmpeg(["ffmpeg", "-y", "-v", "error", "-i", clip, "-i", voice, "-i", intro, "-i", outro,
+                           "-filter_complex", graph, "-map", "[v]", "-map", "[a]",
+                           *render.locked_video_args(fmt), *render.locked_audio_args(fmt),
+                           os.path.join(tmp, "reencode.mp4")])
+        reencode_s = time.perf_counter() - t0
+
+        # Segment path: the middle only, then stream copy.
+        work = tempfile.mkdtemp(dir=tmp)
+        t0 = time.perf_counter()
+        graph, args, files = render.build_outputs(timeline, [], work, audio="1:a:0", locked=fmt)
+        render.run_ffmpeg(["ffmpeg", "-y", "-v", "error", "-i", clip, "-i", voice, "-filter_complex", graph, *args])
+        encode_s = time.perf_counter() - t0
+        render.join_segments(files["main"], [intro], [outro])
+        segments_s = time.perf_counter() - t0
+        rows.append({"middle": middle_s, "reencode": reencode_s, "segments": segments_s,
+                     "join": segments_s - encode_s})
+    return library_s, rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Per-job cost of branded intro/outro: re-encode vs. stream-copy join.")
+    ap.add_argument("--intro", type=float, default=8.0)
+    ap.add_argument("--outro", type=float, default=12.0)
+    ap.add_argument("--middle", type=int, nargs="+", default=[10, 30, 60], help="job-specific seconds")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library_s, rows = bench(args.intro, args.outro, args.middle, tmp)
+    print(f"intro {args.intro:g}s + outro {args.outro:g}s encoded once into the library in {library_s:.2f}s")
+    print(f"{'middle':>7} {'reencode':>9} {'segments':>9} {'(join)':>7} {'saved':>6}")
+    for r in rows:
+        print(f"{r['middle']:>6}s {r['reencode']:>8.2f}s {r['segments']:>8.2f}s {r['join']:>6.2f}s "
+              f"{1 - r['segments'] / r['reencode']:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
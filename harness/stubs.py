@@ -0,0 +1,812 @@
+"""
+Deterministic in-process stand-ins for the AWS / Google clients the pipeline uses.
+
+Each stand-in implements only the subset of the real client API that the
+handlers call, and counts calls and bytes so the harness can report how much
+data every stage moves.
+"""
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import struct
+import threading
+import time
+from collections import Counter, deque
+
+from botocore.exceptions import ClientError
+
+
+def _client_error(code: str, status: int, op: str, msg: str = "") -> ClientError:
+    return ClientError(
+        {"Error": {"Code": code, "Message": msg or code},
+         "ResponseMetadata": {"HTTPStatusCode": status}},
+        op,
+    )
+
+
+class _Body:
+    """Minimal StreamingBody: read() / iter_chunks() / close()."""
+
+    def __init__(self, data: bytes, on_read=None):
+        self._buf = io.BytesIO(data)
+        self._on_read = on_read
+
+    def read(self, amt=None):
+        chunk = self._buf.read() if amt is None else self._buf.read(amt)
+        if self._on_read:
+            self._on_read(len(chunk))
+        return chunk
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        self._buf.close()
+
+
+# -------- S3 --------
+
+class FakeS3:
+    """
+    In-memory S3 keyed by (bucket, key). Counts bytes read and written so the
+    harness can attribute data movement to each stage.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = Counter()
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.uploads = {}       # open multipart uploads by id
+        self.parts_bytes = 0    # bytes sent as parts (including aborted uploads)
+        self._mp_lock = threading.Lock()
+        self._mp_seq = 0
+
+    # -- internals --
+    def _count_read(self, n: int):
+        self.bytes_read += n
+
+    def _store(self, bucket: str, key: str, data: bytes, content_type=None, **extra):
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        self.objects[(bucket, key)] = {
+            "Body": data,
+            "ETag": etag,
+            "ContentType": content_type or "binary/octet-stream",
+            "LastModified": time.time(),
+            "Metadata": dict(extra.get("Metadata") or {}),
+        }
+        self.bytes_written += len(data)
+        return etag
+
+    def _get(self, bucket: str, key: str, op: str):
+        obj = self.objects.get((bucket, key))
+        if obj is None:
+            raise _client_error("NoSuchKey", 404, op, f"s3://{bucket}/{key}")
+        return obj
+
+    # -- client API --
+    def put_object(self, Bucket, Key, Body=b"", ContentType=None, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self.calls["put_object"] += 1
+        current = self.objects.get((Bucket, Key))
+        if (IfNoneMatch == "*" and current is not None) or \
+                (IfMatch is not None and (current is None or current["ETag"] != IfMatch)):
+            raise _client_error("PreconditionFailed", 412, "PutObject", f"s3://{Bucket}/{Key}")
+        data = Body.read() if hasattr(Body, "read") else Body
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        etag = self._store(Bucket, Key, bytes(data), ContentType, **kwargs)
+        return {"ETag": etag}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.calls["get_object"] += 1
+        obj = self._get(Bucket, Key, "GetObject")
+        return {
+            "Body": _Body(obj["Body"], self._count_read),
+            "ContentLength": len(obj["Body"]),
+            "ContentType": obj["ContentType"],
+            "ETag": obj["ETag"],
+            "Metadata": dict(obj["Metadata"]),
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.calls["head_object"] += 1
+        obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            # Real S3 HEAD has no body, so the error code is the bare status.
+            raise _client_error("404", 404, "HeadObject", "Not Found")
+        return {
+            "ContentLength": len(obj["Body"]),
+            "ContentType": obj["ContentType"],
+            "ETag": obj["ETag"],
+            "Metadata": dict(obj["Metadata"]),
+        }
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        self.calls["download_file"] += 1
+        obj = self._get(Bucket, Key, "GetObject")
+        with open(Filename, "wb") as f:
+            f.write(obj["Body"])
+        self._count_read(len(obj["Body"]))
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, **kwargs):
+        self.calls["upload_file"] += 1
+        extra = dict(ExtraArgs or {})
+        with open(Filename, "rb") as f:
+            data = f.read()
+        self._store(Bucket, Key, data, extra.pop("ContentType", None), **extra)
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.calls["delete_object"] += 1
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    # Multipart: parts are held per upload id until complete/abort, like S3.
+    MIN_PART = 5 * 1024 * 1024
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None, Metadata=None, **kwargs):
+        self.calls["create_multipart_upload"] += 1
+        with self._mp_lock:
+            self._mp_seq += 1
+            upload_id = f"mp-{self._mp_seq}"
+            self.uploads[upload_id] = {"Bucket": Bucket, "Key": Key, "ContentType": ContentType,
+                                       "Metadata": dict(Metadata or {}), "Parts": {}}
+        return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+
+    def _upload(self, Bucket, Key, UploadId, op: str):
+        up = self.uploads.get(UploadId)
+        if up is None or (up["Bucket"], up["Key"]) != (Bucket, Key):
+            raise _client_error("NoSuchUpload", 404, op, UploadId)
+        return up
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body=b"", **kwargs):
+        self.calls["upload_part"] += 1
+        data = bytes(Body.read() if hasattr(Body, "read") else Body)
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        with self._mp_lock:
+            self._upload(Bucket, Key, UploadId, "UploadPart")["Parts"][PartNumber] = (etag, data)
+            self.parts_bytes += len(data)
+        return {"ETag": etag}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload=None, **kwargs):
+        self.calls["complete_multipart_upload"] += 1
+        with self._mp_lock:
+            up = self._upload(Bucket, Key, UploadId, "CompleteMultipartUpload")
+            listed = (MultipartUpload or {}).get("Parts") or []
+            if not listed:
+                raise _client_error("MalformedXML", 400, "CompleteMultipartUpload", "no parts")
+            chunks = []
+            for i, part in enumerate(listed):
+                stored = up["Parts"].get(part["PartNumber"])
+                if stored is None or stored[0] != part["ETag"]:
+                    raise _client_error("InvalidPart", 400, "CompleteMultipartUpload", str(part["PartNumber"]))
+                if i < len(listed) - 1 and len(stored[1]) < self.MIN_PART:
+                    raise _client_error("EntityTooSmall", 400, "CompleteMultipartUpload", str(part["PartNumber"]))
+                chunks.append(stored[1])
+            del self.uploads[UploadId]
+        self._store(Bucket, Key, b"".join(chunks), up["ContentType"], Metadata=up["Metadata"])
+        # S3's multipart ETag: md5 of the part md5s, "-<part count>".
+        digest = hashlib.md5(b"".join(hashlib.md5(c).digest() for c in chunks)).hexdigest()
+        etag = f'"{digest}-{len(chunks)}"'
+        self.objects[(Bucket, Key)]["ETag"] = etag
+        return {"Bucket": Bucket, "Key": Key, "ETag": etag}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.calls["abort_multipart_upload"] += 1
+        with self._mp_lock:
+            self._upload(Bucket, Key, UploadId, "AbortMultipartUpload")
+            del self.uploads[UploadId]
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="",StartAfter="", ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self.calls["list_objects_v2"] += 1
+        after = ContinuationToken or StartAfter
+        keys = sorted(k for (b, k) in self.objects if b == Bucket and k.startswith(Prefix) and k > after)
+        page, rest = keys[:MaxKeys], keys[MaxKeys:]
+        contents = [{"Key": k, "Size": len(self.objects[(Bucket, k)]["Body"]),
+                     "ETag": self.objects[(Bucket, k)]["ETag"]} for k in page]
+        out = {"Contents": contents, "KeyCount": len(contents), "IsTruncated": bool(rest)}
+        if rest:
+            out["NextContinuationToken"] = page[-1]
+        return out
+
+
+# -------- DynamoDB --------
+
+_SET_ASSIGN = re.compile(r"\s*([#\w]+)\s*=\s*(:\w+)\s*")
+_CLAUSES = re.compile(r"\b(SET|REMOVE)\b", re.IGNORECASE)
+_KEY_COND = re.compile(r"\s*([#\w]+)\s*(=|<|<=|>|>=)\s*(:\w+)\s*")
+_OPS = {
+    "=": lambda a, b: a == b, "<>": lambda a, b: a != b, "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+}
+
+
+class _FakeDynamoClient:
+    """Low-level (typed) client view over FakeTable instances, as table.meta.client."""
+
+    def __init__(self):
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+        self._de = TypeDeserializer()
+        self._ser = TypeSerializer()
+        self.tables = {}
+
+    def _plain(self, typed: dict) -> dict:
+        return {k: self._de.deserialize(v) for k, v in (typed or {}).items()}
+
+    def get_item(self, TableName, Key, **kwargs):
+        resp = self.tables[TableName].get_item(Key=self._plain(Key), **kwargs)
+        if "Item" in resp:
+            resp["Item"] = {k: self._ser.serialize(v) for k, v in resp["Item"].items()}
+        return resp
+
+    def update_item(self, TableName, Key, ExpressionAttributeValues=None, **kwargs):
+        return self.tables[TableName].update_item(
+            Key=self._plain(Key), ExpressionAttributeValues=self._plain(ExpressionAttributeValues), **kwargs)
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        table = None
+        ops = []
+        for entry in TransactItems:
+            u = dict(entry["Update"])
+            table = self.tables[u.pop("TableName")]
+            u["Key"] = self._plain(u["Key"])
+            u["ExpressionAttributeValues"] = self._plain(u.get("ExpressionAttributeValues"))
+            ops.append(u)
+        table.calls["transact_write_items"] += 1
+        # All-or-nothing: check every condition before applying anything.
+        for u in ops:
+            if not table._condition_ok(u["Key"], u.get("ConditionExpression"), u.get("ExpressionAttributeNames") or {},
+                                       u["ExpressionAttributeValues"]):
+                raise _client_error("TransactionCanceledException", 400, "TransactWriteItems",
+                                    "ConditionalCheckFailed")
+        for u in ops:
+            table.update_item(**u)
+        return {}
+
+
+class _Condition:
+    """
+    Evaluates the ConditionExpression subset the pipeline writes: AND / OR /
+    NOT, parentheses, ``attribute_exists`` / ``attribute_not_exists``,
+    comparisons (``= <> < <= > >=``) and ``IN (...)``. As in DynamoDB, a
+    comparison on a missing attribute is false.
+    """
+
+    _TOKEN = re.compile(r"\s*(<>|<=|>=|[=<>(),]|[#:]?\w+)")
+
+    def __init__(self, text: str, name, values: dict):
+        self.tokens, pos = [], 0
+        text = text.strip()
+        while pos < len(text):
+            m = self._TOKEN.match(text, pos)
+            if not m:
+                raise ValueError(f"FakeTable cannot parse condition: {text!r}")
+            self.tokens.append(m.group(1))
+            pos = m.end()
+        self.name, self.values = name, values
+
+    def evaluate(self, item: dict) -> bool:
+        self.item, self.pos = item, 0
+        out = self._or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"FakeTable cannot parse condition near {self.tokens[self.pos:]}")
+        return out
+
+    def _peek(self, upper=True):
+        tok = self.tokens[self.pos] if self.pos < len(self.tokens) else None
+        return tok.upper() if tok and upper else tok
+
+    def _take(self, expected: str = None) -> str:
+        tok = self.tokens[self.pos]
+        if expected and tok.upper() != expected:
+            raise ValueError(f"FakeTable condition: expected {expected}, got {tok!r}")
+        self.pos += 1
+        return tok
+
+    def _or(self) -> bool:
+        out = self._and()
+        while self._peek() == "OR":
+            self._take()
+            out = self._and() or out
+        return out
+
+    def _and(self) -> bool:
+        out = self._not()
+        while self._peek() == "AND":
+            self._take()
+            out = self._not() and out
+        return out
+
+    def _not(self) -> bool:
+        if self._peek() == "NOT":
+            self._take()
+            return not self._not()
+        return self._atom()
+
+    def _atom(self) -> bool:
+        tok = self._take()
+        if tok == "(":
+            out = self._or()
+            self._take(")")
+            return out
+        if tok.lower() in ("attribute_exists", "attribute_not_exists"):
+            self._take("(")
+            present = self.name(self._take()) in self.item
+            self._take(")")
+            return present if tok.lower() == "attribute_exists" else not present
+        attr = self.name(tok)
+        op = self._take()
+        if op.upper() == "IN":
+            self._take("(")
+            options = [self.values[self._take()]]
+            while self._peek() == ",":
+                self._take()
+                options.append(self.values[self._take()])
+            self._take(")")
+            return attr in self.item and self.item[attr] in options
+        value = self.values[self._take()]
+        return attr in self.item and _OPS[op](self.item[attr], value)
+
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+
+class FakeTable:
+    """
+    In-memory stand-in for a DynamoDB Table resource keyed on a single hash key.
+    Supports ``SET a=:x, #b=:y [REMOVE c]`` updates, the condition subset in
+    _Condition, and ``=``/range key conditions on the table or a GSI declared
+    via ``indexes={"name": (hash_attr, range_attr)}`` (sparse, like DynamoDB).
+    """
+
+    def __init__(self, hash_key: str = "jobId", name: str = "jobs", indexes: dict = None):
+        self.hash_key = hash_key
+        self.name = name
+        self.indexes = dict(indexes or {})
+        self.items = {}
+        self.calls = Counter()
+        self.meta = _Meta(_FakeDynamoClient())
+        self.meta.client.tables[name] = self
+
+    def _name(self, token: str, names: dict) -> str:
+        return names.get(token, token) if token.startswith("#") else token
+
+    def _condition_ok(self, key: dict, condition: str, names: dict, values: dict = None) -> bool:
+        if not condition:
+            return True
+        item = self.items.get(key[self.hash_key]) or {}
+        return _Condition(condition, lambda t: self._name(t, names), values or {}).evaluate(item)
+
+    def get_item(self, Key, **kwargs):
+        self.calls["get_item"] += 1
+        item = self.items.get(Key[self.hash_key])
+        return {"Item": dict(item)} if item is not None else {}
+
+    def put_item(self, Item, **kwargs):
+        self.calls["put_item"] += 1
+        self.items[Item[self.hash_key]] = dict(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, ConditionExpression=None, **kwargs):
+        self.calls["update_item"] += 1
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        if not self._condition_ok(Key, ConditionExpression, names, values):
+            raise _client_error("ConditionalCheckFailedException", 400, "UpdateItem")
+        parts = _CLAUSES.split(UpdateExpression.strip())
+        item = self.items.setdefault(Key[self.hash_key], dict(Key))
+        for verb, body in zip(parts[1::2], parts[2::2]):
+            for token in body.split(","):
+                if verb.upper() == "REMOVE":
+                    item.pop(self._name(token.strip(), names), None)
+                    continue
+                m = _SET_ASSIGN.fullmatch(token)
+                if not m:
+                    raise ValueError(f"Unsupported assignment: {token!r}")
+                item[self._name(m.group(1), names)] = values[m.group(2)]
+        return {"Attributes": dict(item)}
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues=None, IndexName=None,
+              ExpressionAttributeNames=None, Select=None, Limit=None, ScanIndexForward=True, **kwargs):
+        self.calls["query"] += 1
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        hash_attr, range_attr = self.indexes[IndexName] if IndexName else (self.hash_key, None)
+        conds = []
+        for part in re.split(r"\bAND\b", KeyConditionExpression, flags=re.IGNORECASE):
+            m = _KEY_COND.fullmatch(part)
+            if not m:
+                raise ValueError(f"Unsupported key condition: {part!r}")
+            conds.append((self._name(m.group(1), names), _OPS[m.group(2)], values[m.group(3)]))
+        rows = [it for it in self.items.values()
+                if hash_attr in it and (range_attr is None or range_attr in it)
+                and all(attr in it and op(it[attr], v) for attr, op, v in conds)]
+        if range_attr:
+            rows.sort(key=lambda it: it[range_attr], reverse=not ScanIndexForward)
+        if Limit:
+            rows = rows[:Limit]
+        if IndexName:
+            # Keys-only projection: table key plus index keys.
+            keep = {self.hash_key, hash_attr, range_attr}
+            rows = [{k: v for k, v in it.items() if k in keep} for it in rows]
+        if Select == "COUNT":
+            return {"Count": len(rows), "ScannedCount": len(rows)}
+        return {"Items": [dict(r) for r in rows], "Count": len(rows)}
+
+
+# -------- Bedrock --------
+
+_CANNED_SENTENCES = [
+    "Real estate investment trusts own income-producing property and pass most of their earnings to shareholders.",
+    "Yields can look attractive, but they move with interest rates and occupancy.",
+    "In the US, most REIT dividends are taxed as ordinary income rather than qualified dividends.",
+    "Canadian, UK and Australian investors face different withholding rules on foreign REIT income.",
+    "Diversification across property sectors reduces exposure to any single tenant or region.",
+    "Leverage amplifies both gains and losses when property values change.",
+    "Check the payout ratio, debt maturities and fees before you buy.",
+    "This is general education, not financial advice.",
+]
+
+
+def canned_script(words: int) -> str:
+    """Deterministic script text of roughly ``words`` words."""
+    out, count, i = [], 0, 0
+    while count < words:
+        sent = _CANNED_SENTENCES[i % len(_CANNED_SENTENCES)]
+        out.append(sent)
+        count += len(sent.split())
+        i += 1
+    return " ".join(out)
+
+
+class FakeBedrock:
+    """
+    Returns a canned Claude-style response of ``words`` words for every call.
+    ``latency`` (seconds) is slept per call to simulate model-side time.
+    With ``spread`` (e.g. 0.3) each call's length is drawn uniformly from
+    words * (1 ± spread), the way real drafts miss a requested length.
+    """
+
+    def __init__(self, words: int = 300, latency: float = 0.0, spread: float = 0.0, seed: int = 0):
+        self.words = words
+        self.latency = latency
+        self.spread = spread
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.requests = []
+
+    def invoke_model(self, modelId, body, **kwargs):
+        with self._lock:
+            self.calls["invoke_model"] += 1
+            self.requests.append({"modelId": modelId, "body": json.loads(body)})
+            words = int(self.words * (1 + self._rng.uniform(-self.spread, self.spread))) if self.spread \
+                else self.words
+        if self.latency:
+            time.sleep(self.latency)
+        payload = {
+            "content": [{"type": "text", "text": canned_script(words)}],
+            "stop_reason": "end_turn",
+        }
+        return {"body": _Body(json.dumps(payload).encode("utf-8"))}
+
+
+class FakeBedrockBatch:
+    """
+    Bedrock control-plane stand-in for batch inference. ``create_model_invocation_job``
+    reads the JSONL input from a FakeS3 and, once the job has been polled
+    ``polls`` times, writes ``<output>/<jobId>/<input name>.out`` plus
+    ``manifest.json.out`` the way Bedrock does. Every ``fail_every``-th record
+    (1-based) gets an error line instead of a modelOutput.
+    """
+
+    def __init__(self, s3, words: int = 300, polls: int = 2, fail_every: int = 0):
+        self.s3 = s3
+        self.words = words
+        self.polls = polls
+        self.fail_every = fail_every
+        self.jobs = {}
+        self.calls = Counter()
+
+    @staticmethod
+    def _split(uri: str):
+        bucket, _, key = uri[len("s3://"):].partition("/")
+        return bucket, key
+
+    def create_model_invocation_job(self, jobName, roleArn, modelId, inputDataConfig, outputDataConfig, **kwargs):
+        self.calls["create_model_invocation_job"] += 1
+        job_id = hashlib.md5(jobName.encode("utf-8")).hexdigest()[:12]
+        arn = f"arn:aws:bedrock:us-east-1:000000000000:model-invocation-job/{job_id}"
+        self.jobs[arn] = {
+            "id": job_id, "modelId": modelId, "polls": 0, "status": "Submitted",
+            "input": inputDataConfig["s3InputDataConfig"]["s3Uri"],
+            "output": outputDataConfig["s3OutputDataConfig"]["s3Uri"],
+        }
+        return {"jobArn": arn}
+
+    def _complete(self, job: dict):
+        in_bucket, in_key = self._split(job["input"])
+        body = self.s3.get_object(Bucket=in_bucket, Key=in_key)["Body"].read().decode("utf-8")
+        lines, ok, failed = [], 0, 0
+        for n, line in enumerate((l for l in body.splitlines() if l.strip()), 1):
+            rec = json.loads(line)
+            out = {"recordId": rec["recordId"], "modelInput": rec["modelInput"]}
+            if self.fail_every and n % self.fail_every == 0:
+                out["error"] = {"errorCode": 400, "errorMessage": "synthetic record failure"}
+                failed += 1
+            else:
+                out["modelOutput"] = {
+                    "content": [{"type": "text", "text": canned_script(self.words)}],
+                    "stop_reason": "end_turn",
+                }
+                ok += 1
+            lines.append(json.dumps(out))
+        out_bucket, out_prefix = self._split(job["output"])
+        base = f"{out_prefix.rstrip('/')}/{job['id']}/"
+        self.s3.put_object(Bucket=out_bucket, Key=base + os.path.basename(in_key) + ".out",
+                           Body="\n".join(lines) + "\n")
+        self.s3.put_object(Bucket=out_bucket, Key=base + "manifest.json.out", Body=json.dumps({
+            "totalRecordCount": ok + failed, "processedRecordCount": ok + failed,
+            "successRecordCount": ok, "errorRecordCount": failed,
+        }))
+        job["status"] = "Completed" if not failed else "PartiallyCompleted"
+
+    def get_model_invocation_job(self, jobIdentifier, **kwargs):
+        self.calls["get_model_invocation_job"] += 1
+        job = self.jobs.get(jobIdentifier)
+        if job is None:
+            raise _client_error("ResourceNotFoundException", 404, "GetModelInvocationJob", jobIdentifier)
+        if job["status"] in ("Submitted", "InProgress"):
+            job["polls"] += 1
+            job["status"] = "InProgress"
+            if job["polls"] >= self.polls:
+                self._complete(job)
+        return {"jobArn": jobIdentifier, "modelId": job["modelId"], "status": job["status"]}
+
+
+# -------- Polly --------
+
+def synthetic_pcm(seconds: float, sample_rate: int = 16000, freq: float = 220.0) -> bytes:
+    """16-bit mono little-endian sine tone; one period is built then repeated."""
+    period = max(1, int(round(sample_rate / freq)))
+    cycle = b"".join(
+        struct.pack("<h", int(8000 * math.sin(2 * math.pi * n / period)))
+        for n in range(period)
+    )
+    total = int(seconds * sample_rate) * 2
+    reps, rem = divmod(total, len(cycle))
+    return cycle * reps + cycle[:rem]
+
+
+class FakePolly:
+    """
+    Synthesizes a tone whose length follows speaking rate (``words_per_sec``),
+    so audio size scales with script length exactly as real Polly output does.
+    """
+
+    def __init__(self, words_per_sec: float = 2.5, latency: float = 0.0):
+        self.words_per_sec = words_per_sec
+        self.latency = latency
+        self.calls = Counter()
+        self.bytes_out = 0
+
+    def synthesize_speech(self, Text, VoiceId, OutputFormat, SampleRate="16000", Engine="standard", **kwargs):
+        self.calls["synthesize_speech"] += 1
+        if OutputFormat != "pcm":
+            raise _client_error("ValidationException", 400, "SynthesizeSpeech",
+                                f"FakePolly only emits pcm, got {OutputFormat}")
+        if self.latency:
+            time.sleep(self.latency)
+        seconds = len(Text.split()) / self.words_per_sec
+        pcm = synthetic_pcm(seconds, int(SampleRate))
+        self.bytes_out += len(pcm)
+        return {"AudioStream": _Body(pcm), "ContentType": "audio/pcm"}
+
+
+# -------- SQS / Step Functions (render worker pool) --------
+
+class FakeSQS:
+    """Single-process queue; ``WaitTimeSeconds`` is honoured only while empty."""
+
+    def __init__(self):
+        self.messages = deque()
+        self.calls = Counter()
+        self.deleted = []
+        self.received = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        with self._lock:
+            self.calls["send_message"] += 1
+            self._seq += 1
+            msg_id = f"msg-{self._seq:06d}"
+            self.messages.append({"MessageId": msg_id, "ReceiptHandle": f"rh-{msg_id}", "Body": MessageBody})
+        return {"MessageId": msg_id}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, **kwargs):
+        with self._lock:
+            self.calls["receive_message"] += 1
+            out = []
+            while self.messages and len(out) < MaxNumberOfMessages:
+                msg = self.messages.popleft()
+                self.received[msg["ReceiptHandle"]] = msg
+                out.append(msg)
+        if not out and WaitTimeSeconds:
+            # A short nap stands in for the long poll so idle workers don't spin.
+            time.sleep(min(WaitTimeSeconds, 0.05))
+        return {"Messages": out} if out else {}
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **kwargs):
+        with self._lock:
+            self.calls["delete_message"] += 1
+            self.received.pop(ReceiptHandle, None)
+            self.deleted.append(ReceiptHandle)
+        return {}
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout, **kwargs):
+        """Only ``VisibilityTimeout=0`` (release now) is modelled: the message is queued again."""
+        with self._lock:
+            self.calls["change_message_visibility"] += 1
+            msg = self.received.pop(ReceiptHandle, None)
+            if msg is not None and VisibilityTimeout == 0:
+                self.messages.appendleft(msg)
+        return {}
+
+
+class FakeStepFunctions:
+    """
+    Records task-token callbacks: ``results[token] = ("success", output) | ("failure", error, cause)``,
+    and started executions: ``executions[name] = input dict``.
+    """
+
+    def __init__(self):
+        self.results = {}
+        self.executions = {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def send_task_success(self, taskToken, output, **kwargs):
+        with self._lock:
+            self.calls["send_task_success"] += 1
+            self.results[taskToken] = ("success", json.loads(output))
+        return {}
+
+    def send_task_failure(self, taskToken, error="", cause="", **kwargs):
+        with self._lock:
+            self.calls["send_task_failure"] += 1
+            self.results[taskToken] = ("failure", error, cause)
+        return {}
+
+    def start_execution(self, stateMachineArn, name, input="{}", **kwargs):
+        with self._lock:
+            self.calls["start_execution"] += 1
+            if name in self.executions:
+                raise _client_error("ExecutionAlreadyExists", 400, "StartExecution", name)
+            self.executions[name] = json.loads(input)
+        return {"executionArn": f"{stateMachineArn}:{name}", "startDate": time.time()}
+
+
+# -------- Secrets Manager --------
+
+class FakeSecrets:
+    def __init__(self, secrets: dict = None):
+        self.secrets = dict(secrets or {})
+        self.calls = Counter()
+
+    def get_secret_value(self, SecretId, **kwargs):
+        self.calls["get_secret_value"] += 1
+        if SecretId not in self.secrets:
+            raise _client_error("ResourceNotFoundException", 400, "GetSecretValue", SecretId)
+        value = self.secrets[SecretId]
+        return {"SecretString": value if isinstance(value, str) else json.dumps(value)}
+
+
+# -------- YouTube --------
+
+class FakeMediaFileUpload:
+    """Drop-in for googleapiclient.http.MediaFileUpload (file-backed, chunked)."""
+
+    def __init__(self, filename, chunksize=4 * 1024 * 1024, resumable=False, mimetype=None):
+        self.filename = filename
+        self.chunksize = chunksize
+        self.resumable = resumable
+        self.mimetype = mimetype
+
+    def size(self) -> int:
+        return os.path.getsize(self.filename)
+
+
+class _FakeInsertRequest:
+    def __init__(self, service, body, media_body):
+        self._service = service
+        self._body = body
+        self._media = media_body
+        self._fp = open(media_body.filename, "rb")
+
+    def next_chunk(self):
+        chunk = self._fp.read(self._media.chunksize)
+        self._service.bytes_uploaded += len(chunk)
+        self._service.calls["chunk"] += 1
+        if chunk and self._fp.tell() < self._media.size():
+            return (None, None)
+        self._fp.close()
+        self._service.video_seq += 1
+        vid = f"fake-{self._service.video_seq:06d}"
+        self._service.videos_inserted.append({"id": vid, "body": self._body})
+        return (None, {"id": vid, "snippet": self._body.get("snippet", {})})
+
+
+class _FakeExecute:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+class _FakeCaptions:
+    """captions().insert/update(...).execute(); tracks keyed by caption id."""
+
+    def __init__(self, service):
+        self._service = service
+
+    def _read(self, media_body) -> str:
+        with open(media_body.filename, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def insert(self, part, body, media_body=None, **kwargs):
+        svc = self._service
+        svc.calls["captions.insert"] += 1
+
+        def run():
+            snippet = body["snippet"]
+            if snippet["videoId"] not in {v["id"] for v in svc.videos_inserted}:
+                raise RuntimeError(f"FakeYouTube: no video {snippet['videoId']}")
+            cid = f"cap-{len(svc.caption_tracks) + 1:06d}"
+            svc.caption_tracks[cid] = {"snippet": dict(snippet), "text": self._read(media_body)}
+            return {"id": cid, "snippet": snippet}
+        return _FakeExecute(run)
+
+    def update(self, part, body, media_body=None, **kwargs):
+        svc = self._service
+        svc.calls["captions.update"] += 1
+
+        def run():
+            track = svc.caption_tracks[body["id"]]
+            if media_body is not None:
+                track["text"] = self._read(media_body)
+            return {"id": body["id"], "snippet": track["snippet"]}
+        return _FakeExecute(run)
+
+
+class FakeYouTube:
+    """``build("youtube", "v3")`` stand-in: videos().insert(...).next_chunk(), captions().insert(...).execute()."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.bytes_uploaded = 0
+        self.video_seq = 0
+        self.videos_inserted = []
+        self.caption_tracks = {}
+
+    def videos(self):
+        return self
+
+    def captions(self):
+        return _FakeCaptions(self)
+
+    def insert(self, part, body, media_body=None, **kwargs):
+        self.calls["videos.insert"] += 1
+        return _FakeInsertRequest(self, body, media_body)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate topic index benchmark (services/script_cache.py).
+
+Fills a TopicIndex with synthetic finance topics and reports build time,
+nearest() latency percentiles and whether reworded topics find their original.
+
+    python -m harness.topic_index_bench --entries 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services"))
+
+import script_cache  # noqa: E402
+
+_SUBJECTS = ["REITs", "index funds", "bond ladders", "dividend stocks", "TFSAs", "ISAs", "superannuation",
+             "KiwiSaver", "Roth IRAs", "emerging markets", "gold ETFs", "money market funds", "covered calls",
+             "municipal bonds", "small caps", "value investing", "dollar-cost averaging", "annuities"]
+_ANGLES = ["risks", "yields", "tax treatment", "fees", "for beginners", "in retirement", "during a recession",
+           "vs inflation", "for high earners", "rebalancing", "currency risk", "liquidity"]
+_MARKETS = ["US", "Canada", "UK", "EU", "Australia", "New Zealand"]
+
+
+def synthetic_topics(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        angles = ", ".join(rng.sample(_ANGLES, 2))
+        year = 2020 + i % 8
+        out.append(f"{rng.choice(_SUBJECTS)} in {year}: {angles} ({rng.choice(_MARKETS)}) #{i}")
+    return out
+
+
+def reword(topic: str) -> str:
+    # Trivial rewording: case, punctuation and plural changes only.
+    return topic.upper().replace(":", " -").replace("REITs", "REIT") + "?"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Topic index build/lookup benchmark.")
+    ap.add_argument("--entries", type=int, default=50000)
+    ap.add_argument("--queries", type=int, default=2000)
+    args = ap.parse_args(argv)
+
+    topics = synthetic_topics(args.entries)
+    index = script_cache.TopicIndex()
+    t0 = time.perf_counter()
+    for i, topic in enumerate(topics):
+        index.add(topic, {"row": i})
+    build_s = time.perf_counter() - t0
+
+    rng = random.Random(11)
+    lat, hits, scores = [], 0, []
+    for _ in range(args.queries):
+        i = rng.randrange(len(topics))
+        q = reword(topics[i])
+        t = time.perf_counter()
+        score, entry = index.nearest(q)
+        lat.append((time.perf_counter() - t) * 1000)
+        hits += entry is not None and entry["row"] == i
+        scores.append(score)
+
+    lat.sort()
+    backend = "numpy" if script_cache.np is not None else "pure-python"
+    print(f"backend={backend} entries={args.entries} build={build_s:.2f}s")
+    print(f"nearest(): p50={statistics.median(lat):.3f}ms p99={lat[int(len(lat) * 0.99) - 1]:.3f}ms")
+    print(f"reworded topic -> original: {hits}/{args.queries} "
+          f"(median similarity {statistics.median(scores):.3f})")
+
+
+if __name__ == "__main__":
+    main()
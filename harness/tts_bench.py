@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+TTS hedging benchmark against the local HTTP stand-ins (harness/tts_standins.py).
+
+Narrations of ``--chunks`` chunks are synthesized through the real provider
+adapters with hedging off and on. Each mode starts from fresh latency stats
+warmed with ``--warmup`` chunks, so the p95 deadline is learned the same way
+a warm Lambda container learns it. Reports per-chunk and per-narration
+latency percentiles and the extra requests hedging cost. A last pass shows
+which provider ``auto`` routing picks once both have history.
+
+    python -m harness.tts_bench --polly "base=0.05,tail_p=0.05,tail=1.0" \\
+        --elevenlabs "base=0.08,tail_p=0.02,tail=1.0" --narrations 40
+"""
+import argparse
+import json
+import statistics
+import time
+
+from harness.replay import _load
+from harness.tts_standins import LatencyModel, StandIn
+
+VOICE = "Matthew"
+ELEVEN_VOICE_ID = "standinvoice00000001"
+
+
+def _pct(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _chunk(words: int, i: int) -> str:
+    return " ".join(f"word{(i + n) % 97}" for n in range(words)) + "."
+
+
+def run_mode(tts, provider, hedge: bool, narrations: int, chunks: int, words: int, warmup: int):
+    stats = tts.LatencyStats(min_samples=min(20, warmup))
+    for i in range(warmup):
+        tts.synthesize(provider, _chunk(words, i), VOICE, "16000", stats, hedge=False)
+    chunk_s, narration_s, hedged = [], [], 0
+    for n in range(narrations):
+        t_narr = time.perf_counter()
+        for c in range(chunks):
+            t0 = time.perf_counter()
+            _, was_hedged = tts.synthesize(provider, _chunk(words, n * chunks + c), VOICE, "16000", stats,
+                                           hedge=hedge)
+            chunk_s.append(time.perf_counter() - t0)
+            hedged += was_hedged
+        narration_s.append(time.perf_counter() - t_narr)
+    return {
+        "hedge": hedge,
+        "chunk_p50": _pct(chunk_s, 0.5), "chunk_p95": _pct(chunk_s, 0.95), "chunk_p99": _pct(chunk_s, 0.99),
+        "narration_p50": _pct(narration_s, 0.5), "narration_p95": _pct(narration_s, 0.95),
+        "narration_mean": statistics.mean(narration_s),
+        "hedged_chunks": hedged, "chunks": len(chunk_s),
+    }
+
+
+def bench(polly_spec: str, eleven_spec: str, narrations: int, chunks: int, words: int, warmup: int, seed: int):
+    tts = _load("bench_tts_providers", "services/tts_providers.py")
+    with StandIn("polly", LatencyModel.parse(polly_spec, seed=seed)) as polly_srv, \
+            StandIn("elevenlabs", LatencyModel.parse(eleven_spec, seed=seed + 1)) as eleven_srv:
+        polly = tts.PollyProvider(polly_srv.polly_client())
+        eleven = tts.ElevenLabsProvider(eleven_srv.api_key, voices={VOICE: ELEVEN_VOICE_ID}, base_url=eleven_srv.url)
+        report = {"providers": {}}
+        for provider, srv in ((polly, polly_srv), (eleven, eleven_srv)):
+            rows = []
+            for hedge in (False, True):
+                before = srv.requests
+                row = run_mode(tts, provider, hedge, narrations, chunks, words, warmup)
+                row["requests"] = srv.requests - before - warmup
+                rows.append(row)
+            report["providers"][provider.name] = rows
+
+        stats = tts.LatencyStats(min_samples=min(20, warmup))
+        for i in range(warmup):
+            for provider in (polly, eleven):
+                tts.synthesize(provider, _chunk(words, i), VOICE, "16000", stats, hedge=False)
+        report["auto_pick"] = tts.pick([polly, eleven], VOICE, "16000", stats).name
+        report["auto_stats"] = stats.summary()
+    return report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hedged vs. unhedged TTS chunk synthesis against local stand-ins.")
+    ap.add_argument("--polly", default="base=0.05,per_1k=0.1,tail_p=0.05,tail=1.0",
+                    help="Polly stand-in latency (LatencyModel.parse spec)")
+    ap.add_argument("--elevenlabs", default="base=0.08,per_1k=0.15,tail_p=0.02,tail=1.0",
+                    help="ElevenLabs stand-in latency (LatencyModel.parse spec)")
+    ap.add_argument("--narrations", type=int, default=40)
+    ap.add_argument("--chunks", type=int, default=5, help="chunks per narration")
+    ap.add_argument("--words", type=int, default=120, help="words per chunk")
+    ap.add_argument("--warmup", type=int, default=40)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    report = bench(args.polly, args.elevenlabs, args.narrations, args.chunks, args.words, args.warmup, args.seed)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.narrations} narrations x {args.chunks} chunks of {args.words} words")
+    print(f"{'provider':<11} {'hedge':<5} {'chunk p50':>9} {'p95':>7} {'p99':>7}  "
+          f"{'narr p50':>8} {'p95':>7}  {'hedged':>6} {'requests':>8}")
+    for name, rows in report["providers"].items():
+        for r in rows:
+            print(f"{name:<11} {'on' if r['hedge'] else 'off':<5} {r['chunk_p50']:>8.3f}s {r['chunk_p95']:>6.3f}s "
+                  f"{r['chunk_p99']:>6.3f}s  {r['narration_p50']:>7.3f}s {r['narration_p95']:>6.3f}s  "
+                  f"{r['hedged_chunks']:>6} {r['requests']:>8}")
+    print(f"auto routing picks: {report['auto_pick']}  ({json.dumps(report['auto_stats'])})")
+
+
+if __name__ == "__main__":
+    main()
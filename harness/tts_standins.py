@@ -0,0 +1,130 @@
+"""
+Local HTTP stand-ins for the TTS providers, with injectable latency.
+
+Unlike the in-process fakes in stubs.py these are real servers, so the
+provider adapters in services/tts_providers.py run their actual request
+paths: Polly through a boto3 client pointed at the stand-in
+(``endpoint_url``, SigV4 signed and ignored), ElevenLabs through urllib.
+
+    polly       POST /v1/speech                       JSON body as boto3 sends it
+    elevenlabs  POST /v1/text-to-speech/<voiceId>?output_format=pcm_<rate>   (xi-api-key required)
+
+Both answer with a sine tone whose length follows the word count, after
+sleeping for ``latency(chars)`` seconds. ``LatencyModel`` gives a base +
+per-character cost with lognormal jitter and an optional slow tail, which
+is the shape that makes hedging worthwhile; any callable works.
+
+    with StandIn("polly", LatencyModel.parse("base=0.05,tail_p=0.05,tail=1.5")) as srv:
+        client = srv.polly_client()
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+from botocore.config import Config
+
+from harness.stubs import synthetic_pcm
+
+
+class LatencyModel:
+    """``base + per_1k * chars/1000`` scaled by lognormal(0, sigma); plus ``tail`` s with probability ``tail_p``."""
+
+    def __init__(self, base: float = 0.05, per_1k: float = 0.1, sigma: float = 0.25,
+                 tail_p: float = 0.0, tail: float = 0.0, seed: int = None):
+        self.base, self.per_1k, self.sigma = base, per_1k, sigma
+        self.tail_p, self.tail = tail_p, tail
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = None) -> "LatencyModel":
+        """``"base=0.05,per_1k=0.1,sigma=0.25,tail_p=0.05,tail=1.5"``; omitted keys keep their defaults."""
+        kwargs = {}
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            name, _, value = part.partition("=")
+            if name not in ("base", "per_1k", "sigma", "tail_p", "tail"):
+                raise ValueError(f"Unknown latency parameter '{name}' in '{spec}'")
+            kwargs[name] = float(value)
+        return cls(seed=seed, **kwargs)
+
+    def __call__(self, chars: int) -> float:
+        with self._lock:
+            jitter = self._rng.lognormvariate(0.0, self.sigma) if self.sigma else 1.0
+            slow = self._rng.random() < self.tail_p
+        return (self.base + self.per_1k * chars / 1000.0) * jitter + (self.tail if slow else 0.0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        standin = self.server.standin
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        url = urlparse(self.path)
+        if standin.kind == "polly" and url.path == "/v1/speech":
+            req = json.loads(body)
+            text, rate = req["Text"], req.get("SampleRate", "16000")
+        elif standin.kind == "elevenlabs" and url.path.startswith("/v1/text-to-speech/"):
+            if self.headers.get("xi-api-key") != standin.api_key:
+                return self._reply(401, b'{"detail": "invalid api key"}', "application/json")
+            text = json.loads(body)["text"]
+            rate = parse_qs(url.query).get("output_format", ["pcm_16000"])[0].split("_", 1)[1]
+        else:
+            return self._reply(404, b"{}", "application/json")
+        with standin.lock:
+            standin.requests += 1
+        time.sleep(standin.latency(len(text)))
+        pcm = synthetic_pcm(len(text.split()) / standin.words_per_sec, int(rate))
+        self._reply(200, pcm, "audio/pcm", {"x-amzn-RequestCharacters": str(len(text))})
+
+    def _reply(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandIn:
+    """One provider stand-in on 127.0.0.1:<ephemeral port>, served from a daemon thread."""
+
+    def __init__(self, kind: str, latency=None, words_per_sec: float = 2.5, api_key: str = "standin-key"):
+        if kind not in ("polly", "elevenlabs"):
+            raise ValueError(f"Unknown TTS stand-in '{kind}'")
+        self.kind = kind
+        self.latency = latency or (lambda chars: 0.0)
+        self.words_per_sec = words_per_sec
+        self.api_key = api_key
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def polly_client(self):
+        return boto3.client("polly", endpoint_url=self.url, region_name="us-east-1",
+                            aws_access_key_id="standin", aws_secret_access_key="standin",
+                            config=Config(retries={"max_attempts": 1}, max_pool_connections=32))
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Narration-variant benchmark: one video encode plus N audio muxes vs. N full renders.
+
+For each N, a job is replayed through Script -> TTS (N voices) -> Broll and
+then rendered in variant mode; the baseline is the median one-voice render
+times N, which is what re-running render.py per variant would cost.
+
+    python -m harness.variant_bench --variants 1 2 4 6 --words 450
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+
+from harness.replay import ReplayEnv
+
+VOICES = ["Matthew", "Amy", "Olivia", "Aria", "Brian", "Joanna", "Kajal", "Emma"]
+
+
+def _prepare(env, job_id: str, variants=None):
+    job = {"jobId": job_id, "topic": f"Variant benchmark {job_id}"}
+    env._lambda("scriptFn")(dict(job))
+    tts = dict(job)
+    if variants:
+        tts["variants"] = variants
+    env._lambda("ttsFn")(tts)
+    env._lambda("brollFn")(dict(job))
+    return job
+
+
+def _timed_render(env, job) -> float:
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        env._render(job)
+    return time.perf_counter() - t0
+
+
+def bench(counts, words: int, repeats: int):
+    env = ReplayEnv(words=words, trace_memory=False)
+    if not env.has_ffmpeg:
+        raise SystemExit("ffmpeg is not on PATH")
+    single = statistics.median(
+        _timed_render(env, _prepare(env, f"variant-single-{i}")) for i in range(repeats)
+    )
+    rows = []
+    for n in counts:
+        variants = [{"name": f"v{i}", "voice": VOICES[i % len(VOICES)]} for i in range(n)]
+        secs = statistics.median(
+            _timed_render(env, _prepare(env, f"variant-{n}-{i}", variants)) for i in range(repeats)
+        )
+        rows.append({"variants": n, "seconds": secs, "naive_s": single * n})
+    return {"words": words, "single_render_s": single, "rows": rows}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Encode-once narration variants vs. one render per variant.")
+    ap.add_argument("--variants", type=int, nargs="+", default=[1, 2, 4, 6])
+    ap.add_argument("--words", type=int, default=450)
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    report = bench(args.variants, args.words, args.repeats)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.words}-word script; one full render = {report['single_render_s']:.2f}s")
+    print(f"{'variants':>8}  {'encode-once':>11}  {'N renders':>9}  {'speed-up':>8}")
+    for row in report["rows"]:
+        print(f"{row['variants']:>8}  {row['seconds']:>10.2f}s  {row['naive_s']:>8.2f}s  "
+              f"{row['naive_s'] / row['seconds']:>7.2f}x")
+    rows = report["rows"]
+    if len(rows) > 1 and rows[-1]["variants"] > rows[0]["variants"]:
+        extra = (rows[-1]["seconds"] - rows[0]["seconds"]) / (rows[-1]["variants"] - rows[0]["variants"])
+        print(f"marginal cost per extra variant: {extra:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,11 +11,13 @@ const app = new cdk.App();
 const identity = new IdentityStack(app, 'VideoGithubOidc', {});
 const core = new CoreStack(app, 'VideoCore', {});
 const compute = new ComputeStack(app, 'VideoCompute', {
-  mediaBucket: core.mediaBucket
+  mediaBucket: core.mediaBucket,
+  jobsTable: core.jobsTable
 });
 new WorkflowStack(app, 'VideoWorkflow', {
   mediaBucket: core.mediaBucket,
   jobsTable: core.jobsTable,
-  rendererTask: compute.rendererTask,
-  cluster: compute.cluster
+  rendererTasks: compute.rendererTasks,
+  cluster: compute.cluster,
+  renderQueue: compute.renderQueue
 });
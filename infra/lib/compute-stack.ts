@@ -1,42 +1,153 @@
-import { Stack, StackProps, CfnOutput } from 'aws-cdk-lib';
+import { Stack, StackProps, CfnOutput, Duration } from 'aws-cdk-lib';
 import { Construct } from 'constructs';
 import * as ecs from 'aws-cdk-lib/aws-ecs';
 import * as ec2 from 'aws-cdk-lib/aws-ec2';
 import * as ecr from 'aws-cdk-lib/aws-ecr';
 import * as iam from 'aws-cdk-lib/aws-iam';
 import * as s3 from 'aws-cdk-lib/aws-s3';
+import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
 import * as logs from 'aws-cdk-lib/aws-logs';
+import * as sqs from 'aws-cdk-lib/aws-sqs';
+import * as appscaling from 'aws-cdk-lib/aws-applicationautoscaling';
+import * as cloudwatch from 'aws-cdk-lib/aws-cloudwatch';
 
 export class ComputeStack extends Stack {
   readonly cluster: ecs.Cluster;
-  readonly rendererTask: ecs.FargateTaskDefinition;
+  // Per-job render sizes chosen by renderSizeFn (names/vCPU/memory match services/render_sizing.py SIZES)
+  readonly rendererTasks: Record<string, ecs.FargateTaskDefinition>;
+  readonly renderQueue: sqs.Queue;
 
-  constructor(scope: Construct, id: string, props: StackProps & { mediaBucket: s3.Bucket }) {
+  constructor(scope: Construct, id: string, props: StackProps & { mediaBucket: s3.Bucket, jobsTable: dynamodb.Table }) {
     super(scope, id, props);
 
     const vpc = new ec2.Vpc(this, 'Vpc', { maxAzs: 2 });
     this.cluster = new ecs.Cluster(this, 'Cluster', { vpc });
 
     const repo = new ecr.Repository(this, 'RendererRepo', {});
-
-    this.rendererTask = new ecs.FargateTaskDefinition(this, 'RendererTask', {
-      cpu: 2048,
-      memoryLimitMiB: 4096,
-      ephemeralStorageGiB: 50
-    });
+    // Image tag for every renderer task definition. CI (renderer.yml) pushes
+    // <git sha> tags and rolls new revisions itself; pass the same tag here
+    // (cdk deploy -c rendererImageTag=<sha>) so a stack update does not roll back.
+    const imageTag: string = this.node.tryGetContext('rendererImageTag') ?? 'latest';
 
     const logGroup = new logs.LogGroup(this, 'RendererLogs');
 
-    const container = this.rendererTask.addContainer('Renderer', {
-      image: ecs.ContainerImage.fromEcrRepository(repo, 'latest'),
-      environment: { MEDIA_BUCKET: props.mediaBucket.bucketName },
-      logging: ecs.LogDrivers.awsLogs({ logGroup, streamPrefix: 'renderer' })
+    // One task definition per size; 'medium' is the original 2 vCPU / 4 GB task
+    // (logical id kept) and remains the default when a job cannot be sized.
+    const sizes: Array<[string, string, number, number]> = [
+      ['small', 'RendererTaskSmall', 1024, 2048],
+      ['medium', 'RendererTask', 2048, 4096],
+      ['large', 'RendererTaskLarge', 4096, 8192],
+    ];
+    this.rendererTasks = {};
+    for (const [size, id, cpu, memoryLimitMiB] of sizes) {
+      const task = new ecs.FargateTaskDefinition(this, id, {
+        cpu,
+        memoryLimitMiB,
+        ephemeralStorageGiB: 50
+      });
+      const container = task.addContainer('Renderer', {
+        image: ecs.ContainerImage.fromEcrRepository(repo, imageTag),
+        environment: {
+          MEDIA_BUCKET: props.mediaBucket.bucketName,
+          JOBS_TABLE: props.jobsTable.tableName,
+          RENDER_SIZE: size,
+          RENDER_VCPU: String(cpu / 1024),
+        },
+        logging: ecs.LogDrivers.awsLogs({ logGroup, streamPrefix: 'renderer' })
+      });
+      container.addUlimits({ name: ecs.UlimitName.NOFILE, hardLimit: 1048576, softLimit: 1048576 });
+
+      props.mediaBucket.grantReadWrite(task.taskRole);
+      props.jobsTable.grantReadWriteData(task.taskRole);
+      this.rendererTasks[size] = task;
+      // renderer.yml registers a revision per family with each image it builds.
+      new CfnOutput(this, `RendererFamily${size[0].toUpperCase()}${size.slice(1)}`, { value: task.family });
+    }
+
+    // Warm worker pool: long-running renderers (render.py --worker) drain this
+    // queue and report back to Step Functions with the task token in each message.
+    // Visibility outlasts the 15-minute render timeout so a job is never picked twice.
+    this.renderQueue = new sqs.Queue(this, 'RenderQueue', {
+      visibilityTimeout: Duration.minutes(20),
+      retentionPeriod: Duration.days(1),
     });
 
-    container.addUlimits({ name: ecs.UlimitName.NOFILE, hardLimit: 1048576, softLimit: 1048576 });
+    const workerTask = new ecs.FargateTaskDefinition(this, 'RendererWorkerTask', {
+      cpu: 4096,
+      memoryLimitMiB: 8192,
+      ephemeralStorageGiB: 100
+    });
+    const workerContainer = workerTask.addContainer('RendererWorker', {
+      image: ecs.ContainerImage.fromEcrRepository(repo, imageTag),
+      command: ['--worker'],
+      environment: {
+        MEDIA_BUCKET: props.mediaBucket.bucketName,
+        JOBS_TABLE: props.jobsTable.tableName,
+        JOB_QUEUE_URL: this.renderQueue.queueUrl,
+        RENDER_CONCURRENCY: '2',
+        ASSET_CACHE_DIR: '/tmp/asset-cache',
+      },
+      logging: ecs.LogDrivers.awsLogs({ logGroup, streamPrefix: 'renderer-worker' }),
+      // SIGTERM stops polling; jobs in flight are protected from scale-in (render.py worker_loop).
+      stopTimeout: Duration.seconds(120),
+    });
+    workerContainer.addUlimits({ name: ecs.UlimitName.NOFILE, hardLimit: 1048576, softLimit: 1048576 });
 
-    props.mediaBucket.grantReadWrite(this.rendererTask.taskRole);
+    props.mediaBucket.grantReadWrite(workerTask.taskRole);
+    props.jobsTable.grantReadWriteData(workerTask.taskRole);
+    this.renderQueue.grantConsumeMessages(workerTask.taskRole);
+    workerTask.taskRole.addToPrincipalPolicy(new iam.PolicyStatement({
+      effect: iam.Effect.ALLOW,
+      actions: ['states:SendTaskSuccess', 'states:SendTaskFailure', 'states:SendTaskHeartbeat'],
+      resources: ['*'], // task-token APIs do not support resource-level permissions
+    }));
+    // Scale-in protection while a job is in flight (ECS agent task-protection endpoint).
+    workerTask.taskRole.addToPrincipalPolicy(new iam.PolicyStatement({
+      effect: iam.Effect.ALLOW,
+      actions: ['ecs:UpdateTaskProtection', 'ecs:GetTaskProtection'],
+      resources: ['*'],
+    }));
+
+    const workers = new ecs.FargateService(this, 'RendererWorkers', {
+      cluster: this.cluster,
+      taskDefinition: workerTask,
+      desiredCount: 0,
+      assignPublicIp: true,
+      vpcSubnets: { subnetType: ec2.SubnetType.PUBLIC },
+    });
+
+    // Scale out on waiting jobs; scale in only when nothing is waiting *or* being
+    // rendered (a message being rendered is in flight, not visible). Workers
+    // with a job in flight also hold task scale-in protection.
+    const scaling = workers.autoScaleTaskCount({ minCapacity: 0, maxCapacity: 10 });
+    scaling.scaleOnMetric('QueueBacklog', {
+      metric: this.renderQueue.metricApproximateNumberOfMessagesVisible({ period: Duration.minutes(1) }),
+      scalingSteps: [
+        { lower: 1, change: +1 },
+        { lower: 10, change: +3 },
+      ],
+      adjustmentType: appscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+      cooldown: Duration.minutes(2),
+    });
+    scaling.scaleOnMetric('QueueDrained', {
+      metric: new cloudwatch.MathExpression({
+        expression: 'visible + inflight',
+        usingMetrics: {
+          visible: this.renderQueue.metricApproximateNumberOfMessagesVisible(),
+          inflight: this.renderQueue.metricApproximateNumberOfMessagesNotVisible(),
+        },
+        period: Duration.minutes(1),
+      }),
+      scalingSteps: [
+        { upper: 0, change: -1 },
+        { lower: 1, change: 0 },
+      ],
+      adjustmentType: appscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+      cooldown: Duration.minutes(2),
+    });
 
     new CfnOutput(this, 'RendererRepoUri', { value: repo.repositoryUri });
+    new CfnOutput(this, 'RendererWorkerService', { value: workers.serviceName });
+    new CfnOutput(this, 'RendererClusterName', { value: this.cluster.clusterName });
   }
 }
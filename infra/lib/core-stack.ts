@@ -28,6 +28,16 @@ export class CoreStack extends Stack {
       timeToLiveAttribute: 'ttl'
     });
 
+    // Sparse status index: only in-flight/failed jobs carry inflightStatus
+    // ("<STATUS>#<shard>", see services/job_state.py), so "which jobs are stuck
+    // in TTS" is a keys-only Query instead of a table scan.
+    this.jobsTable.addGlobalSecondaryIndex({
+      indexName: 'byInflightStatus',
+      partitionKey: { name: 'inflightStatus', type: dynamodb.AttributeType.STRING },
+      sortKey: { name: 'updatedAt', type: dynamodb.AttributeType.NUMBER },
+      projectionType: dynamodb.ProjectionType.KEYS_ONLY,
+    });
+
     // Secrets (now explicitly encrypted with the AWS-managed key)
     new secrets.Secret(this, 'YouTubeOAuth', {
       secretName: 'youtube/oauth',
@@ -5,10 +5,12 @@ import * as tasks from 'aws-cdk-lib/aws-stepfunctions-tasks';
 import * as lambda from 'aws-cdk-lib/aws-lambda';
 import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
 import * as s3 from 'aws-cdk-lib/aws-s3';
+import * as s3deploy from 'aws-cdk-lib/aws-s3-deployment';
 import * as ecs from 'aws-cdk-lib/aws-ecs';
 import * as ec2 from 'aws-cdk-lib/aws-ec2';
 import * as iam from 'aws-cdk-lib/aws-iam';
 import * as logs from 'aws-cdk-lib/aws-logs';
+import * as sqs from 'aws-cdk-lib/aws-sqs';
 
 export class WorkflowStack extends Stack {
   constructor(
@@ -16,8 +18,9 @@ export class WorkflowStack extends Stack {
     props: StackProps & {
       mediaBucket: s3.Bucket,
       jobsTable: dynamodb.Table,
-      rendererTask: ecs.FargateTaskDefinition,
-      cluster: ecs.Cluster
+      rendererTasks: Record<string, ecs.FargateTaskDefinition>,
+      cluster: ecs.Cluster,
+      renderQueue: sqs.Queue
     }
   ) {
     super(scope, id, props);
@@ -37,16 +40,28 @@ export class WorkflowStack extends Stack {
     };
 
     // Lambdas
+    // The script cache's near-duplicate index uses NumPy when a layer provides it
+    // (e.g. `cdk deploy -c numpyLayerArn=<AWSSDKPandas-Python312 layer ARN>`);
+    // without one it falls back to pure Python.
+    const numpyLayerArn: string | undefined = this.node.tryGetContext('numpyLayerArn');
+    // Script drafts are requested in parallel; a second round after a length miss needs more than a minute.
     const scriptFn = new lambda.Function(this, 'ScriptFn', {
       ...common, functionName: 'scriptFn',
+      timeout: Duration.minutes(3),
       code: lambda.Code.fromAsset('../services'),
+      layers: numpyLayerArn
+        ? [lambda.LayerVersion.fromLayerVersionArn(this, 'NumpyLayer', numpyLayerArn)]
+        : undefined,
     });
     const ttsFn = new lambda.Function(this, 'TtsFn', {
       ...common, functionName: 'ttsFn',
       code: lambda.Code.fromAsset('../services'),
     });
+    // Streams Pexels clips into S3 (services/broll_pexels.py); Lambda network throughput scales with memory.
     const brollFn = new lambda.Function(this, 'BrollFn', {
       ...common, functionName: 'brollFn',
+      timeout: Duration.minutes(5),
+      memorySize: 1024,
       code: lambda.Code.fromAsset('../services'),
     });
     const uploadFn = new lambda.Function(this, 'UploadFn', {
@@ -54,16 +69,49 @@ export class WorkflowStack extends Stack {
       timeout: Duration.seconds(120),
       code: lambda.Code.fromAsset('../services'),
     });
+    // Read-only job dashboard over the status index (not part of the pipeline)
+    const statusFn = new lambda.Function(this, 'StatusFn', {
+      ...common, functionName: 'statusFn',
+      code: lambda.Code.fromAsset('../services'),
+    });
+
+    // Picks the render task size per job from the cost model (services/render_sizing.py)
+    const renderSizeFn = new lambda.Function(this, 'RenderSizeFn', {
+      ...common, functionName: 'renderSizeFn',
+      code: lambda.Code.fromAsset('../services'),
+    });
+
+    // Bulk script generation via Bedrock batch inference (driven by the ScriptBatch state machine)
+    const batchFn = new lambda.Function(this, 'BatchFn', {
+      ...common, functionName: 'batchFn',
+      timeout: Duration.minutes(15),
+      memorySize: 1024,
+      code: lambda.Code.fromAsset('../services'),
+    });
 
     // Data access
     props.mediaBucket.grantReadWrite(scriptFn);
     props.mediaBucket.grantReadWrite(ttsFn);
     props.mediaBucket.grantReadWrite(brollFn);
     props.mediaBucket.grantReadWrite(uploadFn);
+    props.mediaBucket.grantReadWrite(batchFn);
+    props.mediaBucket.grantRead(renderSizeFn);
+
+    // The scriptwriter brief: scriptFn/batchFn read it from the bucket, since their asset is services/ only.
+    new s3deploy.BucketDeployment(this, 'Prompts', {
+      sources: [s3deploy.Source.asset('../prompts')],
+      destinationBucket: props.mediaBucket,
+      destinationKeyPrefix: 'config/prompts/',
+      prune: false,
+    });
 
     props.jobsTable.grantReadWriteData(scriptFn);
     props.jobsTable.grantReadWriteData(ttsFn);
+    props.jobsTable.grantReadWriteData(brollFn);
     props.jobsTable.grantReadWriteData(uploadFn);
+    props.jobsTable.grantReadWriteData(batchFn);
+    props.jobsTable.grantReadData(statusFn);
+    props.jobsTable.grantReadData(renderSizeFn);
 
     // Bedrock & Polly
     scriptFn.addToRolePolicy(new iam.PolicyStatement({
@@ -71,6 +119,27 @@ export class WorkflowStack extends Stack {
       resources: [`arn:aws:bedrock:${region}::foundation-model/*`],
       effect: iam.Effect.ALLOW,
     }));
+    // Bedrock reads the batch input and writes its output with this role
+    const batchRole = new iam.Role(this, 'BedrockBatchRole', {
+      assumedBy: new iam.ServicePrincipal('bedrock.amazonaws.com'),
+    });
+    props.mediaBucket.grantReadWrite(batchRole);
+    batchFn.addEnvironment('BEDROCK_BATCH_ROLE_ARN', batchRole.roleArn);
+    batchFn.addToRolePolicy(new iam.PolicyStatement({
+      actions: ['bedrock:InvokeModel'],  // small remainders are generated on demand
+      resources: [`arn:aws:bedrock:${region}::foundation-model/*`],
+      effect: iam.Effect.ALLOW,
+    }));
+    batchFn.addToRolePolicy(new iam.PolicyStatement({
+      actions: ['bedrock:CreateModelInvocationJob', 'bedrock:GetModelInvocationJob'],
+      resources: ['*'],
+      effect: iam.Effect.ALLOW,
+    }));
+    batchFn.addToRolePolicy(new iam.PolicyStatement({
+      actions: ['iam:PassRole'],
+      resources: [batchRole.roleArn],
+      effect: iam.Effect.ALLOW,
+    }));
     ttsFn.addToRolePolicy(new iam.PolicyStatement({
       actions: ['polly:SynthesizeSpeech'],
       resources: ['*'],
@@ -99,42 +168,117 @@ export class WorkflowStack extends Stack {
       allowAllOutbound: true,
     });
 
-    // ECS render task
-    props.mediaBucket.grantReadWrite(props.rendererTask.taskRole);
-
-    const renderTask = new tasks.EcsRunTask(this, 'RenderECS', {
-      integrationPattern: sfn.IntegrationPattern.RUN_JOB,
-      cluster: props.cluster,
-      taskDefinition: props.rendererTask,
-      assignPublicIp: true,
-      launchTarget: new tasks.EcsFargateLaunchTarget(),
-      subnets: { subnetType: ec2.SubnetType.PUBLIC },
-      securityGroups: [rendererSG],
-      containerOverrides: [{
-        containerDefinition: props.rendererTask.defaultContainer!,
-        environment: [
-          { name: 'JOB_ID', value: sfn.JsonPath.stringAt('$.jobId') } as any,
-          { name: 'MEDIA_BUCKET', value: props.mediaBucket.bucketName } as any,
-          { name: 'AWS_REGION', value: region } as any,
-        ],
-      }],
+    // ECS render task, one state per task size ('RenderECS' is the medium/default one)
+    const renderTaskFor = (size: string, id: string) => {
+      const taskDefinition = props.rendererTasks[size];
+      props.mediaBucket.grantReadWrite(taskDefinition.taskRole);
+      return new tasks.EcsRunTask(this, id, {
+        integrationPattern: sfn.IntegrationPattern.RUN_JOB,
+        cluster: props.cluster,
+        taskDefinition,
+        assignPublicIp: true,
+        launchTarget: new tasks.EcsFargateLaunchTarget(),
+        subnets: { subnetType: ec2.SubnetType.PUBLIC },
+        securityGroups: [rendererSG],
+        containerOverrides: [{
+          containerDefinition: taskDefinition.defaultContainer!,
+          environment: [
+            { name: 'JOB_ID', value: sfn.JsonPath.stringAt('$.jobId') } as any,
+            { name: 'MEDIA_BUCKET', value: props.mediaBucket.bucketName } as any,
+            { name: 'AWS_REGION', value: region } as any,
+            // recorded next to the measured time in the job's cost sample
+            { name: 'RENDER_PREDICTED_SEC',
+              value: sfn.JsonPath.format('{}', sfn.JsonPath.stringAt('$.sizing.predictedSec')) } as any,
+          ],
+        }],
+        resultPath: '$.render',
+        // >>> extend the Step Functions state timeout for this task <<<
+        taskTimeout: sfn.Timeout.duration(Duration.minutes(15)),
+      });
+    };
+    const renderTask = renderTaskFor('medium', 'RenderECS');
+
+    // Size the task from the job's output length, clip count and deliverables.
+    // A sizing failure must not fail the job: fall back to the default size.
+    const sizeRender = new tasks.LambdaInvoke(this, 'SizeRender', {
+      lambdaFunction: renderSizeFn,
+      payload: sfn.TaskInput.fromObject({ 'jobId.$': '$.jobId' }),
+      resultSelector: { 'size.$': '$.Payload.size', 'predictedSec.$': '$.Payload.predictedSec' },
+      resultPath: '$.sizing',
+    });
+    const sizeDefault = new sfn.Pass(this, 'SizeDefault', {
+      result: sfn.Result.fromObject({ size: 'medium', predictedSec: null }),
+      resultPath: '$.sizing',
+    });
+    const renderSize = new sfn.Choice(this, 'RenderSize')
+      .when(sfn.Condition.stringEquals('$.sizing.size', 'small'), renderTaskFor('small', 'RenderECSSmall'))
+      .when(sfn.Condition.stringEquals('$.sizing.size', 'large'), renderTaskFor('large', 'RenderECSLarge'))
+      .otherwise(renderTask);
+    sizeRender.addCatch(sizeDefault, { resultPath: '$.sizingError' });
+    sizeDefault.next(renderSize);
+    const renderSized = sfn.Chain.start(sizeRender).next(renderSize);
+
+    // Queue-backed render for bulk runs: hand the job to the warm worker pool
+    // and wait for it to call back with the task token.
+    const renderQueued = new tasks.SqsSendMessage(this, 'RenderQueued', {
+      queue: props.renderQueue,
+      integrationPattern: sfn.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+      messageBody: sfn.TaskInput.fromObject({
+        jobId: sfn.JsonPath.stringAt('$.jobId'),
+        taskToken: sfn.JsonPath.taskToken,
+      }),
       resultPath: '$.render',
-      // >>> extend the Step Functions state timeout for this task <<<
       taskTimeout: sfn.Timeout.duration(Duration.minutes(15)),
     });
 
+    // Executions started with {"renderMode": "queue"} use the worker pool;
+    // everything else keeps the one-task-per-job path.
+    const renderChoice = new sfn.Choice(this, 'RenderMode')
+      .when(
+        sfn.Condition.and(
+          sfn.Condition.isPresent('$.renderMode'),
+          sfn.Condition.stringEquals('$.renderMode', 'queue'),
+        ),
+        renderQueued,
+      )
+      .otherwise(renderSized);
+
     // Steps
     const scriptStep = new tasks.LambdaInvoke(this, 'Script', { lambdaFunction: scriptFn, resultPath: '$.script' });
     const ttsStep    = new tasks.LambdaInvoke(this, 'TTS',    { lambdaFunction: ttsFn,    resultPath: '$.tts'    });
     const brollStep  = new tasks.LambdaInvoke(this, 'Broll',  { lambdaFunction: brollFn,  resultPath: '$.broll'  });
     const uploadStep = new tasks.LambdaInvoke(this, 'Upload', { lambdaFunction: uploadFn, resultPath: '$.upload' });
 
-    const definition = sfn.Chain
-      .start(scriptStep)
-      .next(ttsStep)
-      .next(brollStep)
-      .next(renderTask)
+    // TTS and B-roll/asset preparation only depend on the script, so they run as
+    // parallel branches; Render starts once both have finished. The original input
+    // ($.jobId, $.topic) is kept and the branch results are folded into $.prepare.
+    const prepare = new sfn.Parallel(this, 'Prepare', {
+      resultPath: '$.prepare',
+      resultSelector: {
+        'tts.$': '$[0].tts.Payload',
+        'broll.$': '$[1].broll.Payload',
+      },
+    })
+      .branch(ttsStep)
+      .branch(brollStep);
+
+    const afterScript = sfn.Chain
+      .start(prepare)
+      .next(renderChoice.afterwards())
       .next(uploadStep);
+    scriptStep.next(afterScript);
+
+    // batchFn starts executions with {"scriptReady": true} once it has written
+    // jobs/<id>/script.txt, so those skip straight to TTS/B-roll.
+    const definition = new sfn.Choice(this, 'HasScript')
+      .when(
+        sfn.Condition.and(
+          sfn.Condition.isPresent('$.scriptReady'),
+          sfn.Condition.booleanEquals('$.scriptReady', true),
+        ),
+        afterScript,
+      )
+      .otherwise(scriptStep);
 
     // Logs for the state machine
     const smLogs = new logs.LogGroup(this, 'PipelineLogs', {
@@ -152,9 +296,9 @@ export class WorkflowStack extends Stack {
     });
 
     // Allow SFN to run ECS and manage EventBridge callback
-    const taskDefArn = props.rendererTask.taskDefinitionArn;
-    const taskRoleArn = props.rendererTask.taskRole.roleArn;
-    const execRoleArn = props.rendererTask.obtainExecutionRole().roleArn;
+    const renderRoleArns = Object.values(props.rendererTasks).flatMap(t => [
+      t.taskRole.roleArn, t.obtainExecutionRole().roleArn,
+    ]);
 
     sm.addToRolePolicy(new iam.PolicyStatement({
       effect: iam.Effect.ALLOW,
@@ -164,7 +308,7 @@ export class WorkflowStack extends Stack {
     sm.addToRolePolicy(new iam.PolicyStatement({
       effect: iam.Effect.ALLOW,
       actions: ['iam:PassRole'],
-      resources: [taskRoleArn, execRoleArn],
+      resources: renderRoleArns,
     }));
     sm.addToRolePolicy(new iam.PolicyStatement({
       effect: iam.Effect.ALLOW,
@@ -176,5 +320,67 @@ export class WorkflowStack extends Stack {
     }));
 
     new CfnOutput(this, 'PipelineArn', { value: sm.stateMachineArn });
+
+    batchFn.addEnvironment('PIPELINE_ARN', sm.stateMachineArn);
+    sm.grantStartExecution(batchFn);
+
+    // Bulk scripts: submit one batch-inference job, poll it, then fan the
+    // results out (which starts one Pipeline execution per job).
+    // Input: {"jobs": [{"jobId", "topic"}, ...], "batchId": "optional"}
+    const batchSubmit = new tasks.LambdaInvoke(this, 'BatchSubmit', {
+      lambdaFunction: batchFn,
+      payload: sfn.TaskInput.fromObject({
+        action: 'submit',
+        'jobs.$': '$.jobs',
+        'batchId.$': '$$.Execution.Name',
+      }),
+      resultSelector: { 'submit.$': '$.Payload' },
+      resultPath: '$.batch',
+    });
+    const batchWait = new sfn.Wait(this, 'BatchWait', {
+      time: sfn.WaitTime.duration(Duration.minutes(5)),
+    });
+    const batchPoll = new tasks.LambdaInvoke(this, 'BatchPoll', {
+      lambdaFunction: batchFn,
+      payload: sfn.TaskInput.fromObject({
+        action: 'poll',
+        'jobArn.$': '$.batch.submit.jobArn',
+      }),
+      resultSelector: { 'status.$': '$.Payload.status', 'done.$': '$.Payload.done' },
+      resultPath: '$.poll',
+    });
+    const batchFanout = new tasks.LambdaInvoke(this, 'BatchFanout', {
+      lambdaFunction: batchFn,
+      payload: sfn.TaskInput.fromObject({
+        action: 'fanout',
+        'batchId.$': '$.batch.submit.batchId',
+      }),
+      resultSelector: { 'fanout.$': '$.Payload' },
+      resultPath: '$.fanout',
+    });
+    const batchDone = new sfn.Succeed(this, 'BatchDone');
+
+    const batchDefinition = batchSubmit.next(
+      new sfn.Choice(this, 'BatchSubmitted')
+        .when(sfn.Condition.isPresent('$.batch.submit.jobArn'), batchWait)
+        .otherwise(batchDone)
+    );
+    batchWait.next(batchPoll).next(
+      new sfn.Choice(this, 'BatchFinished')
+        .when(sfn.Condition.booleanEquals('$.poll.done', true), batchFanout)
+        .otherwise(batchWait)
+    );
+
+    // Input is a list of jobs, so keep it out of the logs
+    const batchSm = new sfn.StateMachine(this, 'ScriptBatch', {
+      definitionBody: sfn.DefinitionBody.fromChainable(batchDefinition),
+      timeout: Duration.hours(48),
+      logs: {
+        destination: new logs.LogGroup(this, 'ScriptBatchLogs', { retention: logs.RetentionDays.ONE_WEEK }),
+        level: sfn.LogLevel.ERROR,
+      },
+    });
+
+    new CfnOutput(this, 'ScriptBatchArn', { value: batchSm.stateMachineArn });
   }
 }
@@ -1,17 +1,69 @@
 import os
+import re
 import json
+import time
+import hashlib
 import tempfile
 import boto3
 from botocore.exceptions import ClientError
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 from google.oauth2.credentials import Credentials
 
 S3 = boto3.client("s3")
 SECRETS = boto3.client("secretsmanager")
+DDB = boto3.client("dynamodb")
 
 MEDIA_BUCKET = os.environ.get("MEDIA_BUCKET")
+JOBS_TABLE = os.environ.get("JOBS_TABLE")
+JOB_INDEX_SHARDS = int(os.environ.get("JOB_INDEX_SHARDS", "8"))
 YT_SECRET_NAME = os.environ.get("YT_SECRET_NAME", "youtube/oauth")
+YT_CAPTIONS = os.environ.get("YT_CAPTIONS", "1") == "1"
+
+def _record_upload_state(job_id: str, phase: str, started_ms: int = None, **attrs) -> int:
+    """
+    Upload-stage transition in the Jobs table layout of services/job_state.py.
+    Upload is the last stage, so completing it drops the job from the status index.
+    """
+    now = int(time.time() * 1000)
+    if not JOBS_TABLE:
+        return now
+    status = {"begin": "UPLOAD_RUNNING", "complete": "UPLOAD_DONE", "fail": "UPLOAD_FAILED"}[phase]
+    shard = int(hashlib.md5(job_id.encode("utf-8")).hexdigest(), 16) % JOB_INDEX_SHARDS
+    sets = {"status": {"S": status}, "updatedAt": {"N": str(now)}}
+    if phase == "begin":
+        sets["uploadStartedAt"] = {"N": str(now)}
+    elif phase == "complete":
+        sets["uploadFinishedAt"] = {"N": str(now)}
+        if started_ms is not None:
+            sets["uploadMs"] = {"N": str(now - started_ms)}
+    if phase != "complete":
+        sets["inflightStatus"] = {"S": f"{status}#{shard}"}
+    sets.update({k: {"S": str(v)} for k, v in attrs.items()})
+
+    names = {f"#a{i}": k for i, k in enumerate(sets)}
+    expr = "SET " + ", ".join(f"#a{i}=:v{i}" for i in range(len(sets)))
+    if phase == "complete":
+        names["#inflight"] = "inflightStatus"
+        expr += " REMOVE #inflight"
+    args = dict(
+        TableName=JOBS_TABLE,
+        Key={"jobId": {"S": job_id}},
+        UpdateExpression=expr,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={f":v{i}": v for i, v in enumerate(sets.values())},
+    )
+    if phase != "fail":
+        names["#guard"] = "uploadFinishedAt"
+        args["ConditionExpression"] = "attribute_not_exists(#guard)"
+    try:
+        DDB.update_item(**args)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        print(f"[STATE] {job_id}: upload already finished; not recording '{phase}'")
+    return now
 
 def _load_secret_json(name: str) -> dict:
     resp = SECRETS.get_secret_value(SecretId=name)
@@ -27,13 +79,16 @@ def _load_secret_json(name: str) -> dict:
         raise
 
 def _youtube_service(secret: dict):
+    # No scopes on refresh: the access token gets whatever the refresh token was
+    # granted (youtube.upload for videos; caption tracks also need youtube.force-ssl,
+    # and a token consented before captions existed gets a 403 for them; see
+    # _publish_captions).
     creds = Credentials(
         token=None,
         refresh_token=secret["refresh_token"],
         client_id=secret["client_id"],
         client_secret=secret["client_secret"],
         token_uri="https://oauth2.googleapis.com/token",
-        scopes=["https://www.googleapis.com/auth/youtube.upload"]
     )
     return build("youtube", "v3", credentials=creds, cache_discovery=False)
 
@@ -52,50 +107,256 @@ def lambda_handler(event, context):
     if not job_id:
         return {"ok": False, "error": "Missing jobId"}
 
-    # metadata (optional) and default title/desc
-    meta = {}
-    for cand in (f"jobs/{job_id}/meta.json", f"jobs/{job_id}/edl.json"):
+    t0 = _record_upload_state(job_id, "begin")
+    try:
+        result = _upload(job_id)
+    except Exception as e:
+        _record_upload_state(job_id, "fail", error=str(e)[:1000])
+        raise
+    _record_upload_state(job_id, "complete", t0, videoId=result["videoId"])
+    return result
+
+def _load_manifest(job_id: str):
+    """
+    The job manifest (services/job_manifest.py): the copy cached on the Jobs
+    item if there is one, else jobs/<id>/manifest.json. None for jobs written
+    before manifests existed.
+    """
+    if JOBS_TABLE:
+        item = DDB.get_item(TableName=JOBS_TABLE, Key={"jobId": {"S": job_id}},
+                            ProjectionExpression="manifestJson").get("Item") or {}
+        if "manifestJson" in item:
+            return json.loads(item["manifestJson"]["S"])
+    try:
+        obj = S3.get_object(Bucket=MEDIA_BUCKET, Key=f"jobs/{job_id}/manifest.json")
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        return None
+    return json.loads(obj["Body"].read().decode("utf-8"))
+
+def _load_meta(job_id: str, manifest) -> dict:
+    """
+    Upload metadata: the manifest's "meta" ({} without one; nothing else is
+    read). Jobs from before manifests: the first of meta.json / the EDL that exists.
+    """
+    if manifest is not None:
+        return manifest.get("meta") or {}
+    cands = [f"jobs/{job_id}/meta.json", f"jobs/{job_id}/edl.json"]
+    for cand in cands:
         try:
             obj = S3.get_object(Bucket=MEDIA_BUCKET, Key=cand)
-            meta = json.loads(obj["Body"].read().decode("utf-8"))
             print("[META] Loaded", cand)
-            break
+            return json.loads(obj["Body"].read().decode("utf-8"))
         except ClientError as e:
             if e.response["Error"]["Code"] != "NoSuchKey":
                 raise
             print("[META] Not found:", cand)
+    return {}
+
+# -------- Upload record (layout in services/job_state.py) --------
+
+UPLOAD_CLAIM_TTL_MS = 15 * 60 * 1000  # longer than this function's timeout
+
+def _upload_record(job_id: str) -> dict:
+    """Published-video and in-flight claim attributes of the Jobs item; {} without a table."""
+    if not JOBS_TABLE:
+        return {}
+    item = DDB.get_item(TableName=JOBS_TABLE, Key={"jobId": {"S": job_id}}, ConsistentRead=True,
+                        ProjectionExpression="videoId, videoSourceEtag, videoSourceSha256, uploadClaimAt, "
+                                             "videoCaptionId, videoCaptionsEtag").get("Item") or {}
+    return {k: next(iter(v.values())) for k, v in item.items()}
+
+def _update_record(job_id: str, sets: dict, remove=(), condition: str = None, values: dict = None):
+    names = {f"#a{i}": k for i, k in enumerate(sets)}
+    names.update({f"#r{j}": k for j, k in enumerate(remove)})
+    vals = {f":v{i}": v for i, v in enumerate(sets.values())}
+    vals.update(values or {})
+    parts = []
+    if sets:
+        parts.append("SET " + ", ".join(f"#a{i}=:v{i}" for i in range(len(sets))))
+    if remove:
+        parts.append("REMOVE " + ", ".join(f"#r{j}" for j in range(len(remove))))
+    args = dict(TableName=JOBS_TABLE, Key={"jobId": {"S": job_id}}, UpdateExpression=" ".join(parts),
+                ExpressionAttributeNames=names)
+    if vals:
+        args["ExpressionAttributeValues"] = vals
+    if condition:
+        names["#claim"] = "uploadClaimAt"
+        args["ConditionExpression"] = condition
+    DDB.update_item(**args)
+
+def _claim_upload(job_id: str, etag: str):
+    """Take the job's upload claim; raises if another execution holds a fresh one."""
+    if not JOBS_TABLE:
+        return
+    now = int(time.time() * 1000)
+    try:
+        _update_record(job_id, {"uploadClaimAt": {"N": str(now)}, "uploadClaimEtag": {"S": etag}},
+                       condition="attribute_not_exists(#claim) OR #claim < :stale",
+                       values={":stale": {"N": str(now - UPLOAD_CLAIM_TTL_MS)}})
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        raise RuntimeError(f"Upload of {job_id} already in progress in another execution")
+
+def _release_claim(job_id: str):
+    if JOBS_TABLE:
+        _update_record(job_id, {}, remove=("uploadClaimAt", "uploadClaimEtag"))
+
+def _save_upload_record(job_id: str, key: str, etag: str, sha256: str, video_id: str):
+    if not JOBS_TABLE:
+        return
+    _update_record(job_id, {
+        "videoId": {"S": video_id}, "videoSourceKey": {"S": key}, "videoSourceEtag": {"S": etag},
+        "videoSourceSha256": {"S": sha256}, "videoPublishedAt": {"N": str(int(time.time() * 1000))},
+    }, remove=("uploadClaimAt", "uploadClaimEtag"))
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# -------- Captions --------
+
+_SRT_STAMP = re.compile(r"(\d+):(\d{2}):(\d{2}),(\d{3})")
+
+def _shift_srt(text: str, seconds: float) -> str:
+    """``text`` with every cue moved ``seconds`` later."""
+    def shift(m):
+        ms = (int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))) * 1000 + int(m.group(4))
+        ms += round(seconds * 1000)
+        return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+    return _SRT_STAMP.sub(shift, text)
+
+def _scope_denied(e: HttpError) -> bool:
+    """A 403 because the refresh token was not granted youtube.force-ssl."""
+    body = e.content.decode("utf-8", "replace") if isinstance(e.content, bytes) else str(e.content or "")
+    # reason "insufficientPermissions", message "Request had insufficient authentication scopes."
+    return getattr(e.resp, "status", None) == 403 and "insufficient" in body.lower()
+
+def _publish_captions(job_id: str, video_id: str, manifest, record: dict, yt=None) -> dict:
+    """
+    Publish the job's sidecar captions (services/captions.py, written by the
+    TTS stage) as a caption track of ``video_id``. The cues are timed from
+    voice.wav, so they are shifted by the intro length the renderer recorded
+    on the "out" artifact (introSec). The track id and the SRT's ETag (with
+    that shift) go on the upload record, so a retry skips a published track
+    and a regenerated file replaces it. Returns the fields to add to the result.
+    """
+    arts = (manifest or {}).get("artifacts", {})
+    cap = arts.get("captions") or {}
+    if not YT_CAPTIONS or not cap.get("key"):
+        return {}
+    offset = float((arts.get("out") or {}).get("introSec") or 0)
+    etag = S3.head_object(Bucket=MEDIA_BUCKET, Key=cap["key"])["ETag"]
+    if offset:
+        etag = f"{etag}+{offset:g}"
+    same_video = record.get("videoId") == video_id
+    if same_video and record.get("videoCaptionsEtag") == etag:
+        return {"captionId": record.get("videoCaptionId"), "captionsSkipped": True}
+
+    local = _s3_download(cap["key"])
+    try:
+        if offset:
+            with open(local, "r", encoding="utf-8") as f:
+                text = _shift_srt(f.read(), offset)
+            with open(local, "w", encoding="utf-8") as f:
+                f.write(text)
+        yt = yt or _youtube_service(_load_secret_json(YT_SECRET_NAME))
+        media = MediaFileUpload(local, mimetype="application/octet-stream", resumable=False)
+        if same_video and record.get("videoCaptionId"):
+            resp = yt.captions().update(part="snippet", body={"id": record["videoCaptionId"]},
+                                        media_body=media).execute()
+        else:
+            snippet = {"videoId": video_id, "language": cap.get("language", "en"),
+                       "name": cap.get("name", ""), "isDraft": False}
+            resp = yt.captions().insert(part="snippet", body={"snippet": snippet}, media_body=media).execute()
+    except HttpError as e:
+        # The video is published; a missing track is reported, not retried forever.
+        if _scope_denied(e):
+            print(f"[YT] {job_id}: captions skipped: the refresh token in {YT_SECRET_NAME} lacks the "
+                  f"youtube.force-ssl scope; re-run the OAuth consent with it (or set YT_CAPTIONS=0)")
+            return {"captionsError": "missing youtube.force-ssl scope"}
+        print(f"[YT] {job_id}: caption upload failed: {e}")
+        return {"captionsError": str(e)[:300]}
+    finally:
+        try:
+            os.remove(local)
+        except OSError:
+            pass
+    cid = resp.get("id")
+    if JOBS_TABLE:
+        _update_record(job_id, {"videoCaptionId": {"S": cid}, "videoCaptionsEtag": {"S": etag}})
+    print(f"[YT] Captions published: {cap['key']} -> captionId={cid}")
+    return {"captionId": cid}
+
+def _upload(job_id: str) -> dict:
+
+    # metadata (optional) and default title/desc
+    manifest = _load_manifest(job_id)
+    meta = _load_meta(job_id, manifest)
 
     title = meta.get("title") or f"Auto Video {job_id}"
     description = meta.get("description") or meta.get("script") or f"Generated video for {job_id}"
     tags = meta.get("tags") or ["auto", "generated"]
 
     # find video path in S3
-    key = meta.get("outputKey") or f"jobs/{job_id}/out.mp4"
-    print(f"[YT] Starting upload: title='{title}', key={key}")
+    out = ((manifest or {}).get("artifacts", {}).get("out") or {}).get("key")
+    key = meta.get("outputKey") or out or f"jobs/{job_id}/out.mp4"
 
-    secret = _load_secret_json(YT_SECRET_NAME)
-    yt = _youtube_service(secret)
+    # A retried step whose insert already went through: same object, nothing to send.
+    etag = S3.head_object(Bucket=MEDIA_BUCKET, Key=key)["ETag"]
+    record = _upload_record(job_id)
+    if record.get("videoId") and record.get("videoSourceEtag") == etag:
+        print(f"[YT] {key} already published as videoId={record['videoId']}; not uploading again")
+        return {"ok": True, "videoId": record["videoId"], "skipped": True,
+                **_publish_captions(job_id, record["videoId"], manifest, record)}
 
-    local = _s3_download(key)
-    media = MediaFileUpload(local, chunksize=4 * 1024 * 1024, resumable=True)
+    _claim_upload(job_id, etag)
+    local, vid = None, None
+    try:
+        local = _s3_download(key)
+        sha256 = _sha256_file(local)
+        if record.get("videoId") and record.get("videoSourceSha256") == sha256:
+            # Rewritten with identical bytes (new ETag): still the published video.
+            print(f"[YT] {key} has the bytes of videoId={record['videoId']}; not uploading again")
+            _save_upload_record(job_id, key, etag, sha256, record["videoId"])
+            return {"ok": True, "videoId": record["videoId"], "skipped": True,
+                    **_publish_captions(job_id, record["videoId"], manifest, record)}
 
-    body = {
-        "snippet": {"title": title, "description": description, "tags": tags, "categoryId": "24"},  # Entertainment
-        "status": {"privacyStatus": meta.get("privacyStatus", "private")}
-    }
+        print(f"[YT] Starting upload: title='{title}', key={key}")
+        secret = _load_secret_json(YT_SECRET_NAME)
+        yt = _youtube_service(secret)
+        media = MediaFileUpload(local, chunksize=4 * 1024 * 1024, resumable=True)
 
-    request = yt.videos().insert(part="snippet,status", body=body, media_body=media)
-    response = None
-    while True:
-        status, response = request.next_chunk()
-        if response is not None:
-            break
+        body = {
+            "snippet": {"title": title, "description": description, "tags": tags, "categoryId": "24"},  # Entertainment
+            "status": {"privacyStatus": meta.get("privacyStatus", "private")}
+        }
 
-    vid = response.get("id")
-    print(f"[YT] Upload complete. videoId={vid}")
-    try:
-        os.remove(local)
-    except OSError:
-        pass
+        request = yt.videos().insert(part="snippet,status", body=body, media_body=media)
+        response = None
+        while True:
+            status, response = request.next_chunk()
+            if response is not None:
+                break
+
+        vid = response.get("id")
+        # Record before anything else can fail, so a retry finds it.
+        _save_upload_record(job_id, key, etag, sha256, vid)
+        print(f"[YT] Upload complete. videoId={vid}")
+    except Exception:
+        if vid is None:
+            _release_claim(job_id)
+        raise
+    finally:
+        if local:
+            try:
+                os.remove(local)
+            except OSError:
+                pass
 
-    return {"ok": True, "videoId": vid}
+    return {"ok": True, "videoId": vid, **_publish_captions(job_id, vid, manifest, record, yt)}
@@ -1,10 +1,52 @@
 #!/usr/bin/env python3
-import os, json, tempfile, subprocess, sys
+import os, re, json, tempfile, subprocess, sys, time, hashlib, shutil, signal, threading, urllib.request, wave
+_PROCESS_T0 = time.monotonic()  # start-up probe baseline: before boto3 is imported
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import boto3
 from botocore.exceptions import ClientError
 
 s3 = boto3.client("s3")
 
+# Warm asset cache (worker mode): clips are kept on local disk between jobs,
+# keyed by S3 key + ETag. Unset = download every asset fresh (one-shot tasks).
+ASSET_CACHE_DIR = os.environ.get("ASSET_CACHE_DIR")
+ASSET_CACHE_MAX_BYTES = int(os.environ.get("ASSET_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+_cache_guard = threading.Lock()
+_cache_locks = defaultdict(threading.Lock)
+
+# Extra deliverables produced from the same decode as out.mp4 (see build_outputs).
+# An EDL "outputs" list overrides RENDER_OUTPUTS per job.
+OUTPUT_KINDS = ("preview", "thumbnails", "vertical")
+RENDER_OUTPUTS = os.environ.get("RENDER_OUTPUTS", "preview,thumbnails")
+THUMB_COUNT = int(os.environ.get("THUMB_COUNT", "6"))
+THUMB_FORMAT = os.environ.get("THUMB_FORMAT", "jpg")  # jpg | webp
+THUMB_INTERVAL = float(os.environ.get("THUMB_INTERVAL", "10"))
+_THUMB_CODECS = {"jpg": ["-c:v", "mjpeg", "-q:v", "3"], "webp": ["-c:v", "libwebp", "-quality", "80"]}  # not libwebp_anim
+_CONTENT_TYPES = {".mp4": "video/mp4", ".jpg": "image/jpeg", ".webp": "image/webp"}
+
+# Branded segments (intro sting, disclaimer card, end screen): encoded once in
+# a locked format and joined to each job's own middle part with the concat
+# demuxer and stream copy, so a job only ever encodes its unique content.
+# Names resolve to s3://MEDIA_BUCKET/segments/<format>/<name>.mp4; an EDL
+# "intro"/"outro" list overrides RENDER_INTRO/RENDER_OUTRO.
+SEGMENT_PREFIX = "segments/"
+SEGMENT_FORMAT = os.environ.get("SEGMENT_FORMAT", "720p30")
+RENDER_INTRO = os.environ.get("RENDER_INTRO", "")
+RENDER_OUTRO = os.environ.get("RENDER_OUTRO", "")
+
+# Cost samples for the task-size model (services/render_sizing.py). The task
+# definition sets RENDER_SIZE/RENDER_VCPU; the workflow passes its prediction.
+RENDER_SIZE = os.environ.get("RENDER_SIZE")
+RENDER_VCPU = os.environ.get("RENDER_VCPU")
+RENDER_PREDICTED_SEC = os.environ.get("RENDER_PREDICTED_SEC")
+COST_SAMPLES_PREFIX = "metrics/render-cost/"
+
+# Job state in the Jobs table (attribute layout: services/job_state.py).
+JOBS_TABLE = os.environ.get("JOBS_TABLE")
+JOB_INDEX_SHARDS = int(os.environ.get("JOB_INDEX_SHARDS", "8"))
+_ddb = None
+
 def log(msg: str):
     print(msg, flush=True)
 
@@ -30,6 +72,323 @@ def s3_download(bucket: str, key: str, dst: str):
     s3.download_file(bucket, key, dst)
     log(f"[DL] s3://{bucket}/{key} -> {dst}")
 
+def _evict_cache():
+    """
+    Drop least-recently-used cache entries until under ASSET_CACHE_MAX_BYTES.
+    An entry is removed only under its own lock, and skipped while another job
+    holds it (reading or downloading), so a reader never loses its file; the
+    lock is pruned with the entry.
+    """
+    entries = []
+    for name in os.listdir(ASSET_CACHE_DIR):
+        if name.endswith(".part"):
+            continue
+        try:
+            st = os.stat(os.path.join(ASSET_CACHE_DIR, name))
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= ASSET_CACHE_MAX_BYTES:
+            break
+        path = os.path.join(ASSET_CACHE_DIR, name)
+        with _cache_guard:
+            lock = _cache_locks[path]
+        if not lock.acquire(blocking=False):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            log(f"[CACHE] Evicted {name}")
+        except FileNotFoundError:
+            pass
+        finally:
+            with _cache_guard:
+                _cache_locks.pop(path, None)
+            lock.release()
+
+def fetch_asset(bucket: str, key: str, dst: str):
+    """Download ``key`` to ``dst``, going through the warm asset cache when one is configured."""
+    if not ASSET_CACHE_DIR:
+        return s3_download(bucket, key, dst)
+    etag = s3.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+    name = hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest()[:32]
+    cached = os.path.join(ASSET_CACHE_DIR, f"{name}-{etag}{os.path.splitext(key)[1]}")
+    downloaded = False
+    while True:
+        with _cache_guard:
+            lock = _cache_locks[cached]
+        with lock:
+            with _cache_guard:
+                if _cache_locks.get(cached) is not lock:
+                    continue  # evicted (and its lock pruned) while we waited
+            if os.path.exists(cached):
+                os.utime(cached)
+                log(f"[CACHE] Hit s3://{bucket}/{key}")
+            else:
+                s3_download(bucket, key, cached + ".part")
+                os.replace(cached + ".part", cached)
+                downloaded = True
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            try:
+                os.link(cached, dst)
+            except OSError:
+                shutil.copyfile(cached, dst)
+        break
+    if downloaded:
+        _evict_cache()
+
+def fetch_voice(bucket: str, job_id: str, audio_key: str, dst: str, key: str = None) -> bool:
+    """
+    Download the job's voice track: ``key`` from the manifest when known,
+    otherwise probe the new layout, then legacy. False if absent.
+    """
+    if key:
+        s3_download(bucket, key, dst)
+        return True
+    for key in (f"jobs/{job_id}/{audio_key}", f"{job_id}/{audio_key}"):
+        if s3_exists(bucket, key):
+            s3_download(bucket, key, dst)
+            return True
+    return False
+
+def wav_seconds(path: str) -> float:
+    with wave.open(path, "rb") as wf:
+        return wf.getnframes() / float(wf.getframerate())
+
+def run_ffmpeg(cmd) -> int:
+    """Run ffmpeg, echoing its output; returns its peak RSS in MiB (for the cost samples)."""
+    log("[ffmpeg] " + " ".join(cmd))
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = proc.stdout.read()
+    proc.stdout.close()
+    # wait4 instead of wait(): the child's own rusage, not every child's so far.
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    sys.stdout.write(output)
+    sys.stdout.flush()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed with exit code {proc.returncode}")
+    return usage.ru_maxrss // 1024
+
+def requested_outputs(edl: dict):
+    """Deliverables besides out.mp4 for this job, in OUTPUT_KINDS order."""
+    raw = edl.get("outputs")
+    if raw is None:
+        raw = RENDER_OUTPUTS.split(",")
+    names = {str(o).strip() for o in raw if str(o).strip()}
+    unknown = names - set(OUTPUT_KINDS)
+    if unknown:
+        raise ValueError(f"Unknown render outputs {sorted(unknown)}; expected any of {OUTPUT_KINDS}")
+    return [k for k in OUTPUT_KINDS if k in names]
+
+def build_outputs(timeline: str, outputs, tmp: str, audio: str = None, locked: dict = None):
+    """
+    Filter graph and output arguments for one ffmpeg run: ``timeline`` (the
+    trimmed source, e.g. "[0:v]trim=...,setpts=PTS-STARTPTS") is decoded and
+    filtered once and ``split`` feeds the main MP4 plus every requested
+    deliverable. ``audio`` is the narration stream ("1:a:0"); without it the
+    outputs are video only. ``locked`` (a segment_format) conforms the main
+    MP4 to the branded-segment format so it can be joined by stream copy.
+    Returns (filter_complex, output_args, files) where files maps
+    "main"/"preview"/"vertical" to a path and "thumbnails" to a directory.
+    """
+    labels = ["main"] + list(outputs)
+    graph = [f"{timeline},split={len(labels)}" + "".join(f"[s{label}]" for label in labels)]
+    files = {"main": os.path.join(tmp, "out.mp4")}
+
+    def with_audio(bitrate):
+        return ["-map", audio, "-c:a", "aac", "-b:a", bitrate, "-shortest"] if audio else ["-an"]
+
+    if locked:
+        graph.append(f"[smain]{locked_video_filter(locked)}[vmain]")
+        args = ["-map", "[vmain]",
+                *(["-map", audio, *locked_audio_args(locked), "-shortest"] if audio else ["-an"]),
+                *locked_video_args(locked), files["main"]]
+    else:
+        args = ["-map", "[smain]", *with_audio("192k"),
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", files["main"]]
+    if "preview" in outputs:
+        files["preview"] = os.path.join(tmp, "preview.mp4")
+        graph.append("[spreview]scale=-2:360,fps=24[vpreview]")
+        args += ["-map", "[vpreview]", *with_audio("64k"),
+                 "-c:v", "libx264", "-preset", "veryfast", "-b:v", "400k", "-maxrate", "500k",
+                 "-bufsize", "1000k", "-movflags", "+faststart", files["preview"]]
+    if "thumbnails" in outputs:
+        files["thumbnails"] = os.path.join(tmp, "thumbs")
+        os.makedirs(files["thumbnails"], exist_ok=True)
+        # First frame, then scene changes (at most one a second) with a frame every
+        # THUMB_INTERVAL seconds as a fallback for static footage; scored on a downscaled copy.
+        graph.append("[sthumbnails]scale=640:-2,select='isnan(prev_selected_t)"
+                     "+gt(scene,0.3)*gte(t-prev_selected_t,1)"
+                     f"+gte(t-prev_selected_t,{THUMB_INTERVAL})'[vthumbs]")
+        args += ["-map", "[vthumbs]", "-fps_mode", "vfr", "-frames:v", str(THUMB_COUNT),
+                 *_THUMB_CODECS.get(THUMB_FORMAT, []), "-f", "image2",
+                 os.path.join(files["thumbnails"], f"thumb_%02d.{THUMB_FORMAT}")]
+    if "vertical" in outputs:
+        files["vertical"] = os.path.join(tmp, "vertical.mp4")
+        graph.append("[svertical]crop=trunc(ih*9/16/2)*2:ih,scale=1080:1920,setsar=1[vvertical]")
+        args += ["-map", "[vvertical]", *with_audio("192k"),
+                 "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", files["vertical"]]
+    return ";".join(graph), args, files
+
+def deliverable_uploads(job_id: str, files: dict):
+    """
+    (local path, S3 key) pairs for everything except the main MP4, plus
+    job-state attributes and manifest entries.
+    """
+    uploads, attrs, arts = [], {}, {}
+    for kind in ("preview", "vertical"):
+        if kind in files:
+            key = f"jobs/{job_id}/{kind}.mp4"
+            uploads.append((files[kind], key))
+            attrs[f"{kind}Key"] = key
+            arts[kind] = {"key": key, "bytes": os.path.getsize(files[kind])}
+    if "thumbnails" in files:
+        thumbs = sorted(os.listdir(files["thumbnails"]))
+        keys = [f"jobs/{job_id}/thumbs/{name}" for name in thumbs]
+        uploads += [(os.path.join(files["thumbnails"], n), k) for n, k in zip(thumbs, keys)]
+        attrs["thumbKeys"] = json.dumps(keys)
+        arts["thumbnails"] = {"keys": keys}
+    return uploads, attrs, arts
+
+def upload_many(bucket: str, uploads):
+    """Upload (local path, key) pairs concurrently."""
+    def put(item):
+        path, key = item
+        log(f"[UPLOAD] s3://{bucket}/{key}")
+        s3.upload_file(path, bucket, key,
+                       ExtraArgs={"ContentType": _CONTENT_TYPES.get(os.path.splitext(key)[1], "binary/octet-stream")})
+    if uploads:
+        with ThreadPoolExecutor(max_workers=min(8, len(uploads))) as pool:
+            list(pool.map(put, uploads))
+
+# -------- Branded segments --------
+
+# Everything stream copy needs to agree on between segments and a job's
+# middle: frame size, rate, pixel format, H.264 profile/level, MP4 timescale,
+# and AAC rate/layout. A segment is stamped with the signature of the format
+# it was encoded for and refused under any other.
+SEGMENT_FORMATS = {
+    "720p30": {"width": 1280, "height": 720, "fps": 30},
+    "1080p30": {"width": 1920, "height": 1080, "fps": 30},
+}
+_LOCKED = {"preset": "veryfast", "crf": 23, "profile": "high", "level": "4.1", "pix_fmt": "yuv420p",
+           "timescale": 15360, "audio_rate": 48000, "audio_channels": 2, "audio_bitrate": "192k"}
+
+def segment_format(fmt_id: str = None) -> dict:
+    fmt_id = fmt_id or SEGMENT_FORMAT
+    if fmt_id not in SEGMENT_FORMATS:
+        raise ValueError(f"Unknown segment format '{fmt_id}'; expected one of {sorted(SEGMENT_FORMATS)}")
+    fmt = {"id": fmt_id, **SEGMENT_FORMATS[fmt_id], **_LOCKED}
+    fmt["signature"] = f"{fmt_id}-" + hashlib.sha256(json.dumps(fmt, sort_keys=True).encode("utf-8")).hexdigest()[:10]
+    return fmt
+
+def locked_video_filter(fmt: dict) -> str:
+    w, h = fmt["width"], fmt["height"]
+    return (f"scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,"
+            f"setsar=1,fps={fmt['fps']},format={fmt['pix_fmt']}")
+
+def locked_video_args(fmt: dict):
+    return ["-c:v", "libx264", "-preset", fmt["preset"], "-crf", str(fmt["crf"]),
+            "-profile:v", fmt["profile"], "-level:v", fmt["level"], "-pix_fmt", fmt["pix_fmt"],
+            "-g", str(2 * fmt["fps"]), "-video_track_timescale", str(fmt["timescale"])]
+
+def locked_audio_args(fmt: dict):
+    return ["-c:a", "aac", "-b:a", fmt["audio_bitrate"], "-ar", str(fmt["audio_rate"]),
+            "-ac", str(fmt["audio_channels"])]
+
+def requested_segments(edl: dict):
+    """(intro names, outro names) for this job."""
+    def names(field, default):
+        raw = edl.get(field)
+        if raw is None:
+            raw = default.split(",")
+        return [str(n).strip() for n in raw if str(n).strip()]
+    return names("intro", RENDER_INTRO), names("outro", RENDER_OUTRO)
+
+def segment_key(name: str, fmt: dict) -> str:
+    return f"{SEGMENT_PREFIX}{fmt['id']}/{name}.mp4"
+
+def fetch_segment(bucket: str, name: str, fmt: dict, dst: str) -> str:
+    """Download one library segment after checking it was encoded for ``fmt``."""
+    key = segment_key(name, fmt)
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise ValueError(f"Segment '{name}' not found at s3://{bucket}/{key}")
+        raise
+    stamped = head.get("Metadata", {}).get("segment-format")
+    if stamped != fmt["signature"]:
+        raise ValueError(f"Segment '{name}' was encoded for '{stamped}', not '{fmt['signature']}'; "
+                         f"re-encode it with render.py --encode-segment")
+    fetch_asset(bucket, key, dst)
+    return dst
+
+def concat_segments(parts, dst: str) -> int:
+    """Join same-format MP4s with the concat demuxer, stream copy only. Returns ffmpeg peak RSS (MiB)."""
+    listing = dst + ".txt"
+    with open(listing, "w", encoding="utf-8") as f:
+        for path in parts:
+            f.write("file '" + os.path.abspath(path).replace("'", "'\\''") + "'\n")
+    return run_ffmpeg(["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", listing,
+                       "-map", "0:v:0", "-map", "0:a:0", "-c", "copy", "-movflags", "+faststart", dst])
+
+def fetch_segments(pool, bucket: str, segments, fmt: dict, tmp: str):
+    """Submit downloads of the (intro, outro) segments to ``pool``; returns (intro futures, outro futures)."""
+    def submit(names, part):
+        return [pool.submit(fetch_segment, bucket, n, fmt, os.path.join(tmp, "segments", f"{part}_{i:02d}_{n}.mp4"))
+                for i, n in enumerate(names)]
+    return submit(segments[0], "intro"), submit(segments[1], "outro")
+
+def media_seconds(path: str) -> float:
+    """Container duration of ``path`` from ffmpeg's input summary."""
+    probe = subprocess.run(["ffmpeg", "-hide_banner", "-i", path], capture_output=True, text=True)
+    m = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", probe.stderr)
+    if not m:
+        raise ValueError(f"Could not read the duration of {path}")
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+
+def intro_seconds(intro_paths) -> float:
+    """How far the narration is pushed back by the intro segments (caption cues are timed from voice.wav)."""
+    return round(sum(media_seconds(p) for p in intro_paths), 3)
+
+def join_segments(middle: str, intro_paths, outro_paths) -> str:
+    """``middle`` framed by the intro/outro segments (stream copy); ``middle`` itself when there are none."""
+    if not intro_paths and not outro_paths:
+        return middle
+    joined = os.path.splitext(middle)[0] + "_branded.mp4"
+    t0 = time.monotonic()
+    concat_segments([*intro_paths, middle, *outro_paths], joined)
+    log(f"[SEGMENTS] {len(intro_paths)} intro + {len(outro_paths)} outro segment(s) joined "
+        f"by stream copy in {time.monotonic() - t0:.2f}s")
+    return joined
+
+def encode_segment(src: str, name: str, bucket: str, fmt_id: str = None) -> str:
+    """
+    Pre-encode a branding clip into the segment library in the locked format
+    (silent audio is added if the source has none, so every part has one video
+    and one audio stream) and upload it stamped with the format signature.
+    """
+    fmt = segment_format(fmt_id)
+    probe = subprocess.run(["ffmpeg", "-hide_banner", "-i", src], capture_output=True, text=True)
+    has_audio = "Audio:" in probe.stderr
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, f"{name}.mp4")
+        audio_in = [] if has_audio else ["-f", "lavfi", "-i",
+                                         f"anullsrc=r={fmt['audio_rate']}:cl=stereo"]
+        run_ffmpeg(["ffmpeg", "-y", "-i", src, *audio_in,
+                    "-filter_complex", f"[0:v]{locked_video_filter(fmt)}[v]",
+                    "-map", "[v]", "-map", "0:a:0" if has_audio else "1:a:0", "-shortest",
+                    *locked_video_args(fmt), *locked_audio_args(fmt), "-movflags", "+faststart", out])
+        key = segment_key(name, fmt)
+        s3.upload_file(out, bucket, key, ExtraArgs={"ContentType": "video/mp4",
+                                                    "Metadata": {"segment-format": fmt["signature"]}})
+        log(f"[SEGMENT] s3://{bucket}/{key} ({fmt['signature']})")
+        return key
+
 def parse_tracks_edl(edl: dict):
     """
     Minimal EDL schema:
@@ -58,45 +417,252 @@ def parse_tracks_edl(edl: dict):
 
     raise ValueError("EDL has no clips")
 
-def main():
-    # JOB id: prefer env JOB_ID; default to demo placeholder for dev
-    job_id = os.environ.get("JOB_ID") or os.environ.get("JOB") or "demo-xxxx"
-    bucket = os.environ["MEDIA_BUCKET"]
+def _attr_value(v) -> dict:
+    """Typed DynamoDB value: numbers stay numbers so cost/dashboard queries can compare them."""
+    if isinstance(v, bool):
+        return {"BOOL": v}
+    if isinstance(v, (int, float)):
+        return {"N": str(v)}
+    return {"S": str(v)}
+
+def record_render_state(job_id: str, phase: str, started_ms: int = None, **attrs) -> int:
+    """
+    Write a render-stage transition ("begin", "complete" or "fail") using the
+    same attributes and status index key as services/job_state.py. No-op
+    without JOBS_TABLE. Returns now in epoch ms.
+    """
+    global _ddb
+    now = int(time.time() * 1000)
+    if not JOBS_TABLE:
+        return now
+    if _ddb is None:
+        _ddb = boto3.client("dynamodb")
+    status = {"begin": "RENDER_RUNNING", "complete": "RENDER_DONE", "fail": "RENDER_FAILED"}[phase]
+    shard = int(hashlib.md5(job_id.encode("utf-8")).hexdigest(), 16) % JOB_INDEX_SHARDS
+    sets = {"status": {"S": status}, "inflightStatus": {"S": f"{status}#{shard}"}, "updatedAt": {"N": str(now)}}
+    if phase == "begin":
+        sets["renderStartedAt"] = {"N": str(now)}
+    elif phase == "complete":
+        sets["renderFinishedAt"] = {"N": str(now)}
+        if started_ms is not None:
+            sets["renderMs"] = {"N": str(now - started_ms)}
+    sets.update({k: _attr_value(v) for k, v in attrs.items()})
+
+    names = {f"#a{i}": k for i, k in enumerate(sets)}
+    args = dict(
+        TableName=JOBS_TABLE,
+        Key={"jobId": {"S": job_id}},
+        UpdateExpression="SET " + ", ".join(f"#a{i}=:v{i}" for i in range(len(sets))),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={f":v{i}": v for i, v in enumerate(sets.values())},
+    )
+    if phase != "fail":
+        # A retried render must not move an already finished job backwards.
+        names["#guard"] = "renderFinishedAt"
+        args["ConditionExpression"] = "attribute_not_exists(#guard)"
+    try:
+        _ddb.update_item(**args)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        log(f"[STATE] {job_id}: render already finished; not recording '{phase}'")
+    return now
+
+# -------- Job manifest (layout and write rules: services/job_manifest.py) --------
+
+_MANIFEST_CONFLICT = ("PreconditionFailed", "ConditionalRequestConflict")
+
+def _manifest_from_s3(bucket: str, job_id: str):
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=f"jobs/{job_id}/manifest.json")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404", "NotFound"):
+            return None, None
+        raise
+    return json.loads(obj["Body"].read().decode("utf-8")), obj["ETag"]
+
+def load_manifest(bucket: str, job_id: str):
+    """
+    (manifest, etag): the copy cached on the Jobs item, else jobs/<id>/manifest.json.
+    (None, None) for jobs written before manifests existed.
+    """
+    global _ddb
+    if JOBS_TABLE:
+        if _ddb is None:
+            _ddb = boto3.client("dynamodb")
+        item = _ddb.get_item(TableName=JOBS_TABLE, Key={"jobId": {"S": job_id}},
+                             ProjectionExpression="manifestJson, manifestEtag").get("Item") or {}
+        if "manifestJson" in item:
+            log(f"[MANIFEST] {job_id}: rev from Jobs item")
+            return json.loads(item["manifestJson"]["S"]), item.get("manifestEtag", {}).get("S")
+    return _manifest_from_s3(bucket, job_id)
 
-    # Try new layout first, then legacy
+def update_manifest(bucket: str, job_id: str, artifacts: dict, base, attempts: int = 5):
+    """
+    Merge ``artifacts`` into the manifest read as ``base`` = (manifest, etag)
+    with an If-Match put; on a conflicting write re-read it and retry.
+    Returns the manifest as written, or None if the job has none.
+    """
+    doc, etag = base
+    for _ in range(attempts):
+        if doc is not None and etag is None:
+            doc, etag = _manifest_from_s3(bucket, job_id)  # item copy without its ETag
+        if doc is None:
+            # No manifest (legacy job, or removed since it was read): nothing to merge into.
+            log(f"[MANIFEST] {job_id}: no manifest; outputs not recorded")
+            return None
+        new = dict(doc, artifacts={**doc.get("artifacts", {}), **artifacts})
+        new["rev"] = doc.get("rev", 0) + 1
+        new["updatedAt"] = int(time.time() * 1000)
+        try:
+            resp = s3.put_object(Bucket=bucket, Key=f"jobs/{job_id}/manifest.json",
+                                 Body=json.dumps(new).encode("utf-8"), ContentType="application/json",
+                                 CacheControl="no-cache", IfMatch=etag)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in _MANIFEST_CONFLICT:
+                raise
+            doc, etag = _manifest_from_s3(bucket, job_id)
+            continue
+        if JOBS_TABLE:
+            try:
+                _ddb.update_item(
+                    TableName=JOBS_TABLE, Key={"jobId": {"S": job_id}},
+                    UpdateExpression="SET manifestJson = :doc, manifestEtag = :etag, manifestRev = :rev",
+                    ConditionExpression="attribute_not_exists(manifestRev) OR manifestRev < :rev",
+                    ExpressionAttributeValues={":doc": {"S": json.dumps(new)}, ":etag": {"S": resp["ETag"]},
+                                               ":rev": {"N": str(new["rev"])}},
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+        return new
+    raise RuntimeError(f"Could not update manifest for {job_id} after {attempts} attempts")
+
+def read_legacy_edl(bucket: str, job_id: str) -> dict:
+    """Jobs without a manifest: try the new EDL layout first, then legacy."""
     candidate_keys = [f"jobs/{job_id}/edl.json", f"{job_id}/edl.json"]
-    edl = None
-    used_key = None
     for k in candidate_keys:
         try:
             log(f"[EDL] Trying s3://{bucket}/{k}")
-            edl = s3_read_json(bucket, k)
-            used_key = k
-            break
+            return s3_read_json(bucket, k)
         except ClientError as e:
             code = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
             if code == 404 or e.response.get("Error", {}).get("Code") in ("NoSuchKey", "NotFound"):
                 continue
             raise
-    if edl is None:
-        raise FileNotFoundError(f"Could not find EDL at any of: {candidate_keys}")
+    raise FileNotFoundError(f"Could not find EDL at any of: {candidate_keys}")
+
+def render_job(job_id: str, bucket: str) -> str:
+    """Render one job end to end, recording job state, and return the S3 key of the uploaded MP4."""
+    t0 = record_render_state(job_id, "begin")
+    try:
+        out_key, extra = _render(job_id, bucket)
+    except Exception as e:
+        record_render_state(job_id, "fail", error=str(e)[:1000])
+        raise
+    record_render_state(job_id, "complete", t0, outKey=out_key, **extra)
+    return out_key
+
+def _render(job_id: str, bucket: str):
+    """Returns (out key, job-state attributes). One manifest read locates every input."""
+    manifest, etag = load_manifest(bucket, job_id)
+    if manifest:
+        arts = manifest["artifacts"]
+        # A job started before B-roll wrote manifests may still have only the old EDL.
+        edl = s3_read_json(bucket, arts["edl"]["key"]) if "edl" in arts else read_legacy_edl(bucket, job_id)
+        voice_key = arts.get("voice", {}).get("key")
+        variants = manifest.get("variants")
+    else:
+        edl, voice_key, variants = read_legacy_edl(bucket, job_id), None, None
 
     audio_key, clip = parse_tracks_edl(edl)
     log(f"[EDL] Parsed 1 clip; audio_key='{audio_key}'")
 
+    outputs = requested_outputs(edl)
+    segments = requested_segments(edl)
+    t0 = time.monotonic()
+    if variants:
+        out_key, attrs, produced, cost = _render_variants(job_id, bucket, clip, variants, outputs, segments)
+    else:
+        out_key, attrs, produced, cost = _render_single(job_id, bucket, clip, audio_key, voice_key, outputs,
+                                                        segments)
+    if segments[0] or segments[1]:
+        attrs["renderSegments"] = json.dumps({"intro": segments[0], "outro": segments[1]})
+    if manifest:
+        update_manifest(bucket, job_id, produced, (manifest, etag))
+    attrs.update(record_cost_sample(bucket, job_id, edl, outputs, len(variants or [None]), cost,
+                                    time.monotonic() - t0))
+    return out_key, attrs
+
+def task_cores() -> float:
+    if RENDER_VCPU:
+        return float(RENDER_VCPU)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _predicted_sec():
+    """The workflow passes "null" when the job could not be sized."""
+    try:
+        return float(RENDER_PREDICTED_SEC)
+    except (TypeError, ValueError):
+        return None
+
+def record_cost_sample(bucket: str, job_id: str, edl: dict, outputs, variants: int, cost: dict,
+                       wall_s: float) -> dict:
+    """
+    Write this job's render measurements to metrics/render-cost/<jobId>.json
+    (the sample layout services/render_sizing.fit reads) and return the
+    job-state attributes summarising them. Best effort: a failed write is
+    logged, not raised.
+    """
+    cores = task_cores()
+    out_s = max(cost["outputSec"], 0.001)
+    sample = {
+        "jobId": job_id,
+        "profile": "+".join(["main", *sorted(outputs)]),
+        "cores": cores,
+        "clips": sum(len(t.get("clips") or []) for t in edl.get("tracks") or []),
+        "variants": variants,
+        "outputSec": round(out_s, 3),
+        "encodeSec": round(cost["encodeSec"], 3),
+        "wallSec": round(wall_s, 3),
+        "rssMiB": cost["rssMiB"],
+        # encode seconds per output second per core (linear-scaling view; the fit refines it)
+        "k": round(cost["encodeSec"] * cores / out_s, 4),
+        "size": RENDER_SIZE,
+        "predictedSec": _predicted_sec(),
+        "at": int(time.time() * 1000),
+    }
+    log(f"[COST] {json.dumps(sample)}")
+    try:
+        s3.put_object(Bucket=bucket, Key=f"{COST_SAMPLES_PREFIX}{job_id}.json",
+                      Body=json.dumps(sample).encode("utf-8"), ContentType="application/json")
+    except ClientError as e:
+        log(f"[COST] Could not write sample for {job_id}: {e}")
+    attrs = {"renderProfile": sample["profile"], "renderEncodeSec": sample["encodeSec"],
+             "renderOutputSec": sample["outputSec"], "renderCostK": sample["k"]}
+    if RENDER_SIZE:
+        attrs["renderSize"] = RENDER_SIZE
+    return attrs
+
+def _render_single(job_id: str, bucket: str, clip: dict, audio_key: str, voice_key: str, outputs,
+                   segments=((), ())):
+    # Branded segments: only the middle is encoded, in their format, then joined.
+    fmt = segment_format() if segments[0] or segments[1] else None
     with tempfile.TemporaryDirectory() as tmp:
-        # Download the video clip
+        # Fetch the video clip, the voice track and any segments concurrently; none depends on another.
         video_path = os.path.join(tmp, "clip_000", os.path.basename(clip["s3_key"]))
-        s3_download(bucket, clip["s3_key"], video_path)
-
-        # Determine a voice track
         voice_local = os.path.join(tmp, "voice.wav")
-        got_voice = False
-        for key in (f"jobs/{job_id}/{audio_key}", f"{job_id}/{audio_key}"):
-            if s3_exists(bucket, key):
-                s3_download(bucket, key, voice_local)
-                got_voice = True
-                break
+        with ThreadPoolExecutor(max_workers=2 + len(segments[0]) + len(segments[1])) as pool:
+            clip_fut = pool.submit(fetch_asset, bucket, clip["s3_key"], video_path)
+            voice_fut = pool.submit(fetch_voice, bucket, job_id, audio_key, voice_local, voice_key)
+            intro_futs, outro_futs = fetch_segments(pool, bucket, segments, fmt, tmp)
+            clip_fut.result()
+            got_voice = voice_fut.result()
+            intro_paths = [f.result() for f in intro_futs]
+            outro_paths = [f.result() for f in outro_futs]
 
         if not got_voice:
             # Generate 1s of silence if voice is missing
@@ -111,37 +677,281 @@ def main():
         start = clip["start"] or 0.0
         duration = clip["duration"]  # may be None
 
-        # Filter: trim + reset PTS for video
+        # Filter: trim + reset PTS for video, decoded once and split across all deliverables
         # If no duration given, let the video run; otherwise set end = start+duration
-        filter_video = f"[0:v]trim=start={start}" + (f":end={start + duration}" if duration is not None else "") + ",setpts=PTS-STARTPTS[vout]"
-
-        out_path = os.path.join(tmp, "out.mp4")
+        timeline = f"[0:v]trim=start={start}" + (f":end={start + duration}" if duration is not None else "") + ",setpts=PTS-STARTPTS"
+        filter_complex, out_args, files = build_outputs(timeline, outputs, tmp, audio="1:a:0", locked=fmt)
 
         cmd = [
             "ffmpeg", "-y",
             "-i", video_path,      # input #0 (video)
             "-i", voice_local,     # input #1 (audio)
-            "-filter_complex", filter_video,
-            "-map", "[vout]",      # mapped filtered video
-            "-map", "1:a:0",       # mapped audio from input #1
-            "-shortest",
-            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
-            "-c:a", "aac", "-b:a", "192k",
-            out_path,
+            "-filter_complex", filter_complex,
+            *out_args,
         ]
 
-        log("[ffmpeg] " + " ".join(cmd))
-        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        sys.stdout.write(proc.stdout)
-        sys.stdout.flush()
-        if proc.returncode != 0:
-            raise RuntimeError(f"ffmpeg failed with exit code {proc.returncode}")
+        t0 = time.monotonic()
+        rss = run_ffmpeg(cmd)
+        voice_s = wav_seconds(voice_local)
+        cost = {"encodeSec": time.monotonic() - t0, "rssMiB": rss,
+                "outputSec": min(voice_s, duration) if duration is not None else voice_s}
 
-        # Upload result next to the EDL under jobs/<job_id>/out.mp4
+        main_path = join_segments(files["main"], intro_paths, outro_paths)
+
+        # Upload results next to the EDL under jobs/<job_id>/
         out_key = f"jobs/{job_id}/out.mp4"
-        log(f"[UPLOAD] s3://{bucket}/{out_key}")
-        s3.upload_file(out_path, bucket, out_key, ExtraArgs={"ContentType": "video/mp4"})
+        uploads, attrs, produced = deliverable_uploads(job_id, files)
+        produced["out"] = {"key": out_key, "bytes": os.path.getsize(main_path)}
+        if intro_paths:
+            produced["out"]["introSec"] = intro_seconds(intro_paths)
+        upload_many(bucket, [(main_path, out_key)] + uploads)
+        log("[DONE] Render complete.")
+        return out_key, attrs, produced, cost
+
+def _render_variants(job_id: str, bucket: str, clip: dict, variants: list, outputs=(), segments=((), ())):
+    """
+    Variant mode: encode the B-roll timeline once (video only, as long as the
+    longest narration, together with any other deliverables), then build each
+    variant by stream-copying that video and encoding only its own audio. The
+    first variant is the job's out.mp4; the others go to
+    jobs/<id>/variants/<name>/out.mp4. Preview and vertical cuts get the first
+    variant's narration the same way. Branded segments frame every variant's
+    out.mp4 (joined after its mux); previews and vertical cuts stay unbranded.
+    """
+    fmt = segment_format() if segments[0] or segments[1] else None
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, "clip_000", os.path.basename(clip["s3_key"]))
+        voices = {v["name"]: os.path.join(tmp, "voices", f"{v['name']}.wav") for v in variants}
+        with ThreadPoolExecutor(max_workers=1 + len(variants) + len(segments[0]) + len(segments[1])) as pool:
+            futs = [pool.submit(fetch_asset, bucket, clip["s3_key"], video_path)]
+            futs += [pool.submit(s3_download, bucket, v["audio_key"], voices[v["name"]]) for v in variants]
+            intro_futs, outro_futs = fetch_segments(pool, bucket, segments, fmt, tmp)
+            for f in futs:
+                f.result()
+            intro_paths = [f.result() for f in intro_futs]
+            outro_paths = [f.result() for f in outro_futs]
+
+        start = clip["start"] or 0.0
+        longest = max(wav_seconds(p) for p in voices.values())
+        length = min(clip["duration"], longest) if clip["duration"] is not None else longest
+        timeline = f"[0:v]trim=start={start}:end={start + length},setpts=PTS-STARTPTS"
+        filter_complex, out_args, files = build_outputs(timeline, outputs, tmp, locked=fmt)
+        t0 = time.monotonic()
+        rss = run_ffmpeg(["ffmpeg", "-y", "-i", video_path, "-filter_complex", filter_complex, *out_args])
+        encode_s = time.monotonic() - t0
+        log(f"[VARIANTS] Video encoded once in {encode_s:.2f}s for {len(variants)} variants")
+
+        # (silent video, narration, audio bitrate, S3 key, framed by the branded segments)
+        primary = voices[variants[0]["name"]]
+        keys = {}
+        muxes = []
+        for i, v in enumerate(variants):
+            keys[v["name"]] = f"jobs/{job_id}/out.mp4" if i == 0 else f"jobs/{job_id}/variants/{v['name']}/out.mp4"
+            muxes.append((files["main"], voices[v["name"]], "192k", keys[v["name"]], True))
+        uploads, attrs, produced = deliverable_uploads(job_id, files)
+        for path, key in uploads:
+            if key.endswith(".mp4"):
+                muxes.append((path, primary, "64k" if path == files.get("preview") else "192k", key, False))
+        stills = [(path, key) for path, key in uploads if not key.endswith(".mp4")]
+
+        def mux(item):
+            video, voice, bitrate, key, branded = item
+            out_path = os.path.join(tmp, "muxed", key.replace("/", "_"))
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            audio_args = locked_audio_args(fmt) if fmt and branded else ["-c:a", "aac", "-b:a", bitrate]
+            mux_rss = run_ffmpeg([
+                "ffmpeg", "-y", "-i", video, "-i", voice,
+                "-map", "0:v:0", "-map", "1:a:0", "-shortest",
+                "-c:v", "copy", *audio_args,
+                out_path,
+            ])
+            if branded:
+                out_path = join_segments(out_path, intro_paths, outro_paths)
+            upload_many(bucket, [(out_path, key)])
+            return key, os.path.getsize(out_path), mux_rss
+
+        # Audio-only encodes are light; run them side by side with the still uploads.
+        t1 = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(muxes) + 1) as pool:
+            futs = [pool.submit(mux, m) for m in muxes]
+            stills_fut = pool.submit(upload_many, bucket, stills)
+            results = [f.result() for f in futs]
+            stills_fut.result()
+        sizes = {key: size for key, size, _ in results}
+        mux_s = time.monotonic() - t1
+        log(f"[VARIANTS] {len(muxes)} audio muxes in {mux_s:.2f}s")
+        cost = {"encodeSec": encode_s + mux_s, "outputSec": length,
+                "rssMiB": max([rss] + [r for _, _, r in results])}
         log("[DONE] Render complete.")
+        attrs["variantKeys"] = json.dumps(keys)
+        for kind in ("preview", "vertical"):
+            if kind in produced:
+                produced[kind]["bytes"] = sizes[produced[kind]["key"]]
+        intro_s = intro_seconds(intro_paths) if intro_paths else None
+        for i, v in enumerate(variants):
+            name = "out" if i == 0 else f"out_{v['name']}"
+            produced[name] = {"key": keys[v["name"]], "bytes": sizes[keys[v["name"]]]}
+            if intro_s:
+                produced[name]["introSec"] = intro_s
+        return keys[variants[0]["name"]], attrs, produced, cost
+
+# -------- Worker mode --------
+
+# Scale-in protection: the service scales in on an empty queue, but ECS picks
+# which task to stop. A worker holds task protection (through the ECS agent
+# endpoint, ECS_AGENT_URI) while any job is in flight, so only idle workers
+# are stopped. The expiry outlasts a render and is refreshed per message batch.
+ECS_AGENT_URI = os.environ.get("ECS_AGENT_URI")
+PROTECTION_MINUTES = int(os.environ.get("RENDER_PROTECTION_MINUTES", "30"))
+
+def default_concurrency() -> int:
+    """Jobs rendered at once: RENDER_CONCURRENCY, else one per two cores (x264 is multi-threaded)."""
+    if os.environ.get("RENDER_CONCURRENCY"):
+        return max(1, int(os.environ["RENDER_CONCURRENCY"]))
+    return max(1, (os.cpu_count() or 2) // 2)
+
+def handle_message(msg: dict, bucket: str, queue_url: str, sqs, sfn):
+    """
+    Render the job in one queue message and report back to Step Functions
+    through its task token. The message is deleted either way; a failed
+    render is surfaced to the workflow, not retried from the queue, and a
+    body that can't be parsed is logged and dropped.
+    """
+    t0 = time.monotonic()
+    try:
+        try:
+            body = json.loads(msg["Body"])
+            job_id, token = body["jobId"], body["taskToken"]
+        except (ValueError, KeyError, TypeError) as e:
+            log(f"[WORKER] Dropping message {msg.get('MessageId')}: unreadable body ({type(e).__name__}: {e})")
+            return
+        try:
+            out_key = render_job(job_id, bucket)
+        except Exception as e:
+            log(f"[WORKER] {job_id}: render failed: {e}")
+            _report(job_id, sfn.send_task_failure, taskToken=token,
+                    error=type(e).__name__, cause=str(e)[:32000])
+        else:
+            _report(job_id, sfn.send_task_success, taskToken=token, output=json.dumps({
+                "jobId": job_id, "outKey": out_key, "seconds": round(time.monotonic() - t0, 3),
+            }))
+    finally:
+        sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=msg["ReceiptHandle"])
+
+def _report(job_id: str, send, **kwargs):
+    try:
+        send(**kwargs)
+    except ClientError as e:
+        # TaskTimedOut / InvalidToken: the execution has moved on without us.
+        log(f"[WORKER] {job_id}: could not report result: {e}")
+
+def set_scale_in_protection(enabled: bool):
+    """Set this task's ECS scale-in protection. No-op outside ECS; failures are logged, never raised."""
+    if not ECS_AGENT_URI:
+        return
+    state = {"ProtectionEnabled": enabled}
+    if enabled:
+        state["ExpiresInMinutes"] = PROTECTION_MINUTES
+    req = urllib.request.Request(f"{ECS_AGENT_URI}/task-protection/v1/state", data=json.dumps(state).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"}, method="PUT")
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            resp.read()
+    except OSError as e:
+        log(f"[WORKER] Could not set scale-in protection to {enabled}: {e}")
+
+def worker_loop(queue_url: str, concurrency: int = None, max_idle_polls: int = None,
+                sqs=None, sfn=None, stop: threading.Event = None):
+    """
+    Long-running render worker: long-polls ``queue_url`` and renders up to
+    ``concurrency`` jobs at once, reusing the boto3 clients and asset cache
+    across jobs. Runs until ``stop`` is set (SIGTERM sets it) or, with
+    ``max_idle_polls``, that many empty polls in a row occur with nothing in
+    flight; jobs already started are finished first. The task is protected
+    from scale-in while any job is in flight.
+    """
+    sqs = sqs or boto3.client("sqs")
+    sfn = sfn or boto3.client("stepfunctions")
+    bucket = os.environ["MEDIA_BUCKET"]
+    concurrency = concurrency or default_concurrency()
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    if ASSET_CACHE_DIR:
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+    log(f"[WORKER] Polling {queue_url} with concurrency={concurrency}")
+
+    idle = 0
+    inflight = set()
+    protected = False
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while not stop.is_set():
+            inflight = {f for f in inflight if not f.done()}
+            if protected and not inflight:
+                set_scale_in_protection(False)
+                protected = False
+            if len(inflight) >= concurrency:
+                wait(inflight, return_when=FIRST_COMPLETED)
+                continue
+            resp = sqs.receive_message(
+                QueueUrl=queue_url,
+                MaxNumberOfMessages=min(10, concurrency - len(inflight)),
+                WaitTimeSeconds=20,
+            )
+            messages = resp.get("Messages") or []
+            if messages and stop.is_set():
+                # Stopping: hand these straight back instead of after the visibility timeout.
+                for msg in messages:
+                    sqs.change_message_visibility(QueueUrl=queue_url, ReceiptHandle=msg["ReceiptHandle"],
+                                                  VisibilityTimeout=0)
+                break
+            if not messages and not inflight:
+                idle += 1
+                if max_idle_polls is not None and idle >= max_idle_polls:
+                    break
+                continue
+            idle = 0
+            if messages:
+                set_scale_in_protection(True)
+                protected = True
+            for msg in messages:
+                inflight.add(pool.submit(handle_message, msg, bucket, queue_url, sqs, sfn))
+        if stop.is_set() and inflight:
+            log(f"[WORKER] Stopping; finishing {len(inflight)} job(s) in flight.")
+    if protected:
+        set_scale_in_protection(False)
+    log("[WORKER] Stopped." if stop.is_set() else "[WORKER] Idle; exiting.")
+
+def startup_probe():
+    """
+    Encode a single synthetic frame and report how long after interpreter start
+    it finished. Used by harness/image_bench.py to time container start-up.
+    """
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30",
+         "-frames:v", "1", "-c:v", "libx264", "-f", "null", "-"],
+        check=True,
+    )
+    log(f"[PROBE] first frame {time.monotonic() - _PROCESS_T0:.3f}s after start")
+
+def main():
+    if "--startup-probe" in sys.argv[1:]:
+        startup_probe()
+        return
+    if "--worker" in sys.argv[1:]:
+        worker_loop(os.environ["JOB_QUEUE_URL"])
+        return
+    if sys.argv[1:2] == ["--encode-segment"]:
+        # render.py --encode-segment <source file> <name> [format]
+        if len(sys.argv) not in (4, 5):
+            raise SystemExit("usage: render.py --encode-segment <source file> <name> [format]")
+        encode_segment(sys.argv[2], sys.argv[3], os.environ["MEDIA_BUCKET"], *sys.argv[4:5])
+        return
+
+    # JOB id: prefer env JOB_ID; default to demo placeholder for dev
+    job_id = os.environ.get("JOB_ID") or os.environ.get("JOB") or "demo-xxxx"
+    bucket = os.environ["MEDIA_BUCKET"]
+    render_job(job_id, bucket)
 
 if __name__ == "__main__":
     main()
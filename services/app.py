@@ -2,25 +2,43 @@ import os
 import io
 import json
 import re
+import hashlib
+import time
 import wave
 import contextlib
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 from botocore.exceptions import ClientError
 
+import broll_pexels
+import captions
+import job_manifest
+import job_state
+import render_sizing
+import script_batch
+import script_cache
+import speech_rate
+import tts_providers
+
 # Environment
 MEDIA_BUCKET = os.environ.get("MEDIA_BUCKET")
 JOBS_TABLE   = os.environ.get("JOBS_TABLE")
+PIPELINE_ARN = os.environ.get("PIPELINE_ARN")                  # batchFn starts per-job executions
+BATCH_ROLE_ARN = os.environ.get("BEDROCK_BATCH_ROLE_ARN")      # role Bedrock assumes for batch jobs
 
 # Bedrock / Polly clients (created once)
 bedrock = boto3.client("bedrock-runtime", region_name=os.environ.get("AWS_REGION", "us-east-1"))
+bedrock_ctl = boto3.client("bedrock", region_name=os.environ.get("AWS_REGION", "us-east-1"))
 polly   = boto3.client("polly")
+secrets = boto3.client("secretsmanager")
+sfn     = boto3.client("stepfunctions")
 s3      = boto3.client("s3")
 ddb     = boto3.resource("dynamodb").Table(JOBS_TABLE) if JOBS_TABLE else None
 
 # -------- Utilities --------
 
 def _s3_put_text(bucket: str, key: str, text: str):
-    s3.put_object(Bucket=bucket, Key=key, Body=text.encode("utf-8"), ContentType="text/plain; charset=utf-8")
+    return s3.put_object(Bucket=bucket, Key=key, Body=text.encode("utf-8"), ContentType="text/plain; charset=utf-8")
 
 def _s3_get_text(bucket: str, key: str) -> str:
     obj = s3.get_object(Bucket=bucket, Key=key)
@@ -30,7 +48,7 @@ def _safe_key(*parts) -> str:
     # join paths with forward slashes and remove any accidental leading slashes
     return "/".join(str(p).strip("/\\") for p in parts if p is not None)
 
-# --- Sentence-aware chunking for Polly (max ~3000 chars hard limit) ---
+# --- Sentence-aware chunking for Polly (max ~3000 chars hard limit; also used for ElevenLabs) ---
 # We keep chunks <= 2500 characters with sentence boundaries when possible.
 _SENTENCE_SPLIT = re.compile(r"(?<=[\.\!\?])\s+")
 
@@ -59,21 +77,6 @@ def _chunk_text_for_polly(text: str, max_len: int = 2500):
         chunks.append(cur)
     return chunks
 
-def _synthesize_chunk_pcm(text: str, voice: str = "Matthew", engine: str = "neural",
-                          sample_rate: str = "16000") -> bytes:
-    """
-    Use PCM output for simple concatenation. Returns raw PCM (16-bit signed little-endian) bytes.
-    """
-    resp = polly.synthesize_speech(
-        Text=text,
-        VoiceId=voice,
-        Engine=engine,
-        OutputFormat="pcm",
-        SampleRate=sample_rate
-    )
-    audio_stream = resp.get("AudioStream")
-    return audio_stream.read() if audio_stream else b""
-
 def _write_wav_from_pcm_bytes(out_fp, pcm_bytes: bytes, sample_rate: int = 16000, channels: int = 1, sampwidth: int = 2):
     """
     Write a mono WAV from raw PCM bytes.
@@ -84,102 +87,474 @@ def _write_wav_from_pcm_bytes(out_fp, pcm_bytes: bytes, sample_rate: int = 16000
         wf.setframerate(sample_rate)
         wf.writeframes(pcm_bytes)
 
-# -------- Handlers --------
-
-def script_handler(event, context):
+# -------- Script generation --------
+
+# The scriptwriter brief is prompts/script.prompt.txt. The stack deploys it to
+# s3://MEDIA_BUCKET/config/prompts/ (the Lambda asset is services/ only), so
+# editing the prompt needs no code change; the repo copy serves local runs.
+# Its content hash is the prompt version, so cached scripts written for an
+# older brief stop matching on their own.
+SCRIPT_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+SCRIPT_MAX_TOKENS = 1200   # ~220 s of narration is ~550 words
+SCRIPT_TEMPERATURE = 0.7
+SCRIPT_PROMPT_KEY = os.environ.get("SCRIPT_PROMPT_KEY", "config/prompts/script.prompt.txt")
+_SCRIPT_PROMPT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prompts", "script.prompt.txt")
+
+# Duration targeting (opt-in): SCRIPT_CANDIDATES drafts are requested
+# concurrently and scored with the per-voice speech-rate model
+# (services/speech_rate.py); if none lands in the target range, up to
+# SCRIPT_ROUNDS - 1 more rounds are asked for, told how far off the closest
+# draft was. The defaults (1 and 1) keep the plain prompt and one Bedrock
+# call per script, with no target or calibration lookups. The range comes
+# from the brief ("180–220 second") unless SCRIPT_TARGET_SEC ("180-220") is
+# set; without either, targeting falls back to the plain prompt.
+SCRIPT_CANDIDATES = int(os.environ.get("SCRIPT_CANDIDATES", "1"))
+SCRIPT_ROUNDS = int(os.environ.get("SCRIPT_ROUNDS", "1"))
+SCRIPT_TARGET_SEC = os.environ.get("SCRIPT_TARGET_SEC", "")
+SPEECH_RATE_TTL_SEC = 600  # how long a container keeps the calibration it loaded
+
+# Near-duplicate topics: "off" (no index lookup), "log" (report the closest
+# cached topic and its similarity, but generate fresh), "return" (reuse the
+# cached script as is) or "seed" (hand it to the model to adapt). Every mode
+# but "off" lists and reads the index on each cache miss. The threshold is
+# cosine similarity; tune it with "log" before turning on "return"/"seed".
+SCRIPT_NEAR_DUP = os.environ.get("SCRIPT_NEAR_DUP", "off")
+SCRIPT_NEAR_DUP_THRESHOLD = float(os.environ.get("SCRIPT_NEAR_DUP_THRESHOLD", "0.95"))
+
+_script_cache = None
+_script_brief = None
+_speech_model = (None, 0.0)
+
+def _get_script_cache():
+    # Kept per container so the near-duplicate index is built once, not per job.
+    global _script_cache
+    if _script_cache is None:
+        _script_cache = script_cache.ScriptCache(s3, MEDIA_BUCKET)
+    return _script_cache
+
+def _get_script_brief():
+    """(brief text, prompt version): the deployed copy in S3, else the repo file."""
+    global _script_brief
+    if _script_brief is None:
+        try:
+            text = _s3_get_text(MEDIA_BUCKET, SCRIPT_PROMPT_KEY)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                raise
+            if not os.path.exists(_SCRIPT_PROMPT_FILE):
+                raise RuntimeError(f"Script prompt missing: s3://{MEDIA_BUCKET}/{SCRIPT_PROMPT_KEY}")
+            with open(_SCRIPT_PROMPT_FILE, "r", encoding="utf-8") as f:
+                text = f.read()
+        text = text.strip()
+        _script_brief = (text, "file-" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:12])
+    return _script_brief
+
+def _target_range():
+    """(low, high) narration seconds from SCRIPT_TARGET_SEC or the brief; None if neither gives one."""
+    m = re.fullmatch(r"\s*(\d+)\s*-\s*(\d+)\s*", SCRIPT_TARGET_SEC) \
+        or re.search(r"(\d+)\s*[–-]\s*(\d+)\s*sec", _get_script_brief()[0])
+    return (float(m.group(1)), float(m.group(2))) if m else None
+
+def _script_target(candidates: int = None, rounds: int = None):
     """
-    Generates a script and saves to s3://MEDIA_BUCKET/jobs/{jobId}/script.txt
-    Uses Bedrock Claude 3.5 Sonnet (update model_id if you use another).
+    The range the script should run, or None when targeting is off (one
+    candidate and one round) or no range is given.
     """
-    job_id = event["jobId"]
-    topic  = event["topic"]
-    model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"
-
-    prompt = (
-        f"You are a finance YouTube scriptwriter. Write a concise 60–120s voiceover script "
-        f"on the topic:\n\n'{topic}'\n\n"
-        f"Audience: retail investors in the US, Canada, UK, EU, Australia, and New Zealand. "
-        f"Tone: clear, neutral, practical. Avoid advice claims; add a brief risk disclaimer. "
-        f"Return plain text only."
-    )
+    candidates = SCRIPT_CANDIDATES if candidates is None else candidates
+    rounds = SCRIPT_ROUNDS if rounds is None else rounds
+    if candidates <= 1 and rounds <= 1:
+        return None
+    target = _target_range()
+    if target is None:
+        print("[SCRIPT] No target duration (set SCRIPT_TARGET_SEC or say e.g. '180–220 second' in the prompt); "
+              "generating without duration targeting")
+    return target
+
+def _speech_coefs(voices):
+    """{voice key: speech-rate coefficients}, from the calibration loaded at most SPEECH_RATE_TTL_SEC ago."""
+    global _speech_model
+    model, loaded = _speech_model
+    if model is None or time.time() - loaded > SPEECH_RATE_TTL_SEC:
+        model, _ = speech_rate.load(s3, MEDIA_BUCKET)
+        _speech_model = (model, time.time())
+    return {v: speech_rate.coefficients(model, v) for v in voices}
+
+def _voice_key(provider: str, voice: str) -> str:
+    return f"{provider}/{voice}"
+
+def _script_voices(event) -> list:
+    """Speech-rate keys of the voices that will narrate this job (see tts_handler)."""
+    variants = [v for v in event.get("variants") or [] if v.get("voice")] \
+        or [{"voice": os.environ.get("TTS_VOICE", "Matthew")}]
+    return [_voice_key(v.get("provider") or event.get("provider") or TTS_PROVIDER, v["voice"]) for v in variants]
+
+def _script_prompt(topic: str, seed: str = None, words=None, feedback: str = None) -> str:
+    brief, _ = _get_script_brief()
+    prompt = f"{brief}\n\nTopic: '{topic}'\n\n"
+    if words:
+        prompt += f"Length: {words[0]}–{words[1]} words. "
+    prompt += "Return plain text only: the words to be spoken, no headings, labels or stage directions."
+    if seed:
+        prompt += (
+            f"\n\nA script on a closely related topic follows. Reuse its structure and any facts "
+            f"that still apply, but adapt everything to the topic above:\n\n{seed}"
+        )
+    if feedback:
+        prompt += f"\n\n{feedback}"
+    return prompt
 
-    body = {
+def _claude_body(prompt: str) -> dict:
+    return {
         "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 800,
-        "temperature": 0.7,
+        "max_tokens": SCRIPT_MAX_TOKENS,
+        "temperature": SCRIPT_TEMPERATURE,
         "messages": [
             {"role": "user", "content": prompt}
         ]
     }
 
-    resp = bedrock.invoke_model(modelId=model_id, body=json.dumps(body))
-    payload = json.loads(resp["body"].read())
+def _claude_text(payload: dict) -> str:
     # Claude response format: {"content":[{"type":"text","text":"..."}], ...}
     parts = payload.get("content", [])
     text  = ""
     for part in parts:
         if isinstance(part, dict) and part.get("type") == "text":
             text += part.get("text", "")
-    text = text.strip()
-
-    key = _safe_key("jobs", job_id, "script.txt")
-    _s3_put_text(MEDIA_BUCKET, key, text)
+    return text.strip()
+
+def _invoke_claude(prompt: str) -> str:
+    resp = bedrock.invoke_model(modelId=SCRIPT_MODEL_ID, body=json.dumps(_claude_body(prompt)))
+    return _claude_text(json.loads(resp["body"].read()))
+
+def _script_words(coefs: dict, target):
+    """Word-count range that narrates within ``target`` for every voice (all voices' ranges if they disagree)."""
+    ranges = [(speech_rate.words_for(target[0], c), speech_rate.words_for(target[1], c)) for c in coefs.values()]
+    lo, hi = max(r[0] for r in ranges), min(r[1] for r in ranges)
+    if lo > hi:
+        lo, hi = min(r[0] for r in ranges), max(r[1] for r in ranges)
+    return lo, hi
+
+def _score_script(text: str, coefs: dict, target):
+    """(seconds outside the target for the worst voice, distance from its middle, estimates per voice)."""
+    lo, hi = target
+    est = {v: round(speech_rate.estimate(text, c), 1) for v, c in coefs.items()}
+    miss = max(max(lo - e, e - hi, 0.0) for e in est.values())
+    off = max(abs(e - (lo + hi) / 2) for e in est.values())
+    return miss, off, est
+
+def _generate_script(topic: str, seed: str, voices, candidates: int, rounds: int, target=None):
+    """
+    Request ``candidates`` drafts at once and keep the one whose estimated
+    narration (for every voice) is in the ``target`` range and nearest its
+    middle; regenerate with a length correction while none is. After the last
+    round the closest draft wins. Returns (text, info for the job record).
+    Without a target: one plain draft and no info.
+    """
+    if target is None:
+        text = _invoke_claude(_script_prompt(topic, seed))
+        if not text:
+            raise RuntimeError(f"Empty model output for '{topic}'")
+        return text, None
+    coefs = _speech_coefs(voices)
+    words = _script_words(coefs, target)
+    best, drafts, feedback = None, 0, None
+    for rnd in range(1, max(1, rounds) + 1):
+        prompt = _script_prompt(topic, seed, words, feedback)
+        with ThreadPoolExecutor(max_workers=max(1, candidates)) as pool:
+            futures = [pool.submit(_invoke_claude, prompt) for _ in range(max(1, candidates))]
+        texts, errors = [], []
+        for f in futures:
+            try:
+                texts.append(f.result())
+            except ClientError as e:
+                errors.append(e)
+        texts = [t for t in texts if t]
+        if not texts and best is None:
+            if errors:
+                raise errors[0]
+            raise RuntimeError(f"Empty model output for '{topic}'")
+        drafts += len(texts)
+        for text in texts:
+            scored = (*_score_script(text, coefs, target), text)
+            if best is None or scored[:2] < best[:2]:
+                best = scored
+        if best[0] == 0.0:
+            break
+        est = max(best[2].values(), key=lambda e: abs(e - sum(target) / 2))
+        feedback = (f"A draft of {len(best[3].split())} words ran about {est:.0f} seconds, outside the "
+                    f"{target[0]:g}–{target[1]:g} second target. Write {words[0]}–{words[1]} words.")
+    miss, _, est, text = best
+    info = {"estimatedSec": est, "targetSec": list(target), "inRange": miss == 0.0,
+            "drafts": drafts, "rounds": rnd}
+    print(f"[SCRIPT] {topic[:60]!r}: {drafts} draft(s) in {rnd} round(s); estimated {est} "
+          f"for target {target[0]:g}-{target[1]:g}s{'' if miss == 0.0 else f' (missed by {miss:.0f}s)'}")
+    return text, info
 
-    if ddb:
-        ddb.update_item(
-            Key={"jobId": job_id},
-            UpdateExpression="SET #st=:s, scriptKey=:k",
-            ExpressionAttributeNames={"#st": "status"},
-            ExpressionAttributeValues={":s": "SCRIPT_DONE", ":k": key},
-        )
+# -------- Handlers --------
 
-    return {"ok": True, "scriptKey": key, "chars": len(text)}
+def script_handler(event, context):
+    """
+    Generates a script and saves to s3://MEDIA_BUCKET/jobs/{jobId}/script.txt
+    Uses Bedrock Claude 3.5 Sonnet (update SCRIPT_MODEL_ID if you use another).
+    With SCRIPT_CANDIDATES / SCRIPT_ROUNDS above 1 (or "scriptCandidates" /
+    "scriptRounds" in the event) several drafts are requested and the one
+    whose estimated narration fits the brief's duration for the job's voices
+    is kept (see _generate_script); by default a single plain draft is made.
+    A topic already generated with the same model settings and prompt version
+    is served from the script cache without calling Bedrock; pass
+    "scriptCache": false in the event to force a fresh script.
+    """
+    job_id = event["jobId"]
+    topic  = event["topic"]
+    t0 = job_state.begin(ddb, job_id, "script")
+
+    candidates = int(event.get("scriptCandidates") or SCRIPT_CANDIDATES)
+    rounds = int(event.get("scriptRounds") or SCRIPT_ROUNDS)
+    target = _script_target(candidates, rounds)
+    params = _script_params(target)
+    fp = script_cache.fingerprint(topic, params)
+    use_cache = event.get("scriptCache", True)
+    cache = _get_script_cache()
+
+    text, source, similarity, info = None, "bedrock", None, None
+    hit = cache.get_exact(fp) if use_cache else None
+    if hit:
+        text, source = hit["script"], "cache"
+    else:
+        seed = None
+        if use_cache and SCRIPT_NEAR_DUP != "off":
+            similarity, near = cache.nearest(topic, params)
+            if near and SCRIPT_NEAR_DUP == "log":
+                print(f"[SCRIPT] {topic[:60]!r}: closest cached topic {near.get('topic', '')[:60]!r} "
+                      f"at similarity {similarity:.3f} (threshold {SCRIPT_NEAR_DUP_THRESHOLD}; not reused)")
+            prior = (cache.get_exact(near["fp"]) if near and similarity >= SCRIPT_NEAR_DUP_THRESHOLD
+                     and SCRIPT_NEAR_DUP in ("return", "seed") else None)
+            if prior and SCRIPT_NEAR_DUP == "return":
+                text, source = prior["script"], "near-duplicate"
+            elif prior:
+                seed = prior["script"]
+        if text is None:
+            text, info = _generate_script(topic, seed, _script_voices(event), candidates, rounds, target)
+            cache.put(fp, topic, text, job_id, params)
 
+    key = _safe_key("jobs", job_id, "script.txt")
+    resp = _s3_put_text(MEDIA_BUCKET, key, text)
+    # First stage: start the job's manifest (a rerun merges into the existing one).
+    # targetSec marks a duration-targeted script, which TTS then calibrates from.
+    extra = {"targetSec": list(target)} if target else {}
+    if info:
+        extra["estimatedSec"] = info["estimatedSec"]
+    job_manifest.update(s3, MEDIA_BUCKET, job_id,
+                        {"script": job_manifest.artifact(key, resp, len(text.encode("utf-8")), **extra)},
+                        table=ddb, base=(None, None), create=True)
+
+    fields = {"scriptInRange": info["inRange"], "scriptDrafts": info["drafts"]} if info else {}
+    job_state.complete(ddb, job_id, "script", t0, scriptKey=key, scriptSource=source, **fields)
+
+    out = {"ok": True, "scriptKey": key, "chars": len(text), "source": source}
+    if info:
+        out.update(info)
+    if similarity is not None:
+        out["similarity"] = round(similarity, 4)
+    return out
+
+
+# -------- TTS providers --------
+
+# "polly", "elevenlabs", or "auto" (per narration, the capable provider with the lowest p95).
+TTS_PROVIDER = os.environ.get("TTS_PROVIDER", "polly")
+# Hedging is opt-in: each backup request is a second paid synthesis.
+TTS_HEDGE = os.environ.get("TTS_HEDGE", "0") == "1"
+TTS_HEDGE_COLD_SEC = float(os.environ.get("TTS_HEDGE_COLD_SEC", "8"))  # deadline until p95 is known
+TTS_FALLBACK = os.environ.get("TTS_FALLBACK", "1") == "1"  # redo a failed narration on the next capable provider
+ELEVENLABS_SECRET = os.environ.get("ELEVENLABS_SECRET", "elevenlabs/apiKey")
+ELEVENLABS_VOICES = json.loads(os.environ.get("ELEVENLABS_VOICES", "{}"))  # {"Matthew": "<voiceId>"}
+
+# Outlives the invocation, so a warm container hedges against its own history.
+tts_stats = tts_providers.LatencyStats(min_samples=int(os.environ.get("TTS_HEDGE_MIN_SAMPLES", "5")))
+
+def _elevenlabs_key() -> str:
+    value = (secrets.get_secret_value(SecretId=ELEVENLABS_SECRET).get("SecretString") or "").strip()
+    if value.startswith("{"):
+        return json.loads(value)["apiKey"]
+    return value
+
+def _tts_providers():
+    return [
+        tts_providers.PollyProvider(polly),
+        tts_providers.ElevenLabsProvider(
+            _elevenlabs_key, voices=ELEVENLABS_VOICES,
+            model_id=os.environ.get("ELEVENLABS_MODEL", "eleven_multilingual_v2"),
+            base_url=os.environ.get("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io"),
+        ),
+    ]
+
+def _synthesize_wav(chunks, voice: str, engine: str, sample_rate: str, provider, coef=None):
+    """
+    Synthesize each Polly-sized chunk as PCM (hedged past the provider's p95);
+    returns (WAV bytes, duration in seconds, hedged chunk count, caption cues).
+    Cues are timed from the chunks' PCM (services/captions.py) when ``coef``
+    (the voice's speech-rate coefficients) is given, else [].
+    """
+    pcm_all = bytearray()
+    chunk_pcm = []
+    hedged = 0
+    for idx, chunk in enumerate(chunks, 1):
+        try:
+            pcm, was_hedged = tts_providers.synthesize(provider, chunk, voice, sample_rate, tts_stats, engine=engine,
+                                                       hedge=TTS_HEDGE, cold=TTS_HEDGE_COLD_SEC)
+        except (ClientError, RuntimeError, OSError) as e:
+            # Surface a clean error to the state machine (OSError: URLError, socket timeouts)
+            raise RuntimeError(f"{provider.name} synth failed on chunk {idx}/{len(chunks)} ({voice}): {e}")
+        pcm_all.extend(pcm)
+        chunk_pcm.append(pcm)
+        hedged += was_hedged
+    buf = io.BytesIO()
+    _write_wav_from_pcm_bytes(buf, bytes(pcm_all), sample_rate=int(sample_rate), channels=1, sampwidth=2)
+    cues = captions.align(chunks, chunk_pcm, int(sample_rate), coef) if coef else []
+    return buf.getvalue(), round(len(pcm_all) / (2 * int(sample_rate)), 3), hedged, cues
+
+def _narrate(chunks, voice: str, engine: str, sample_rate: str, provider, providers):
+    """
+    (provider used, _synthesize_wav result) for one narration. When
+    ``provider`` fails, the whole narration is redone on the next capable
+    provider (Polly when ElevenLabs is down), never from the failed chunk on:
+    the voice would change mid-narration.
+    """
+    order = [provider]
+    if TTS_FALLBACK:
+        order += [p for p in providers if p is not provider and p.speaks(voice) and sample_rate in p.rates]
+    for i, p in enumerate(order):
+        key = _voice_key(p.name, voice)
+        coef = _caption_coefs([key])[key] if TTS_CAPTIONS else None
+        try:
+            return p, _synthesize_wav(chunks, voice, engine, sample_rate, p, coef)
+        except RuntimeError as e:
+            if i == len(order) - 1:
+                raise
+            print(f"[TTS] {e}; narrating '{voice}' with {order[i + 1].name} instead")
+
+# -------- Captions --------
+
+TTS_CAPTIONS = os.environ.get("TTS_CAPTIONS", "1") == "1"
+CAPTIONS_LANGUAGE = os.environ.get("CAPTIONS_LANGUAGE", "en")
+
+def _caption_coefs(keys) -> dict:
+    """Speech-rate coefficients per voice key for cue timing; DEFAULT if the calibration can't be read."""
+    try:
+        return _speech_coefs(keys)
+    except ClientError as e:
+        print(f"[TTS] speech-rate calibration unavailable for captions: {e}")
+        return {k: speech_rate.DEFAULT for k in keys}
+
+def _put_captions(base_key: str, cues):
+    """Write <base_key>.srt and <base_key>.vtt; returns (srt put response, srt bytes, vtt key)."""
+    srt_body = captions.srt(cues).encode("utf-8")
+    resp = s3.put_object(Bucket=MEDIA_BUCKET, Key=f"{base_key}.srt", Body=srt_body,
+                         ContentType="application/x-subrip; charset=utf-8")
+    s3.put_object(Bucket=MEDIA_BUCKET, Key=f"{base_key}.vtt", Body=captions.webvtt(cues).encode("utf-8"),
+                  ContentType="text/vtt; charset=utf-8")
+    return resp, len(srt_body), f"{base_key}.vtt"
+
+_VARIANT_NAME = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
 
 def tts_handler(event, context):
     """
     Reads script.txt, chunks it for Polly if too long, synthesizes PCM chunks,
     concatenates them into a single WAV, and saves voice.wav to the job folder.
+
+    Variant mode: pass "variants": [{"name": "us", "voice": "Matthew"},
+    {"name": "uk", "voice": "Amy"}, ...] to narrate the same script in several
+    voices. The first variant is voice.wav, the others voices/<name>.wav; all
+    are listed under "variants" in the job manifest, which tells the renderer
+    to encode the video once and mux each narration onto it.
+
+    The provider comes from the variant's (or the event's) "provider", else
+    TTS_PROVIDER; see services/tts_providers.py for routing and hedging.
     """
     job_id = event["jobId"]
-    key_in = _safe_key("jobs", job_id, "script.txt")
+    t0 = job_state.begin(ddb, job_id, "tts")
+    manifest, etag = job_manifest.load(s3, MEDIA_BUCKET, job_id, ddb)
+    key_in = ((manifest or {}).get("artifacts", {}).get("script") or {}).get("key") \
+        or _safe_key("jobs", job_id, "script.txt")
     script = _s3_get_text(MEDIA_BUCKET, key_in)
 
     # Chunk safely for Polly
     chunks = _chunk_text_for_polly(script, max_len=2500)
 
-    # Synthesize each chunk as PCM (16kHz mono)
-    pcm_all = bytearray()
-    for idx, chunk in enumerate(chunks, 1):
+    engine = os.environ.get("TTS_ENGINE", "neural")
+    sample_rate = os.environ.get("TTS_SAMPLE_RATE", "16000")
+    variants = event.get("variants") or [{"name": "default", "voice": os.environ.get("TTS_VOICE", "Matthew")}]
+    for v in variants:
+        if not _VARIANT_NAME.match(str(v.get("name", ""))) or not v.get("voice"):
+            raise ValueError(f"Each variant needs a name ([A-Za-z0-9_-]) and a voice: {v}")
+
+    providers = _tts_providers()
+    chosen = []
+    for v in variants:
+        preferred = v.get("provider") or event.get("provider") or TTS_PROVIDER
+        chosen.append(tts_providers.pick(providers, v["voice"], sample_rate, tts_stats,
+                                         preferred=None if preferred == "auto" else preferred))
+
+    # Variants only share the script, so synthesize them side by side.
+    with ThreadPoolExecutor(max_workers=len(variants)) as pool:
+        narrated = list(pool.map(lambda vp: _narrate(chunks, vp[0]["voice"], vp[0].get("engine", engine),
+                                                     sample_rate, vp[1], providers),
+                                 zip(variants, chosen)))
+    chosen = [p for p, _ in narrated]
+    wavs = [w for _, w in narrated]
+    voice_keys = [_voice_key(p.name, v["voice"]) for v, p in zip(variants, chosen)]
+    print(f"[TTS] {job_id}: {', '.join(p.name for p in chosen)}; hedged {sum(w[2] for w in wavs)} chunk(s); "
+          f"latency {json.dumps(tts_stats.summary())}")
+
+    # What was actually spoken calibrates the script stage's duration estimates.
+    # Only duration-targeted scripts feed it: the model is one shared S3 object
+    # updated read-modify-write, which untargeted jobs should not contend on.
+    if ((manifest or {}).get("artifacts", {}).get("script") or {}).get("targetSec"):
         try:
-            pcm = _synthesize_chunk_pcm(chunk, voice=os.environ.get("TTS_VOICE", "Matthew"),
-                                        engine=os.environ.get("TTS_ENGINE", "neural"),
-                                        sample_rate=os.environ.get("TTS_SAMPLE_RATE", "16000"))
-            pcm_all.extend(pcm)
-        except ClientError as e:
-            # Surface a clean error to the state machine
-            raise RuntimeError(f"Polly synth failed on chunk {idx}/{len(chunks)}: {e}")
-
-    # Write WAV to /tmp then upload
-    out_local = f"/tmp/{job_id}_voice.wav"
-    with open(out_local, "wb") as f:
-        _write_wav_from_pcm_bytes(f, bytes(pcm_all),
-                                  sample_rate=int(os.environ.get("TTS_SAMPLE_RATE", "16000")),
-                                  channels=1, sampwidth=2)
+            speech_rate.observe(s3, MEDIA_BUCKET, [(k, script, w[1]) for k, w in zip(voice_keys, wavs)])
+        except (ClientError, RuntimeError) as e:
+            print(f"[TTS] {job_id}: speech-rate calibration skipped: {e}")
 
     key_out = _safe_key("jobs", job_id, "voice.wav")
-    with open(out_local, "rb") as f:
-        s3.put_object(Bucket=MEDIA_BUCKET, Key=key_out, Body=f, ContentType="audio/wav")
-
-    if ddb:
-        ddb.update_item(
-            Key={"jobId": job_id},
-            UpdateExpression="SET #st=:s, voiceKey=:k",
-            ExpressionAttributeNames={"#st": "status"},
-            ExpressionAttributeValues={":s": "TTS_DONE", ":k": key_out},
-        )
-
-    return {"ok": True, "voiceKey": key_out, "chunks": len(chunks)}
+    wav, seconds, _, cues = wavs[0]
+    resp = s3.put_object(Bucket=MEDIA_BUCKET, Key=key_out, Body=wav, ContentType="audio/wav")
+    out = {"ok": True, "voiceKey": key_out, "chunks": len(chunks), "provider": chosen[0].name,
+           "hedged": sum(w[2] for w in wavs)}
+    artifacts = {"voice": job_manifest.artifact(key_out, resp, len(wav), seconds=seconds)}
+    fields, state = {}, {}
+
+    # Sidecar captions next to the narration they were timed from (published by uploadFn).
+    language = event.get("language") or CAPTIONS_LANGUAGE
+    if cues:
+        cap_key = _safe_key("jobs", job_id, "captions")
+        cap_resp, cap_size, vtt_key = _put_captions(cap_key, cues)
+        artifacts["captions"] = job_manifest.artifact(f"{cap_key}.srt", cap_resp, cap_size, vtt=vtt_key,
+                                                      cues=len(cues), language=language)
+        out["captionsKey"] = state["captionsKey"] = f"{cap_key}.srt"
+
+    if event.get("variants"):
+        listed = [{"name": variants[0]["name"], "voice": variants[0]["voice"], "provider": chosen[0].name,
+                   "audio_key": key_out, "seconds": seconds}]
+        if cues:
+            listed[0]["captions_key"] = out["captionsKey"]
+        for v, p, (v_wav, v_seconds, _, v_cues) in zip(variants[1:], chosen[1:], wavs[1:]):
+            key = _safe_key("jobs", job_id, "voices", f"{v['name']}.wav")
+            s3.put_object(Bucket=MEDIA_BUCKET, Key=key, Body=v_wav, ContentType="audio/wav")
+            entry = {"name": v["name"], "voice": v["voice"], "provider": p.name, "audio_key": key,
+                     "seconds": v_seconds}
+            if v_cues:
+                _put_captions(_safe_key("jobs", job_id, "voices", v["name"]), v_cues)
+                entry["captions_key"] = _safe_key("jobs", job_id, "voices", f"{v['name']}.srt")
+            listed.append(entry)
+        fields["variants"] = out["variants"] = listed
+
+    job_manifest.update(s3, MEDIA_BUCKET, job_id, artifacts,
+                        table=ddb, base=(manifest, etag) if etag else None, **fields)
+
+    job_state.complete(ddb, job_id, "tts", t0, voiceKey=key_out, ttsProvider=chosen[0].name, **state)
+
+    return out
 
 
 # --- DROP-IN: replace your existing broll_handler with this ---
@@ -187,62 +562,383 @@ import os, json, boto3
 
 _s3 = boto3.client("s3")
 
+# -------- B-roll acquisition --------
+
+PEXELS_SECRET = os.environ.get("PEXELS_SECRET", "pexels/apiKey")
+PEXELS_BASE_URL = os.environ.get("PEXELS_BASE_URL", broll_pexels.API_BASE)
+BROLL_DEFAULT_KEY = "broll/default.mp4"
+BROLL_CLIPS = int(os.environ.get("BROLL_CLIPS", "1"))           # clips per job (the renderer plays the first)
+BROLL_HEIGHT = int(os.environ.get("BROLL_HEIGHT", "720"))       # smallest rendition at least this tall
+BROLL_CLIP_SEC = float(os.environ.get("BROLL_CLIP_SEC", "15"))  # longest stretch of one clip in the EDL
+BROLL_WORKERS = int(os.environ.get("BROLL_WORKERS", "6"))       # concurrent downloads (and connections per host)
+
+# Keep-alive connections to the API and CDN outlive the invocation in a warm container.
+_pexels_http = None
+
+def _pexels_key() -> str:
+    value = (secrets.get_secret_value(SecretId=PEXELS_SECRET).get("SecretString") or "").strip()
+    if value.startswith("{"):
+        return json.loads(value)["apiKey"]
+    return value
+
+def _pexels_client():
+    global _pexels_http
+    if _pexels_http is None:
+        _pexels_http = broll_pexels.pool(BROLL_WORKERS)
+    return broll_pexels.PexelsClient(_pexels_key, _pexels_http, base_url=PEXELS_BASE_URL)
+
+def _broll_terms(event) -> list:
+    """Search terms from the event: "brollTerms" as a list or a comma-separated string."""
+    terms = event.get("brollTerms") or []
+    if isinstance(terms, str):
+        terms = terms.split(",")
+    return [t.strip() for t in terms if t and t.strip()]
+
+def _acquire_broll(bucket: str, job_id: str, terms) -> list:
+    """EDL clips for ``terms`` from Pexels; [] (use the default clip) if nothing could be fetched."""
+    t0 = time.time()
+    try:
+        got = broll_pexels.acquire(_pexels_client(), _s3, bucket, terms, count=BROLL_CLIPS, height=BROLL_HEIGHT,
+                                   min_duration=5, workers=BROLL_WORKERS)
+    except (ClientError, RuntimeError, ValueError) as e:
+        print(f"[BROLL] {job_id}: Pexels acquisition failed, using {BROLL_DEFAULT_KEY}: {e}")
+        return []
+    fetched = sum(c["fetched"] for c in got)
+    dedup = sum(1 for c in got if c["dedup"])
+    print(f"[BROLL] {job_id}: {len(got)} clip(s) for {terms}, {dedup} already stored, "
+          f"{fetched / 1e6:.1f} MB fetched in {time.time() - t0:.1f}s")
+    return [{"s3_key": c["s3_key"], "start": 0,
+             "duration": round(min(c["duration"], BROLL_CLIP_SEC), 3) if c["duration"] else BROLL_CLIP_SEC,
+             "source": "pexels", "pexelsId": c["pexelsId"]} for c in got]
+
+
 def broll_handler(event, context):
     """
     Writes a renderer-compatible EDL (tracks -> clips) for the given job.
     Compatible with your current renderer/render.py.
+    Needs only the jobId (not voice.wav), so the workflow runs it in parallel with TTS.
+    With "brollTerms" on the event the clips are fetched from Pexels
+    (services/broll_pexels.py); otherwise, or if none can be fetched, the
+    job uses broll/default.mp4.
     """
     job_id = event.get("jobId") or event["job_id"]
     bucket = os.environ["MEDIA_BUCKET"]  # this env var is already set in the stack
+    t0 = job_state.begin(ddb, job_id, "broll")
 
+    terms = _broll_terms(event)
+    acquired = _acquire_broll(bucket, job_id, terms) if terms else []
     edl = {
         "audio_key": "voice.wav",
         "tracks": [
             {
-                "clips": [
-                    { "s3_key": "broll/default.mp4", "start": 0, "duration": 15 }
+                "clips": acquired or [
+                    { "s3_key": BROLL_DEFAULT_KEY, "start": 0, "duration": 15 }
                 ]
             }
         ]
     }
 
     body = json.dumps(edl).encode("utf-8")
-    common_put = dict(Bucket=bucket, Body=body, ContentType="application/json", CacheControl="no-cache")
 
+    # One copy; the manifest tells the renderer where it is (it still reads the
+    # legacy <id>/edl.json for jobs without a manifest).
     key_jobs = f"jobs/{job_id}/edl.json"
-    key_root = f"{job_id}/edl.json"          # optional fallback your renderer also checks
+    resp = _s3.put_object(Bucket=bucket, Key=key_jobs, Body=body, ContentType="application/json",
+                          CacheControl="no-cache")
 
-    _s3.put_object(Key=key_jobs, **common_put)
-    _s3.put_object(Key=key_root, **common_put)
+    # Asset preparation: this branch runs alongside TTS, so resolve every clip
+    # now and fail here rather than minutes later inside the render task.
+    clips = []
+    for track in edl["tracks"]:
+        for clip in track.get("clips") or []:
+            head = _s3.head_object(Bucket=bucket, Key=clip["s3_key"])
+            clips.append({"s3_key": clip["s3_key"], "bytes": head["ContentLength"], "etag": head["ETag"]})
+
+    job_manifest.update(_s3, bucket, job_id, {"edl": job_manifest.artifact(key_jobs, resp, len(body), clips=clips)},
+                        table=ddb)
+
+    job_state.complete(ddb, job_id, "broll", t0, edlKey=key_jobs, brollSource="pexels" if acquired else "default")
 
     # Return something useful to the state machine if needed
-    return {"edl_key": key_jobs, "bucket": bucket}
+    return {"edl_key": key_jobs, "bucket": bucket, "clips": clips}
 
 
 
 def upload_handler(event, context):
     """
     Stub: keep your existing YouTube uploader if you already built one.
-    Here we just confirm output locations for the pipeline to complete.
+    Here we just confirm output locations for the pipeline to complete, and
+    report the video id if lambdas/uploadFn already published this exact
+    file (the upload record in services/job_state.py).
     """
     job_id = event["jobId"]
+    t0 = job_state.begin(ddb, job_id, "upload")
+    manifest, _ = job_manifest.load(s3, MEDIA_BUCKET, job_id, ddb)
+    out_key = ((manifest or {}).get("artifacts", {}).get("out") or {}).get("key") or f"jobs/{job_id}/final.mp4"
     out = {
-        "finalVideo": f"s3://{MEDIA_BUCKET}/jobs/{job_id}/final.mp4"
+        "finalVideo": f"s3://{MEDIA_BUCKET}/{out_key}"
     }
+    record = job_state.upload_record(ddb, job_id)
+    if record and record["key"] == out_key:
+        try:
+            etag = s3.head_object(Bucket=MEDIA_BUCKET, Key=out_key)["ETag"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                raise
+            etag = None
+        if etag == record["etag"]:
+            out.update(videoId=record["videoId"], published=True)
+    job_state.complete(ddb, job_id, "upload", t0, **({"videoId": out["videoId"]} if "videoId" in out else {}))
     return {"ok": True, **out}
 
 
+# -------- Render task sizing --------
+
+RENDER_TARGET_SEC = float(os.environ.get("RENDER_TARGET_SEC", "600"))  # task timeout is 15 min
+RENDER_OUTPUTS = os.environ.get("RENDER_OUTPUTS", "preview,thumbnails")  # the renderer's default
+RENDER_DEFAULT_SIZE = "medium"  # the original 2 vCPU / 4 GB task
+_cost_model = None
+
+def render_size_handler(event, context):
+    """
+    Pick the Fargate task size for a job's render from its output duration
+    (narration length, capped by the EDL clip durations), clip count and
+    deliverables, using the cost model in services/render_sizing.py.
+    Never fails the pipeline: anything it cannot work out renders on the
+    default size.
+    """
+    global _cost_model
+    job_id = event["jobId"]
+    try:
+        if _cost_model is None:
+            _cost_model = render_sizing.load_model(s3, MEDIA_BUCKET)
+        manifest, _ = job_manifest.load(s3, MEDIA_BUCKET, job_id, ddb)
+        manifest = manifest or {}
+        arts = manifest.get("artifacts", {})
+        edl = json.loads(_s3_get_text(MEDIA_BUCKET, (arts.get("edl") or {}).get("key") or f"jobs/{job_id}/edl.json"))
+    except (ClientError, ValueError, OSError) as e:
+        print(f"[SIZE] {job_id}: no sizing inputs ({e}); using {RENDER_DEFAULT_SIZE}")
+        return {"size": RENDER_DEFAULT_SIZE, "predictedSec": None}
+
+    clips = [c for t in edl.get("tracks") or [] for c in t.get("clips") or []]
+    variants = manifest.get("variants") or []
+    narration = max([v.get("seconds") or 0 for v in variants] + [(arts.get("voice") or {}).get("seconds") or 0])
+    durations = [c.get("duration") for c in clips]
+    video = sum(durations) if durations and None not in durations else None
+    known = [x for x in (narration, video) if x]
+    if not known:
+        print(f"[SIZE] {job_id}: output length unknown; using {RENDER_DEFAULT_SIZE}")
+        return {"size": RENDER_DEFAULT_SIZE, "predictedSec": None}
+    output_s = min(known)
+
+    outputs = edl.get("outputs")
+    if outputs is None:
+        outputs = [o.strip() for o in RENDER_OUTPUTS.split(",") if o.strip()]
+    profile = render_sizing.profile_of(outputs)
+    choice = render_sizing.choose(_cost_model, output_s, len(clips), profile, max(1, len(variants)),
+                                  RENDER_TARGET_SEC)
+    print(f"[SIZE] {job_id}: {output_s:.1f}s, {len(clips)} clip(s), {profile} -> {json.dumps(choice)}")
+    return {**choice, "profile": profile, "outputSec": round(output_s, 3)}
+
+
+def status_handler(event, context):
+    """
+    Read-only job dashboard over the sparse status index.
+      {"action": "dashboard", "stuckAfterSec": 900}          -> counts / oldest / stuck
+      {"action": "stuck", "stage": "tts", "olderThanSec": 600, "limit": 100}
+      {"action": "list", "status": "RENDER_FAILED", "limit": 100}
+    """
+    if not ddb:
+        return {"ok": False, "error": "JOBS_TABLE is not configured"}
+    action = (event or {}).get("action", "dashboard")
+    if action == "dashboard":
+        return {"ok": True, **job_state.dashboard(ddb, float(event.get("stuckAfterSec", 900)))}
+    if action == "stuck":
+        jobs = job_state.stuck_jobs(ddb, event["stage"], float(event.get("olderThanSec", 900)), event.get("limit"))
+        return {"ok": True, "jobs": jobs}
+    if action == "list":
+        return {"ok": True, "jobs": job_state.jobs_in_status(ddb, event["status"], limit=event.get("limit"))}
+    return {"ok": False, "error": f"Unknown action: {action}"}
+
+
+# -------- Bulk scripts (Bedrock batch inference) --------
+
+def _script_params(target=None) -> str:
+    # A target range is part of the prompt version: a script picked for one
+    # duration is not a cache hit for another, nor for an untargeted prompt.
+    version = _get_script_brief()[1]
+    if target:
+        version += f":{target[0]:g}-{target[1]:g}s"
+    return script_cache.params_key(SCRIPT_MODEL_ID, SCRIPT_TEMPERATURE, SCRIPT_MAX_TOKENS, version)
+
+def _start_pipelines(jobs: dict, batch_id: str) -> int:
+    """Start one Pipeline execution per job with the script already in place."""
+    if not PIPELINE_ARN or not jobs:
+        return 0
+
+    def start(item):
+        job_id, meta = item
+        try:
+            sfn.start_execution(
+                stateMachineArn=PIPELINE_ARN,
+                name=re.sub(r"[^A-Za-z0-9_-]", "-", f"{job_id}-{batch_id}")[:80],
+                input=json.dumps({"jobId": job_id, "topic": meta["topic"], "scriptReady": True}),
+            )
+        except ClientError as e:
+            # Fan-out retried after a partial run: the execution is already there.
+            if e.response.get("Error", {}).get("Code") != "ExecutionAlreadyExists":
+                raise
+        return 1
+
+    with ThreadPoolExecutor(max_workers=min(16, len(jobs))) as pool:
+        return sum(pool.map(start, jobs.items()))
+
+def _finish_scripts(texts: dict, jobs: dict, source: str, batch_id: str, target=None) -> int:
+    """
+    Write jobs/<id>/script.txt for every generated text, add fresh scripts to
+    the cache, mark the script stage done in one transactional pass and start
+    the pipeline from TTS. Returns the number of pipelines started.
+    """
+    if not texts:
+        return 0
+    cache = _get_script_cache()
+    params = _script_params(target)
+    extra = {"targetSec": list(target)} if target else {}
+
+    def write(item):
+        job_id, text = item
+        key = _safe_key("jobs", job_id, "script.txt")
+        resp = _s3_put_text(MEDIA_BUCKET, key, text)
+        job_manifest.update(s3, MEDIA_BUCKET, job_id,
+                            {"script": job_manifest.artifact(key, resp, len(text.encode("utf-8")), **extra)},
+                            table=ddb, base=(None, None), create=True)
+        if source != "cache":
+            cache.put(jobs[job_id]["fp"], jobs[job_id]["topic"], text, job_id, params)
+        return job_id, key
+
+    with ThreadPoolExecutor(max_workers=min(16, len(texts))) as pool:
+        keys = dict(pool.map(write, texts.items()))
+
+    if ddb:
+        job_state.apply_many(ddb, [
+            job_state.complete_update(job_id, "script", jobs[job_id].get("startedAt"),
+                                      {"scriptKey": key, "scriptSource": source})
+            for job_id, key in keys.items()
+        ])
+    return _start_pipelines({job_id: jobs[job_id] for job_id in keys}, batch_id)
+
+def _fail_scripts(errors: dict):
+    if ddb and errors:
+        job_state.apply_many(ddb, [job_state.fail_update(job_id, "script", err) for job_id, err in errors.items()])
+
+
+def batch_handler(event, context):
+    """
+    Bulk script generation for many jobs at once; the ScriptBatch state machine
+    drives it as submit -> poll (until done) -> fanout.
+
+      {"action": "submit", "jobs": [{"jobId", "topic"}, ...], "batchId": "optional"}
+          Cache hits are written straight away. If at least script_batch.MIN_RECORDS
+          topics remain they go to one Bedrock batch-inference job ({"jobArn"} is
+          returned); smaller remainders are generated on demand here.
+      {"action": "poll", "jobArn": "..."}      -> {"status", "done"}
+      {"action": "fanout", "batchId": "..."}   -> scripts written, pipelines started
+
+    Each finished job is started on the Pipeline with "scriptReady": true, so it
+    begins at TTS.
+    """
+    action = event.get("action", "submit")
+
+    if action == "poll":
+        return {"ok": True, **script_batch.status(bedrock_ctl, event["jobArn"])}
+
+    if action == "fanout":
+        batch_id = event["batchId"]
+        jobs = script_batch.get_jobs(s3, MEDIA_BUCKET, batch_id)
+        texts, errors = script_batch.read_results(s3, MEDIA_BUCKET, batch_id, _claude_text)
+        for job_id in jobs:
+            if job_id not in texts and job_id not in errors:
+                errors[job_id] = "no record in batch output"
+        texts = {j: t for j, t in texts.items() if j in jobs}
+        started = _finish_scripts(texts, jobs, "batch", batch_id, _script_target())
+        _fail_scripts({j: e for j, e in errors.items() if j in jobs})
+        return {"ok": True, "batchId": batch_id, "scripts": len(texts), "failed": len(errors), "started": started}
+
+    if action != "submit":
+        return {"ok": False, "error": f"Unknown action: {action}"}
+
+    batch_id = event.get("batchId") or time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    # One draft per job here (no n-best); with targeting on it asks for the
+    # calibrated length of the default voice.
+    target = _script_target()
+    params = _script_params(target)
+    cache = _get_script_cache()
+    now = int(time.time() * 1000)
+
+    jobs = {}
+    for job in event["jobs"]:
+        fp = script_cache.fingerprint(job["topic"], params)
+        jobs[job["jobId"]] = {"topic": job["topic"], "fp": fp, "startedAt": now}
+    if ddb:
+        job_state.apply_many(ddb, [job_state.begin_update(job_id, "script", now) for job_id in jobs])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(16, len(jobs)))) as pool:
+        hits = dict(zip(jobs, pool.map(cache.get_exact, [m["fp"] for m in jobs.values()])))
+    cached = {job_id: hit["script"] for job_id, hit in hits.items() if hit}
+    started = _finish_scripts(cached, jobs, "cache", batch_id, target)
+
+    pending = {job_id: meta for job_id, meta in jobs.items() if job_id not in cached}
+    words = _script_words(_speech_coefs(_script_voices({})), target) if pending and target else None
+    out = {"ok": True, "batchId": batch_id, "jobs": len(jobs), "cached": len(cached)}
+    if len(pending) >= script_batch.MIN_RECORDS:
+        script_batch.put_jobs(s3, MEDIA_BUCKET, batch_id, pending)
+        records = [(job_id, _claude_body(_script_prompt(meta["topic"], words=words)))
+                   for job_id, meta in pending.items()]
+        out["jobArn"] = script_batch.submit(bedrock_ctl, s3, MEDIA_BUCKET, batch_id, records,
+                                            SCRIPT_MODEL_ID, BATCH_ROLE_ARN)
+        out["records"] = len(records)
+    elif pending:
+        # Too few for a batch job: a handful of on-demand calls is quicker anyway.
+        def generate(job_id):
+            try:
+                return job_id, _invoke_claude(_script_prompt(pending[job_id]["topic"], words=words)), None
+            except ClientError as e:
+                return job_id, None, e
+
+        with ThreadPoolExecutor(max_workers=min(4, len(pending))) as pool:
+            results = list(pool.map(generate, pending))
+        started += _finish_scripts({j: t for j, t, _ in results if t}, pending, "bedrock", batch_id, target)
+        _fail_scripts({j: e or "empty model output" for j, t, e in results if not t})
+        out["onDemand"] = len(pending)
+    out["started"] = started
+    return out
+
+
+# Lambda function name suffix -> (job stage for failure tracking, handler)
+_DISPATCH = [
+    ("scriptFn", "script", script_handler),
+    ("ttsFn", "tts", tts_handler),
+    ("brollFn", "broll", broll_handler),
+    ("uploadFn", "upload", upload_handler),
+    ("statusFn", None, status_handler),
+    ("batchFn", None, batch_handler),
+    ("renderSizeFn", None, render_size_handler),
+]
+
+
 def handler(event, context):
     """
     Single entry point — dispatch on Lambda function name suffix.
+    A stage handler that raises marks the job <STAGE>_FAILED before re-raising.
     """
     name = context.function_name
-    if name.endswith("scriptFn"):
-        return script_handler(event, context)
-    if name.endswith("ttsFn"):
-        return tts_handler(event, context)
-    if name.endswith("brollFn"):
-        return broll_handler(event, context)
-    if name.endswith("uploadFn"):
-        return upload_handler(event, context)
+    for suffix, stage, fn in _DISPATCH:
+        if name.endswith(suffix):
+            try:
+                return fn(event, context)
+            except Exception as e:
+                job_id = (event or {}).get("jobId")
+                if stage and job_id:
+                    job_state.fail(ddb, job_id, stage, e)
+                raise
     return {"ok": False, "error": f"Unknown function for handler dispatch: {name}"}
@@ -0,0 +1,268 @@
+"""
+B-roll acquisition from Pexels into s3://MEDIA_BUCKET/broll/.
+
+Given search terms, ``acquire`` queries the Pexels video search API for each
+term concurrently, picks one rendition per video (the smallest MP4 at least
+``height`` tall, so a 4K upload is never fetched for a 720p render) and
+streams the chosen files into S3:
+
+    GET  /videos/search?query=<term>&orientation=landscape   Authorization: <api key>
+    GET  <video_files[].link>   Range: bytes=<n>-<n + PART_SIZE - 1>   (one request per S3 part)
+
+Range responses are regrouped into ``part_size`` pieces for ``upload_part``
+of a multipart upload (a server may answer a range with fewer bytes, and
+every part but the last must be at least 5 MiB), so a clip never touches
+/tmp and under two parts per worker are in memory. Downloads share one urllib3 PoolManager (keep-alive connections,
+bounded per host, retries with backoff on 429/5xx); urllib3 ships with
+botocore, so the Lambda needs no extra package.
+
+Dedup, cheapest first:
+
+    source   broll/pexels/<videoId>-<fileId>.mp4 already exists: nothing is fetched
+    content  the bytes hash to a known broll/sha256/<digest>.json pointer: the
+             multipart upload is aborted before completion and the pointer's
+             clip is used instead (Pexels re-uploads and other renditions
+             sharing a file)
+
+A completed upload writes its pointer with IfNoneMatch, so two jobs that
+fetch the same bytes at once settle on one copy.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import zip_longest
+from urllib.parse import urlencode
+
+import urllib3
+from botocore.exceptions import ClientError
+
+API_BASE = "https://api.pexels.com"
+PREFIX = "broll/pexels/"
+HASH_PREFIX = "broll/sha256/"
+PART_SIZE = 8 * 1024 * 1024           # S3 parts must be >= 5 MiB except the last
+MAX_CLIP_BYTES = 200 * 1024 * 1024
+_MISSING = ("NoSuchKey", "404", "NotFound")
+_CONFLICT = ("PreconditionFailed", "ConditionalRequestConflict")
+
+
+def pool(workers: int = 6, retries: int = 3):
+    """Shared HTTP pool: at most ``workers`` connections per host, reused across requests and invocations."""
+    return urllib3.PoolManager(
+        num_pools=8, maxsize=workers, block=True,
+        retries=urllib3.Retry(total=retries, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=("GET",), raise_on_status=False),
+        timeout=urllib3.Timeout(connect=5.0, read=30.0),
+    )
+
+
+# -------- Search --------
+
+class PexelsClient:
+    def __init__(self, api_key, http, base_url: str = API_BASE):
+        """``api_key`` is the key or a zero-argument callable returning it (fetched on first use)."""
+        self._api_key = api_key
+        self._lock = threading.Lock()
+        self.http = http
+        self.base_url = base_url.rstrip("/")
+
+    def _key(self) -> str:
+        with self._lock:
+            if callable(self._api_key):
+                self._api_key = self._api_key()
+            return self._api_key
+
+    def search(self, query: str, per_page: int = 15, min_duration: int = None) -> list:
+        params = {"query": query, "per_page": per_page, "orientation": "landscape"}
+        if min_duration:
+            params["min_duration"] = int(min_duration)
+        try:
+            resp = self.http.request("GET", f"{self.base_url}/videos/search?{urlencode(params)}",
+                                     headers={"Authorization": self._key(), "Accept": "application/json"})
+        except urllib3.exceptions.HTTPError as e:
+            raise RuntimeError(f"Pexels search failed: {e}")
+        if resp.status != 200:
+            raise RuntimeError(f"Pexels search HTTP {resp.status}: {resp.data[:200].decode('utf-8', 'replace')}")
+        return json.loads(resp.data.decode("utf-8")).get("videos") or []
+
+
+def pick_file(video: dict, height: int = 720):
+    """The smallest MP4 rendition at least ``height`` tall, else the tallest there is; None without MP4s."""
+    files = [f for f in video.get("video_files") or []
+             if f.get("file_type") == "video/mp4" and f.get("link") and f.get("height")]
+    if not files:
+        return None
+    tall = [f for f in files if f["height"] >= height]
+    if tall:
+        return min(tall, key=lambda f: (f["height"], f.get("width") or 0))
+    return max(files, key=lambda f: (f["height"], f.get("width") or 0))
+
+
+# -------- Transfer --------
+
+def _ranges(http, url: str, part_size: int, max_bytes: int):
+    """
+    Yield the file at ``url`` in ``part_size`` pieces, one Range request per
+    piece. A server that ignores Range (200) is read from that one response.
+    """
+    start, total = 0, None
+    while total is None or start < total:
+        resp = http.request("GET", url, headers={"Range": f"bytes={start}-{start + part_size - 1}"},
+                            preload_content=False)
+        try:
+            if resp.status == 206:
+                total = int(resp.headers["Content-Range"].rsplit("/", 1)[1])
+                if total > max_bytes:
+                    raise ValueError(f"{url} is {total} bytes (limit {max_bytes})")
+                data = resp.read()
+                if not data:
+                    raise RuntimeError(f"Empty range {start}- from {url}")
+                start += len(data)
+                yield data
+            elif resp.status == 200:
+                if int(resp.headers.get("Content-Length") or 0) > max_bytes:
+                    raise ValueError(f"{url} is {resp.headers['Content-Length']} bytes (limit {max_bytes})")
+                while True:
+                    data = resp.read(part_size)
+                    if not data:
+                        return
+                    yield data
+            else:
+                raise RuntimeError(f"HTTP {resp.status} fetching {url}")
+        except BaseException:
+            resp.close()  # body left unread: never hand this connection back to the pool
+            raise
+        finally:
+            resp.release_conn()
+
+
+def _parts(chunks, part_size: int):
+    """Regroup ``chunks`` into ``part_size`` pieces; only the last may be shorter."""
+    buf = bytearray()
+    for data in chunks:
+        buf += data
+        while len(buf) >= part_size:
+            yield bytes(buf[:part_size])
+            del buf[:part_size]
+    if buf:
+        yield bytes(buf)
+
+
+def _missing(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") in _MISSING
+
+
+def _pointer(s3, bucket: str, digest: str):
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=f"{HASH_PREFIX}{digest}.json")
+    except ClientError as e:
+        if _missing(e):
+            return None
+        raise
+    return json.loads(obj["Body"].read().decode("utf-8"))
+
+
+def fetch(http, s3, bucket: str, video: dict, rendition: dict, part_size: int = PART_SIZE,
+          max_bytes: int = MAX_CLIP_BYTES) -> dict:
+    """
+    Store one rendition under broll/pexels/ unless it is already there.
+    Returns {"s3_key", "duration", "bytes", "sha256", "pexelsId", "width",
+    "height", "fetched", "dedup"}; ``dedup`` is None, "source" or "content".
+    """
+    key = f"{PREFIX}{video['id']}-{rendition['id']}.mp4"
+    clip = {"s3_key": key, "duration": float(video.get("duration") or 0), "pexelsId": video["id"],
+            "width": rendition.get("width"), "height": rendition.get("height"), "fetched": 0, "dedup": None}
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+        return {**clip, "bytes": head["ContentLength"], "sha256": None, "dedup": "source"}
+    except ClientError as e:
+        if not _missing(e):
+            raise
+
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket, Key=key, ContentType="video/mp4",
+        Metadata={"pexels-id": str(video["id"]), "pexels-file-id": str(rendition["id"])})["UploadId"]
+    sha, parts, size, finished, known = hashlib.sha256(), [], 0, False, None
+    try:
+        for n, data in enumerate(_parts(_ranges(http, rendition["link"], part_size, max_bytes), part_size), 1):
+            sha.update(data)
+            size += len(data)
+            resp = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=n, Body=data)
+            parts.append({"PartNumber": n, "ETag": resp["ETag"]})
+        digest = sha.hexdigest()
+        known = _pointer(s3, bucket, digest)
+        if known is None:
+            s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                         MultipartUpload={"Parts": parts})
+        finished = True
+    finally:
+        if not finished or known is not None:
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+    clip.update(bytes=size, sha256=digest, fetched=size)
+    if known is not None:
+        return {**clip, "s3_key": known["key"], "dedup": "content"}
+
+    try:
+        s3.put_object(Bucket=bucket, Key=f"{HASH_PREFIX}{digest}.json", IfNoneMatch="*",
+                      Body=json.dumps({"key": key, "bytes": size, "pexelsId": video["id"]}).encode("utf-8"),
+                      ContentType="application/json")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in _CONFLICT:
+            raise
+        # Another job stored the same bytes first: keep its copy, drop ours.
+        s3.delete_object(Bucket=bucket, Key=key)
+        return {**clip, "s3_key": _pointer(s3, bucket, digest)["key"], "dedup": "content"}
+    return clip
+
+
+# -------- Acquisition --------
+
+def candidates(client: PexelsClient, terms, per_term: int, height: int, min_duration: int = None, workers: int = 4):
+    """[(video, rendition)] from every term, interleaved so each term contributes early; one entry per video."""
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(terms)))) as ex:
+        results = list(ex.map(lambda t: client.search(t, per_page=per_term, min_duration=min_duration), terms))
+    out, seen = [], set()
+    for row in zip_longest(*results):
+        for video in row:
+            if video is None or video["id"] in seen:
+                continue
+            seen.add(video["id"])
+            rendition = pick_file(video, height)
+            if rendition is not None:
+                out.append((video, rendition))
+    return out
+
+
+def acquire(client: PexelsClient, s3, bucket: str, terms, count: int = 6, height: int = 720,
+            min_duration: int = None, workers: int = 6, part_size: int = PART_SIZE,
+            max_bytes: int = MAX_CLIP_BYTES, log=print) -> list:
+    """
+    Up to ``count`` distinct clips for ``terms``, in search order. Downloads
+    run ``workers`` at a time over ``client.http``; a candidate that fails or
+    turns out to duplicate a clip already chosen is replaced by the next one.
+    """
+    queue = candidates(client, list(terms), per_term=count + 2, height=height, min_duration=min_duration,
+                       workers=workers)
+    chosen, keys = {}, set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        pending, i = {}, 0
+        while True:
+            while i < len(queue) and len(pending) < min(workers, count - len(chosen)):
+                video, rendition = queue[i]
+                pending[ex.submit(fetch, client.http, s3, bucket, video, rendition, part_size, max_bytes)] = i
+                i += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                idx = pending.pop(fut)
+                try:
+                    clip = fut.result()
+                except (RuntimeError, ValueError, urllib3.exceptions.HTTPError) as e:
+                    log(f"[BROLL] skip pexels video {queue[idx][0]['id']}: {e}")
+                    continue
+                if clip["s3_key"] in keys or len(chosen) >= count:
+                    continue
+                keys.add(clip["s3_key"])
+                chosen[idx] = clip
+    return [chosen[i] for i in sorted(chosen)]
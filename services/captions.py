@@ -0,0 +1,256 @@
+"""
+Sidecar captions (SRT and WebVTT) timed from the narration tts_handler just
+synthesized, so subtitles never go through the renderer's encoder.
+
+Timing needs no extra TTS requests and no recognizer:
+
+1. Chunk anchors. Every Polly-sized chunk is synthesized separately, so the
+   exact start and length of each chunk in voice.wav are known.
+2. Expected lengths. Each cue's share of its chunk is estimated with the
+   voice's speech_rate coefficients, counting words by their letters (a
+   long word takes longer to say) plus sentence and clause pauses.
+3. Pause alignment. TTS leaves audible gaps at sentence and clause breaks.
+   The silences in the chunk's PCM are the candidate boundaries, and a small
+   dynamic program places every boundary on one of them (or, at a penalty,
+   where the estimate puts it, for cues split between words) so that each
+   cue's length is as close to its expectation as possible. Costing each
+   cue on its own keeps an estimation error from drifting through the rest
+   of a 2500-character chunk.
+
+Cues are sentences, split at clause marks (or between words) when longer
+than MAX_LINES lines of MAX_LINE characters (the usual two 42-character
+lines of broadcast subtitles).
+"""
+import bisect
+import re
+from array import array
+
+import speech_rate
+
+MAX_LINE = 42
+MAX_LINES = 2
+SILENCE_MIN_SEC = 0.12
+SILENCE_PEAK = 600          # of 32767, about -35 dBFS
+FRAME_SEC = 0.01
+CLAUSE_REACH = 30           # characters a cut may move to land on a clause mark
+AVG_LETTERS = 5.0           # letters in an average spoken English word
+# Alignment penalties (seconds of squared relative error): a boundary that
+# should fall in a pause but is placed without one, one that needs none,
+# and a sentence end placed on a pause shorter than SENTENCE_PAUSE_SEC
+# (TTS pauses longer after a full stop than at a comma or between words).
+NO_PAUSE_AT_BREAK = 1.0
+NO_PAUSE_MID_SENTENCE = 0.05
+SENTENCE_PAUSE_SEC = 0.3
+SHORT_SENTENCE_PAUSE = 0.3
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+# -------- Cue text --------
+
+def _split_long(sentence: str, limit: int):
+    """
+    ``sentence`` in the fewest pieces of at most ``limit`` characters, cut
+    near equal lengths and at a clause mark when one is within CLAUSE_REACH
+    characters of the cut.
+    """
+    spaces = [i for i, c in enumerate(sentence) if c == " "]
+    clause = {i for i in spaces if sentence[i - 1] in ",;:" or sentence[i + 1:i + 2] in ("-", "–", "—")}
+    pieces = -(-len(sentence) // limit)
+    while pieces <= len(spaces) + 1:
+        cuts, prev = [], -1
+        for k in range(1, pieces):
+            target = len(sentence) * k / pieces
+            options = [i for i in spaces if i > prev]
+            if not options:
+                break
+            near = [i for i in options if i in clause and abs(i - target) <= CLAUSE_REACH]
+            cut = min(near or options, key=lambda i: abs(i - target))
+            cuts.append(cut)
+            prev = cut
+        out, start = [], 0
+        for cut in cuts + [len(sentence)]:
+            out.append(sentence[start:cut].strip())
+            start = cut + 1
+        if all(len(p) <= limit for p in out) and all(out):
+            return out
+        pieces += 1
+    return sentence.split()
+
+
+def segments(text: str, limit: int = MAX_LINE * MAX_LINES):
+    """Cue texts for ``text``: sentences, long ones split evenly (at clause marks where possible)."""
+    out = []
+    for sentence in filter(None, (s.strip() for s in _SENTENCE.split(text.strip()))):
+        out.extend([sentence] if len(sentence) <= limit else _split_long(sentence, limit))
+    return out
+
+
+def wrap(text: str, width: int = MAX_LINE):
+    """One line if it fits, else two lines split at the space nearest the middle."""
+    if len(text) <= width or " " not in text:
+        return [text]
+    mid = len(text) // 2
+    spaces = [i for i, c in enumerate(text) if c == " "]
+    cut = min(spaces, key=lambda i: abs(i - mid))
+    return [text[:cut], text[cut + 1:]]
+
+
+# -------- Timing --------
+
+def silences(pcm: bytes, sample_rate: int):
+    """[(start_sec, end_sec)] of runs quieter than SILENCE_PEAK lasting at least SILENCE_MIN_SEC (16-bit mono)."""
+    samples = array("h")
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    frame = max(1, int(sample_rate * FRAME_SEC))
+    min_frames = max(1, int(round(SILENCE_MIN_SEC / FRAME_SEC)))
+    out, run_start = [], None
+    n_frames = (len(samples) + frame - 1) // frame
+    for f in range(n_frames + 1):
+        quiet = False
+        if f < n_frames:
+            window = samples[f * frame:(f + 1) * frame]
+            quiet = max(window) < SILENCE_PEAK and -min(window) < SILENCE_PEAK
+        if quiet and run_start is None:
+            run_start = f
+        elif not quiet and run_start is not None:
+            if f - run_start >= min_frames:
+                out.append((run_start * frame / sample_rate, min(f * frame, len(samples)) / sample_rate))
+            run_start = None
+    return out
+
+
+def weight(text: str, coef=speech_rate.DEFAULT) -> float:
+    """Expected seconds for a cue: speech_rate's model with each word weighted by its length."""
+    words = 0.0
+    for token in text.split():
+        core = token.strip(".,;:!?\"'()—–-")
+        if not core:
+            continue
+        if any(c.isdigit() for c in core):
+            words += speech_rate._number_words(core)
+        else:
+            words += 0.4 + 0.6 * len(core) / AVG_LETTERS
+    _, sentences, clauses = speech_rate.features(text)
+    return max(coef[0] * words + coef[1] * sentences + coef[2] * clauses, 0.1)
+
+
+def _fit(parts, expected, gaps, seconds: float):
+    """
+    Boundary times between ``parts`` (len(parts) - 1 of them): each at a
+    pause midpoint or at its estimated time, minimising the sum of
+    (actual - expected)^2 / expected over cue lengths plus the penalties.
+    """
+    n = len(parts)
+    if n < 2:
+        return []
+    cands, acc = [], 0.0
+    for e in expected[:-1]:
+        acc += e
+        cands.append((acc, 0.0))
+    cands.extend(((start + end) / 2, end - start) for start, end in gaps if 0.0 < (start + end) / 2 < seconds)
+    cands.sort()
+    times = [t for t, _ in cands]
+
+    def penalty(k, j):
+        pause, mark = cands[j][1], parts[k].rstrip()[-1:]
+        if not pause:
+            return NO_PAUSE_AT_BREAK if mark and mark in ".!?,;:" else NO_PAUSE_MID_SENTENCE
+        return SHORT_SENTENCE_PAUSE if mark and mark in ".!?" and pause < SENTENCE_PAUSE_SEC else 0.0
+
+    def seg(d, e):
+        return (d - e) ** 2 / max(e, 0.5)
+
+    # cost[j]: best cost with the current boundary at candidate j; back[k][j]: previous candidate.
+    cost = {j: seg(times[j], expected[0]) + penalty(0, j) for j in range(len(times))}
+    back = []
+    for k in range(1, n - 1):
+        e, nxt, links = expected[k], {}, {}
+        for j in range(len(times)):
+            best, arg = None, None
+            lo = bisect.bisect_left(times, times[j] - 3.0 * e - 1.0)
+            hi = bisect.bisect_left(times, times[j] - 0.25 * e)
+            for i in range(lo, hi):
+                if i not in cost:
+                    continue
+                total = cost[i] + seg(times[j] - times[i], e)
+                if best is None or total < best:
+                    best, arg = total, i
+            if arg is not None:
+                nxt[j], links[j] = best + penalty(k, j), arg
+        if not nxt:
+            return None
+        cost = nxt
+        back.append(links)
+    last = min(cost, key=lambda j: cost[j] + seg(seconds - times[j], expected[-1]))
+    path = [last]
+    for links in reversed(back):
+        path.append(links[path[-1]])
+    path.reverse()
+
+    # A boundary left without a pause sits where the whole-chunk estimate put
+    # it; place it between its anchored neighbours in proportion instead.
+    bounds = [0.0] + [times[j] for j in path] + [seconds]
+    anchored = [True] + [cands[j][1] > 0 for j in path] + [True]
+    a = 0
+    for b in range(1, n + 1):
+        if not anchored[b]:
+            continue
+        span = sum(expected[a:b])
+        acc = 0.0
+        for k in range(a + 1, b):
+            acc += expected[k - 1]
+            bounds[k] = bounds[a] + (bounds[b] - bounds[a]) * acc / span
+        a = b
+    return bounds[1:-1]
+
+
+def align(chunks, chunk_pcm, sample_rate: int, coef=speech_rate.DEFAULT):
+    """
+    [(start_sec, end_sec, text)] for a narration synthesized chunk by chunk;
+    ``chunk_pcm`` holds each chunk's PCM, in order.
+    """
+    cues, offset = [], 0.0
+    for text, pcm in zip(chunks, chunk_pcm):
+        seconds = len(pcm) / (2.0 * sample_rate)
+        parts = segments(text)
+        if not parts or seconds <= 0:
+            offset += seconds
+            continue
+        weights = [weight(p, coef) for p in parts]
+        expected = [w * seconds / sum(weights) for w in weights]
+        bounds = _fit(parts, expected, silences(pcm, sample_rate) if len(parts) > 1 else [], seconds)
+        if bounds is None:  # no consistent placement: fall back to the estimate
+            bounds, acc = [], 0.0
+            for e in expected[:-1]:
+                acc += e
+                bounds.append(acc)
+        bounds = [0.0] + bounds + [seconds]
+        for i, part in enumerate(parts):
+            cues.append((offset + bounds[i], offset + bounds[i + 1], part))
+        offset += seconds
+    return cues
+
+
+# -------- Formats --------
+
+def _stamp(seconds: float, sep: str) -> str:
+    ms = int(round(seconds * 1000))
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}{sep}{ms:03d}"
+
+
+def srt(cues) -> str:
+    blocks = []
+    for n, (start, end, text) in enumerate(cues, 1):
+        blocks.append(f"{n}\n{_stamp(start, ',')} --> {_stamp(end, ',')}\n" + "\n".join(wrap(text)))
+    return "\n\n".join(blocks) + "\n"
+
+
+def webvtt(cues) -> str:
+    blocks = ["WEBVTT"]
+    for start, end, text in cues:
+        blocks.append(f"{_stamp(start, '.')} --> {_stamp(end, '.')}\n" + "\n".join(wrap(text)))
+    return "\n\n".join(blocks) + "\n"
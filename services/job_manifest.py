@@ -0,0 +1,150 @@
+"""
+Per-job artifact manifest: one small JSON object that says where every
+artifact of a job lives, so stages read it once instead of probing S3.
+
+    s3://MEDIA_BUCKET/jobs/<jobId>/manifest.json
+    {
+      "schema": 1,
+      "jobId": "demo-0001",
+      "rev": 3,                       # bumped on every write
+      "updatedAt": 1730000000000,
+      "artifacts": {
+        "script": {"key": "jobs/demo-0001/script.txt", "etag": "...", "bytes": 2048},
+        "voice":  {"key": "jobs/demo-0001/voice.wav", "etag": "...", "bytes": 3840044, "seconds": 120.0},
+        "edl":    {"key": "jobs/demo-0001/edl.json", "etag": "...", "bytes": 112},
+        "out":    {"key": "jobs/demo-0001/out.mp4", "bytes": 4354431},
+        ...
+      },
+      "variants": [{"name", "voice", "audio_key", "seconds"}],   # optional (narration variants)
+      "meta": {"title", "description", "tags"}                  # optional (uploader)
+    }
+
+Writes are read-modify-write guarded by S3 conditional puts (If-Match on the
+ETag that was read, If-None-Match for a new manifest), so TTS and B-roll can
+update it concurrently. After each write the document, its ETag and rev are
+cached on the Jobs item (manifestJson / manifestEtag / manifestRev, only ever
+moving forward), and readers try that item first.
+
+Jobs written before the manifest existed have none. The stages that may
+meet one, renderer/render.py and lambdas/uploadFn/app.py, carry their own
+copies of the read path (they deploy separately) and fall back to the old
+layouts there: EDL under jobs/<id>/ or <id>/, meta.json or edl.json for
+upload metadata.
+"""
+import json
+import time
+
+from botocore.exceptions import ClientError
+
+SCHEMA = 1
+MAX_ATTEMPTS = 5
+_CONFLICT = ("PreconditionFailed", "ConditionalRequestConflict")
+_MISSING = ("NoSuchKey", "404", "NotFound")
+
+
+def manifest_key(job_id: str) -> str:
+    return f"jobs/{job_id}/manifest.json"
+
+
+def empty(job_id: str) -> dict:
+    return {"schema": SCHEMA, "jobId": job_id, "rev": 0, "artifacts": {}}
+
+
+def _code(e: ClientError) -> str:
+    return e.response.get("Error", {}).get("Code", "")
+
+
+# -------- Reads --------
+
+def _from_table(table, job_id: str):
+    if table is None:
+        return None
+    item = table.get_item(Key={"jobId": job_id},
+                          ProjectionExpression="manifestJson, manifestEtag").get("Item")
+    if not item or "manifestJson" not in item:
+        return None
+    return json.loads(item["manifestJson"]), item.get("manifestEtag")
+
+
+def _from_s3(s3, bucket: str, job_id: str):
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=manifest_key(job_id))
+    except ClientError as e:
+        if _code(e) in _MISSING:
+            return None
+        raise
+    return json.loads(obj["Body"].read().decode("utf-8")), obj["ETag"]
+
+
+def load(s3, bucket: str, job_id: str, table=None):
+    """
+    (manifest, etag): the Jobs item copy if there is one, else the S3 object.
+    (None, None) if the job has no manifest.
+    """
+    found = _from_table(table, job_id) or _from_s3(s3, bucket, job_id)
+    return found or (None, None)
+
+
+# -------- Writes --------
+
+def artifact(key: str, put_response: dict = None, size: int = None, **extra) -> dict:
+    """Manifest entry for an object just written (``put_response`` from put_object)."""
+    entry = {"key": key}
+    if put_response and put_response.get("ETag"):
+        entry["etag"] = put_response["ETag"]
+    if size is not None:
+        entry["bytes"] = size
+    entry.update(extra)
+    return entry
+
+
+def _cache(table, doc: dict, etag: str):
+    if table is None:
+        return
+    try:
+        table.update_item(
+            Key={"jobId": doc["jobId"]},
+            UpdateExpression="SET manifestJson = :doc, manifestEtag = :etag, manifestRev = :rev",
+            ConditionExpression="attribute_not_exists(manifestRev) OR manifestRev < :rev",
+            ExpressionAttributeValues={":doc": json.dumps(doc), ":etag": etag, ":rev": doc["rev"]},
+        )
+    except ClientError as e:
+        if _code(e) != "ConditionalCheckFailedException":
+            raise  # a newer revision is already cached otherwise
+
+
+def update(s3, bucket: str, job_id: str, artifacts: dict = None, table=None, base=None,
+           create: bool = False, **fields):
+    """
+    Merge ``artifacts`` (name -> entry) and top-level ``fields`` (e.g.
+    variants=[...], meta={...}) into the manifest and write it atomically.
+    ``base`` is the (manifest, etag) the caller already read, saving a GET;
+    pass (None, None) for a job expected to have no manifest yet. On a
+    conflicting write the manifest is re-read from S3 and the merge retried.
+
+    Only the first stage passes ``create``: a job that started before
+    manifests existed keeps its legacy layout rather than getting a partial
+    manifest that would hide it from the legacy fallbacks. Returns the manifest
+    as written, or None if there was none to update.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        doc, etag = base if base is not None else (_from_s3(s3, bucket, job_id) or (None, None))
+        if doc is None and not create:
+            return None
+        new = json.loads(json.dumps(doc)) if doc else empty(job_id)
+        new.setdefault("artifacts", {}).update(artifacts or {})
+        new.update(fields)
+        new["rev"] = new.get("rev", 0) + 1
+        new["updatedAt"] = int(time.time() * 1000)
+        cond = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            resp = s3.put_object(Bucket=bucket, Key=manifest_key(job_id), Body=json.dumps(new).encode("utf-8"),
+                                 ContentType="application/json", CacheControl="no-cache", **cond)
+        except ClientError as e:
+            if _code(e) not in _CONFLICT:
+                raise
+            base = None  # someone else wrote first: re-read and merge again
+            continue
+        _cache(table, new, resp["ETag"])
+        return new
+    raise RuntimeError(f"Could not update manifest for {job_id} after {MAX_ATTEMPTS} attempts")
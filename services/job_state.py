@@ -0,0 +1,351 @@
+"""
+Job state for the Jobs table: per-stage transitions plus a sparse status index.
+
+Each stage writes twice: ``begin`` when it starts and ``complete`` (or ``fail``)
+when it ends. Items carry flat per-stage attributes so every transition is a
+single UpdateItem and never needs a read:
+
+    status            SCRIPT_RUNNING | SCRIPT_DONE | ... | UPLOAD_DONE | <STAGE>_FAILED
+    updatedAt         epoch ms of the last transition
+    <stage>StartedAt  epoch ms
+    <stage>FinishedAt epoch ms (also the idempotency guard for retries)
+    <stage>Ms         stage duration in ms
+    <artifact>Key     e.g. scriptKey, voiceKey, edlKey, outKey
+
+``inflightStatus`` is set to ``<status>#<shard>`` while a job is in flight and
+removed when it finishes, so the ``byInflightStatus`` GSI (partition
+inflightStatus, sort updatedAt, keys only) holds in-flight and failed jobs
+only. Sharding spreads thousands of jobs sitting in one status across
+partitions; the query helpers fan out over all shards.
+
+TTS and Broll run in parallel branches, so two stages share one ``status``.
+A transition never overwrites another stage's ``*_RUNNING`` status or any
+other stage's ``*_FAILED`` status (a stage may replace its own failure when
+a retry succeeds; a failure may replace another stage's RUNNING). When the
+status is held by the other stage, only the stage's own attributes
+(``<stage>StartedAt``, ``<stage>FinishedAt``, artifact keys, ...) are
+written, so a late Broll can neither hide ``TTS_FAILED`` from the index nor
+lose its own timings.
+"""
+import hashlib
+import os
+import time
+
+from botocore.exceptions import ClientError
+
+STAGES = ("script", "tts", "broll", "render", "upload")
+FINAL_STAGE = "upload"
+STATUS_INDEX = "byInflightStatus"
+INDEX_SHARDS = int(os.environ.get("JOB_INDEX_SHARDS", "8"))
+TRANSACT_LIMIT = 100  # DynamoDB TransactWriteItems maximum
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _shard(job_id: str) -> int:
+    return int(hashlib.md5(job_id.encode("utf-8")).hexdigest(), 16) % INDEX_SHARDS
+
+
+def _check_stage(stage: str):
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage {stage!r}; expected one of {STAGES}")
+
+
+def in_flight_statuses():
+    """Every status value that can appear in the index."""
+    out = []
+    for stage in STAGES:
+        out.append(f"{stage.upper()}_RUNNING")
+        if stage != FINAL_STAGE:
+            out.append(f"{stage.upper()}_DONE")
+        out.append(f"{stage.upper()}_FAILED")
+    return out
+
+
+# -------- Update builders (pure; usable singly or in a batch) --------
+
+def _update(job_id: str, sets: dict, remove=(), condition: str = None, blocked=(), fallback: dict = None) -> dict:
+    """
+    UpdateItem arguments. ``condition`` names the stage's idempotency guard
+    (must not exist yet); ``blocked`` lists statuses the update must not
+    overwrite. ``fallback`` is applied instead when the update is rejected
+    (see apply()); it is not a DynamoDB parameter.
+    """
+    names, values, clauses = {}, {}, []
+    for i, (attr, value) in enumerate(sets.items()):
+        names[f"#a{i}"] = attr
+        values[f":v{i}"] = value
+        clauses.append(f"#a{i}=:v{i}")
+    expr = "SET " + ", ".join(clauses)
+    if remove:
+        for j, attr in enumerate(remove):
+            names[f"#r{j}"] = attr
+        expr += " REMOVE " + ", ".join(f"#r{j}" for j in range(len(remove)))
+    args = {
+        "Key": {"jobId": job_id},
+        "UpdateExpression": expr,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+    guards = []
+    if condition:
+        names["#guard"] = condition
+        guards.append("attribute_not_exists(#guard)")
+    if blocked:
+        names["#st"] = "status"
+        for k, status in enumerate(blocked):
+            values[f":b{k}"] = status
+        held = ", ".join(f":b{k}" for k in range(len(blocked)))
+        guards.append(f"(attribute_not_exists(#st) OR NOT (#st IN ({held})))")
+    if guards:
+        args["ConditionExpression"] = " AND ".join(guards)
+    if fallback:
+        args["fallback"] = fallback
+    return args
+
+
+def _held_by_others(stage: str, running: bool = True):
+    """Statuses of the other stages that ``stage`` must not overwrite."""
+    out = []
+    for other in STAGES:
+        if other != stage:
+            out.append(f"{other.upper()}_FAILED")
+            if running:
+                out.append(f"{other.upper()}_RUNNING")
+    return out
+
+
+def begin_update(job_id: str, stage: str, now_ms: int = None) -> dict:
+    _check_stage(stage)
+    now = now_ms or _now_ms()
+    status = f"{stage.upper()}_RUNNING"
+    guard = f"{stage}FinishedAt"
+    return _update(job_id, {
+        "status": status,
+        "inflightStatus": f"{status}#{_shard(job_id)}",
+        "updatedAt": now,
+        f"{stage}StartedAt": now,
+    }, condition=guard, blocked=_held_by_others(stage),
+        fallback=_update(job_id, {f"{stage}StartedAt": now}, condition=guard))
+
+
+def complete_update(job_id: str, stage: str, started_ms: int = None, artifacts: dict = None,
+                    now_ms: int = None) -> dict:
+    """``artifacts`` are extra attributes, e.g. {"voiceKey": "jobs/x/voice.wav"}."""
+    _check_stage(stage)
+    now = now_ms or _now_ms()
+    status = f"{stage.upper()}_DONE"
+    guard = f"{stage}FinishedAt"
+    own = {f"{stage}FinishedAt": now}
+    if started_ms is not None:
+        own[f"{stage}Ms"] = now - started_ms
+    own.update(artifacts or {})
+    sets = {"status": status, "updatedAt": now, **own}
+    remove = ()
+    if stage == FINAL_STAGE:
+        remove = ("inflightStatus",)
+    else:
+        sets["inflightStatus"] = f"{status}#{_shard(job_id)}"
+    return _update(job_id, sets, remove=remove, condition=guard, blocked=_held_by_others(stage),
+                   fallback=_update(job_id, own, condition=guard))
+
+
+def fail_update(job_id: str, stage: str, error: str, now_ms: int = None) -> dict:
+    _check_stage(stage)
+    now = now_ms or _now_ms()
+    status = f"{stage.upper()}_FAILED"
+    return _update(job_id, {
+        "status": status,
+        "inflightStatus": f"{status}#{_shard(job_id)}",
+        "updatedAt": now,
+        "error": str(error)[:1000],
+    }, blocked=_held_by_others(stage, running=False),
+        fallback=_update(job_id, {f"{stage}Error": str(error)[:1000]}))
+
+
+# -------- Writes --------
+
+def _is_conditional_failure(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+def apply(table, update: dict) -> bool:
+    """
+    Apply one update. If its condition rejects it, its fallback (the stage's
+    own attributes without the status) is applied instead. False if nothing
+    was written (stage already finished).
+    """
+    update = dict(update)
+    fallback = update.pop("fallback", None)
+    try:
+        table.update_item(**update)
+        return True
+    except ClientError as e:
+        if not _is_conditional_failure(e):
+            raise
+    return apply(table, fallback) if fallback else False
+
+
+def begin(table, job_id: str, stage: str) -> int:
+    """Mark ``stage`` running; returns the start time (ms) to pass to complete()."""
+    now = _now_ms()
+    if table is not None:
+        apply(table, begin_update(job_id, stage, now))
+    return now
+
+
+def complete(table, job_id: str, stage: str, started_ms: int = None, **artifacts) -> bool:
+    if table is None:
+        return False
+    return apply(table, complete_update(job_id, stage, started_ms, artifacts))
+
+
+def fail(table, job_id: str, stage: str, error) -> bool:
+    if table is None:
+        return False
+    return apply(table, fail_update(job_id, stage, error))
+
+
+def apply_many(table, updates) -> int:
+    """
+    Apply many updates in TransactWriteItems batches of up to 100. A batch that
+    is cancelled (e.g. one retried job already finished its stage) is replayed
+    item by item so only the rejected updates are dropped. Returns the number
+    of updates applied. A transaction may touch each item once, so pass at most
+    one update per job per call.
+    """
+    from boto3.dynamodb.types import TypeSerializer
+
+    ser = TypeSerializer()
+    client = table.meta.client
+    updates = list(updates)
+    applied = 0
+    for i in range(0, len(updates), TRANSACT_LIMIT):
+        chunk = updates[i:i + TRANSACT_LIMIT]
+        items = []
+        for u in chunk:
+            low = {
+                "TableName": table.name,
+                "Key": {k: ser.serialize(v) for k, v in u["Key"].items()},
+                "UpdateExpression": u["UpdateExpression"],
+                "ExpressionAttributeNames": u["ExpressionAttributeNames"],
+                "ExpressionAttributeValues": {k: ser.serialize(v) for k, v in u["ExpressionAttributeValues"].items()},
+            }
+            if "ConditionExpression" in u:
+                low["ConditionExpression"] = u["ConditionExpression"]
+            items.append({"Update": low})
+        try:
+            client.transact_write_items(TransactItems=items)
+            applied += len(chunk)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                raise
+            applied += sum(1 for u in chunk if apply(table, u))
+    return applied
+
+
+# -------- Upload record --------
+#
+# A published video is recorded on the job item, so a retried Upload step
+# (YouTube accepted the insert, the step still failed) never publishes twice:
+#
+#     videoId            id returned by videos.insert
+#     videoSourceKey     S3 key of the uploaded file
+#     videoSourceEtag    its ETag at upload time (a re-rendered file has a new one)
+#     videoSourceSha256  SHA-256 of its bytes
+#     videoPublishedAt   epoch ms
+#
+# While a transfer runs, uploadClaimAt / uploadClaimEtag stop a second
+# execution of the same job from starting another; a claim older than
+# UPLOAD_CLAIM_TTL_MS (longer than the uploader's timeout) is stale.
+# lambdas/uploadFn/app.py writes these with its own low-level client code
+# because it deploys separately.
+
+UPLOAD_CLAIM_TTL_MS = 15 * 60 * 1000
+
+
+def upload_record(table, job_id: str):
+    """{"videoId", "key", "etag", "sha256", "publishedAt"} if the job's video was published, else None."""
+    if table is None:
+        return None
+    item = table.get_item(Key={"jobId": job_id}, ConsistentRead=True,
+                          ProjectionExpression="videoId, videoSourceKey, videoSourceEtag, videoSourceSha256, "
+                                               "videoPublishedAt").get("Item") or {}
+    if not item.get("videoId"):
+        return None
+    return {"videoId": item["videoId"], "key": item.get("videoSourceKey"), "etag": item.get("videoSourceEtag"),
+            "sha256": item.get("videoSourceSha256"), "publishedAt": item.get("videoPublishedAt")}
+
+
+# -------- Queries (status index) --------
+
+def _query_shards(table, status: str, older_than_ms: int = None, **kwargs):
+    """Yield raw query pages for ``status`` across every shard."""
+    for shard in range(INDEX_SHARDS):
+        key = "inflightStatus = :p"
+        values = {":p": f"{status}#{shard}"}
+        if older_than_ms:
+            key += " AND updatedAt < :cut"
+            values[":cut"] = older_than_ms
+        args = dict(IndexName=STATUS_INDEX, KeyConditionExpression=key,
+                    ExpressionAttributeValues=values, **kwargs)
+        while True:
+            page = table.query(**args)
+            yield page
+            if "LastEvaluatedKey" not in page or kwargs.get("Limit"):
+                break
+            args["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def jobs_in_status(table, status: str, older_than_s: float = None, limit: int = None):
+    """
+    Jobs currently in ``status`` (e.g. "TTS_RUNNING"), oldest first, as
+    [{"jobId", "updatedAt"}]. ``older_than_s`` keeps only jobs whose last
+    transition is at least that old.
+    """
+    cut = _now_ms() - int(older_than_s * 1000) if older_than_s else None
+    rows = []
+    paging = {"Limit": limit} if limit else {}
+    for page in _query_shards(table, status, cut, **paging):
+        rows.extend({"jobId": it["jobId"], "updatedAt": int(it["updatedAt"])} for it in page.get("Items", []))
+    rows.sort(key=lambda r: r["updatedAt"])
+    return rows[:limit] if limit else rows
+
+
+def stuck_jobs(table, stage: str, older_than_s: float = 900, limit: int = None):
+    """Jobs that entered ``stage`` more than ``older_than_s`` ago and never left it."""
+    _check_stage(stage)
+    return jobs_in_status(table, f"{stage.upper()}_RUNNING", older_than_s, limit)
+
+
+def status_counts(table, statuses=None) -> dict:
+    """{status: count} for in-flight/failed statuses, using COUNT queries (no item reads)."""
+    counts = {}
+    for status in statuses or in_flight_statuses():
+        n = sum(page.get("Count", 0) for page in _query_shards(table, status, Select="COUNT"))
+        if n:
+            counts[status] = n
+    return counts
+
+
+def dashboard(table, stuck_after_s: float = 900) -> dict:
+    """
+    One-call overview: per-status counts, the age of the oldest job in each
+    status and how many RUNNING jobs have exceeded ``stuck_after_s``.
+    """
+    now = _now_ms()
+    counts = status_counts(table)
+    oldest, stuck = {}, {}
+    for status in counts:
+        first = [page["Items"][0] for page in _query_shards(table, status, Limit=1, ScanIndexForward=True)
+                 if page.get("Items")]
+        if first:
+            oldest[status] = round((now - min(int(it["updatedAt"]) for it in first)) / 1000, 1)
+        if status.endswith("_RUNNING"):
+            cut = now - int(stuck_after_s * 1000)
+            n = sum(page.get("Count", 0) for page in _query_shards(table, status, cut, Select="COUNT"))
+            if n:
+                stuck[status] = n
+    return {"counts": counts, "oldestAgeSec": oldest, "stuck": stuck, "stuckAfterSec": stuck_after_s}
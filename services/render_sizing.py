@@ -0,0 +1,171 @@
+"""
+Render cost model and per-job Fargate task sizing.
+
+The renderer's wall time is modelled as
+
+    wall = base_s + per_clip_s * clips
+           + (k[profile] + mux_k * (variants - 1)) * output_seconds / vcpu ** alpha
+
+where ``k[profile]`` is encode seconds per output second on one core for a
+set of deliverables ("main+preview+thumbnails", see ``profile_of``),
+``mux_k`` the same for each extra narration variant's audio mux, and
+``alpha`` how well x264 scales with cores (1.0 = linearly). ``rss_mib``
+holds the peak ffmpeg RSS per profile, so a size is only chosen if its
+memory leaves headroom.
+
+The packaged render_cost_model.json holds conservative hand-set values
+("samples": 0) until it is refitted by harness/render_cost_bench.py; the
+renderer writes one sample per real job to metrics/render-cost/<jobId>.json,
+which the same script fits from.
+An override at s3://MEDIA_BUCKET/config/render-cost-model.json wins.
+
+``choose`` picks the cheapest task size (Fargate vCPU-hour + GB-hour) whose
+predicted wall time fits ``target_s``; if none does, the fastest one.
+"""
+import json
+import math
+import os
+
+from botocore.exceptions import ClientError
+
+# (name, vCPU, memory MiB): must match the task definitions in infra/lib/compute-stack.ts.
+SIZES = (("small", 1, 2048), ("medium", 2, 4096), ("large", 4, 8192))
+VCPU_HOUR = 0.04048   # us-east-1 Fargate Linux/x86
+GB_HOUR = 0.004445
+MODEL_KEY = "config/render-cost-model.json"
+SAMPLES_PREFIX = "metrics/render-cost/"
+RSS_HEADROOM = 1.5
+RSS_BASE_MIB = 512    # Python, boto3 and page cache next to ffmpeg
+
+_PACKAGED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "render_cost_model.json")
+
+
+def profile_of(outputs) -> str:
+    """Deliverable set as the model keys it: "main" plus the extra outputs, sorted."""
+    return "+".join(["main", *sorted(outputs)])
+
+
+def load_model(s3=None, bucket: str = None) -> dict:
+    if s3 is not None and bucket:
+        try:
+            return json.loads(s3.get_object(Bucket=bucket, Key=MODEL_KEY)["Body"].read().decode("utf-8"))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                raise
+    with open(_PACKAGED, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _k(model: dict, profile: str) -> float:
+    """Per-profile cost; an unmeasured profile falls back to the dearest measured one."""
+    ks = model["k"]
+    return ks[profile] if profile in ks else max(ks.values())
+
+
+def predict(model: dict, output_seconds: float, clips: int, profile: str, vcpu: float, variants: int = 1) -> float:
+    encode = (_k(model, profile) + model.get("mux_k", 0.0) * max(0, variants - 1)) * output_seconds
+    return model["base_s"] + model["per_clip_s"] * clips + encode / (vcpu ** model["alpha"])
+
+
+def fits_memory(model: dict, profile: str, memory_mib: int) -> bool:
+    rss = model.get("rss_mib", {})
+    need = rss.get(profile, max(rss.values()) if rss else 0)
+    return need * RSS_HEADROOM + RSS_BASE_MIB <= memory_mib
+
+
+def choose(model: dict, output_seconds: float, clips: int, profile: str, variants: int = 1,
+           target_s: float = 600.0) -> dict:
+    """The size to run: {"size", "vcpu", "memoryMiB", "predictedSec", "costUsd"}."""
+    options = []
+    for name, vcpu, mem in SIZES:
+        if not fits_memory(model, profile, mem):
+            continue
+        secs = predict(model, output_seconds, clips, profile, vcpu, variants)
+        cost = secs / 3600.0 * (vcpu * VCPU_HOUR + mem / 1024.0 * GB_HOUR)
+        options.append({"size": name, "vcpu": vcpu, "memoryMiB": mem,
+                        "predictedSec": round(secs, 1), "costUsd": round(cost, 6)})
+    if not options:
+        name, vcpu, mem = SIZES[-1]
+        return {"size": name, "vcpu": vcpu, "memoryMiB": mem, "predictedSec": None, "costUsd": None}
+    in_time = [o for o in options if o["predictedSec"] <= target_s]
+    if in_time:
+        return min(in_time, key=lambda o: (o["costUsd"], o["vcpu"]))
+    return min(options, key=lambda o: o["predictedSec"])
+
+
+# -------- Fitting --------
+
+def _linear(xs, ys):
+    """Least-squares (intercept, slope)."""
+    n = len(xs)
+    mx, my = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mx) ** 2 for x in xs)
+    slope = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx if sxx else 0.0
+    return my - slope * mx, slope
+
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def fit(samples, base: dict = None) -> dict:
+    """
+    Fit a model from render samples ({"profile", "cores", "outputSec",
+    "encodeSec", "wallSec", "clips", "variants", "rssMiB"}). Parameters the
+    samples cannot determine (alpha without multi-core runs, per_clip_s
+    without varying clip counts) are kept from ``base``.
+    """
+    model = json.loads(json.dumps(base)) if base else {
+        "alpha": 0.8, "base_s": 5.0, "per_clip_s": 2.0, "mux_k": 0.0, "k": {}, "rss_mib": {}}
+    single = [s for s in samples if s["cores"] == 1 and s.get("variants", 1) == 1]
+    multi = [s for s in samples if s["cores"] > 1 and s.get("variants", 1) == 1]
+
+    # Intercept and slope of encode time on one core, per profile.
+    overheads = []
+    for profile in sorted({s["profile"] for s in single}):
+        rows = [s for s in single if s["profile"] == profile]
+        if len({s["outputSec"] for s in rows}) > 1:
+            intercept, slope = _linear([s["outputSec"] for s in rows], [s["encodeSec"] for s in rows])
+            overheads.append(max(0.0, intercept))
+            model["k"][profile] = round(slope, 4)
+        else:
+            model["k"][profile] = round(_median([s["encodeSec"] / s["outputSec"] for s in rows]), 4)
+
+    # Speed-up exponent from the same profile/length on more cores.
+    exps = []
+    for s in multi:
+        ref = [r["encodeSec"] for r in single if r["profile"] == s["profile"] and r["outputSec"] == s["outputSec"]]
+        if ref and s["encodeSec"] > 0:
+            exps.append(math.log(_median(ref) / s["encodeSec"]) / math.log(s["cores"]))
+    if exps:
+        model["alpha"] = round(min(1.0, max(0.1, _median(exps))), 3)
+
+    # Profiles only seen on more cores (real jobs): normalise to one core with alpha.
+    for profile in sorted({s["profile"] for s in multi} - {s["profile"] for s in single}):
+        rows = [s for s in multi if s["profile"] == profile]
+        model["k"][profile] = round(_median([s["encodeSec"] * s["cores"] ** model["alpha"] / s["outputSec"]
+                                             for s in rows]), 4)
+
+    muxed = [s for s in samples if s.get("variants", 1) > 1]
+    if muxed:
+        extra = [(s["encodeSec"] * s["cores"] ** model["alpha"] / s["outputSec"] - _k(model, s["profile"]))
+                 / (s["variants"] - 1) for s in muxed]
+        model["mux_k"] = round(max(0.0, _median(extra)), 4)
+
+    walls = [s for s in samples if "wallSec" in s]
+    if walls:
+        if len({s.get("clips", 1) for s in walls}) > 1:
+            fixed, per_clip = _linear([s.get("clips", 1) for s in walls],
+                                      [s["wallSec"] - s["encodeSec"] for s in walls])
+            model["per_clip_s"] = round(max(0.0, per_clip), 3)
+        else:
+            fixed = _median([s["wallSec"] - s["encodeSec"] - model["per_clip_s"] * s.get("clips", 1)
+                             for s in walls])
+        model["base_s"] = round(max(0.0, fixed) + (_median(overheads) if overheads else 0.0), 3)
+
+    for profile in {s["profile"] for s in samples if s.get("rssMiB")}:
+        model["rss_mib"][profile] = max(s["rssMiB"] for s in samples if s["profile"] == profile and s.get("rssMiB"))
+    model["samples"] = len(samples)
+    return model
@@ -0,0 +1,109 @@
+"""
+Bulk script generation through Bedrock batch inference.
+
+One batch covers many jobs. Records are keyed by jobId, so results can be
+matched back without relying on output order. S3 layout (under MEDIA_BUCKET):
+
+    batch/scripts/<batchId>/input.jsonl                       {"recordId", "modelInput"} per line
+    batch/scripts/<batchId>/jobs.json                         {jobId: {"topic", "fp"}}
+    batch/scripts/<batchId>/output/<bedrockJobId>/input.jsonl.out
+                                                              {"recordId", "modelInput", "modelOutput" | "error"}
+
+Bedrock writes the output file itself (plus a manifest.json.out, ignored
+here); ``read_results`` lists the output prefix rather than deriving the
+Bedrock job id, so the same code reads the local stand-in's output.
+"""
+import json
+
+from botocore.exceptions import ClientError
+
+PREFIX = "batch/scripts/"
+MIN_RECORDS = 100  # Bedrock rejects smaller batch jobs
+RUNNING = {"Submitted", "Validating", "Scheduled", "InProgress", "Stopping"}
+
+
+def input_key(batch_id: str) -> str:
+    return f"{PREFIX}{batch_id}/input.jsonl"
+
+
+def jobs_key(batch_id: str) -> str:
+    return f"{PREFIX}{batch_id}/jobs.json"
+
+
+def output_prefix(batch_id: str) -> str:
+    return f"{PREFIX}{batch_id}/output/"
+
+
+def build_input(records) -> bytes:
+    """``records`` is an iterable of (jobId, modelInput dict)."""
+    lines = [json.dumps({"recordId": job_id, "modelInput": body}) for job_id, body in records]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def submit(bedrock_ctl, s3, bucket: str, batch_id: str, records, model_id: str, role_arn: str) -> str:
+    """Write the JSONL input and start the batch job; returns the job ARN."""
+    s3.put_object(Bucket=bucket, Key=input_key(batch_id), Body=build_input(records),
+                  ContentType="application/jsonl")
+    resp = bedrock_ctl.create_model_invocation_job(
+        jobName=f"scripts-{batch_id}"[:63],
+        roleArn=role_arn,
+        modelId=model_id,
+        inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{bucket}/{input_key(batch_id)}"}},
+        outputDataConfig={"s3OutputDataConfig": {"s3Uri": f"s3://{bucket}/{output_prefix(batch_id)}"}},
+    )
+    return resp["jobArn"]
+
+
+def status(bedrock_ctl, job_arn: str) -> dict:
+    resp = bedrock_ctl.get_model_invocation_job(jobIdentifier=job_arn)
+    return {"status": resp["status"], "done": resp["status"] not in RUNNING, "message": resp.get("message")}
+
+
+def read_results(s3, bucket: str, batch_id: str, text_of):
+    """
+    Parse every ``*.jsonl.out`` file under the batch's output prefix.
+    Returns ({jobId: text}, {jobId: error}); ``text_of`` turns a modelOutput
+    payload into script text. Empty texts count as errors.
+    """
+    texts, errors = {}, {}
+    args = {"Bucket": bucket, "Prefix": output_prefix(batch_id)}
+    while True:
+        page = s3.list_objects_v2(**args)
+        for obj in page.get("Contents", []):
+            if not obj["Key"].endswith(".jsonl.out"):
+                continue
+            body = s3.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read().decode("utf-8")
+            for line in body.splitlines():
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                job_id = rec["recordId"]
+                if "modelOutput" in rec:
+                    text = text_of(rec["modelOutput"])
+                    if text:
+                        texts[job_id] = text
+                        continue
+                    errors[job_id] = "empty model output"
+                else:
+                    err = rec.get("error") or {}
+                    errors[job_id] = err.get("errorMessage") if isinstance(err, dict) else str(err)
+        if not page.get("IsTruncated"):
+            break
+        args["ContinuationToken"] = page["NextContinuationToken"]
+    return texts, errors
+
+
+def put_jobs(s3, bucket: str, batch_id: str, jobs: dict):
+    """Side file with what fan-out needs besides the text: {jobId: {"topic", "fp"}}."""
+    s3.put_object(Bucket=bucket, Key=jobs_key(batch_id), Body=json.dumps(jobs).encode("utf-8"),
+                  ContentType="application/json")
+
+
+def get_jobs(s3, bucket: str, batch_id: str) -> dict:
+    try:
+        body = s3.get_object(Bucket=bucket, Key=jobs_key(batch_id))["Body"].read()
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return {}
+        raise
+    return json.loads(body.decode("utf-8"))
@@ -0,0 +1,242 @@
+"""
+Script cache for script_handler: exact hits by prompt fingerprint, plus a
+near-duplicate topic index.
+
+S3 layout (under MEDIA_BUCKET):
+
+    cache/scripts/by-fp/<fingerprint>.json   {"topic", "script", "jobId", "params", "createdAt"}
+    cache/scripts/log/<utc-ts>-<fp>.json      one small entry per cached script (append-only)
+    cache/scripts/index.json                  compacted snapshot of the log
+
+An exact hit is one GET. The near-duplicate index is built once per container
+from the snapshot plus the log tail after it (listed with StartAfter, since
+log keys sort by time) and refreshed with one LIST per lookup. Keys only sort
+by time to the second (and writers' clocks differ), so each LIST starts
+LOG_LAG_SEC before the newest key seen; entries already indexed are
+recognised by the fingerprint in their key and not fetched again. Topics are
+embedded as signed feature-hashed word unigrams/bigrams; the matrix is stored
+dimension-major so a query only touches the ~20 rows its own features hit,
+which keeps lookups well under a millisecond at tens of thousands of topics.
+NumPy is optional; without it a pure-Python inverted index gives the same
+scores, more slowly.
+"""
+import calendar
+import hashlib
+import json
+import math
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+try:
+    import numpy as np
+except ImportError:  # Lambda's stock Python runtime has no NumPy
+    np = None
+
+PREFIX = "cache/scripts/"
+DIM = 256
+COMPACT_EVERY = 50  # log entries past the snapshot before a lookup rewrites it
+LOG_LAG_SEC = 300   # how far behind the newest log key each refresh lists again
+_STAMP = "%Y%m%dT%H%M%S"
+
+# Question words stay: "how to buy REITs" and "why buy REITs" are different videos.
+_STOPWORDS = frozenset("a an and are for in is of on or the to with your".split())
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# -------- Fingerprints --------
+
+def normalize_topic(topic: str) -> str:
+    text = unicodedata.normalize("NFKC", topic).lower()
+    return " ".join(text.split()).strip(" .!?")
+
+
+def params_key(model_id: str, temperature: float, max_tokens: int, prompt_version: str) -> str:
+    """Everything besides the topic that changes the generated script."""
+    raw = json.dumps([model_id, float(temperature), int(max_tokens), prompt_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint(topic: str, params: str) -> str:
+    return hashlib.sha256(f"{params}\n{normalize_topic(topic)}".encode("utf-8")).hexdigest()
+
+
+# -------- Topic embedding --------
+
+def _features(topic: str):
+    tokens = []
+    for tok in _TOKEN.findall(normalize_topic(topic)):
+        if tok in _STOPWORDS:
+            continue
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]  # crude plural folding: "reits" ~ "reit"
+        tokens.append(tok)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def embed_sparse(topic: str) -> dict:
+    """{dimension: weight}, L2-normalized signed feature hashing."""
+    vec = {}
+    for feat in _features(topic):
+        h = int.from_bytes(hashlib.blake2b(feat.encode("utf-8"), digest_size=8).digest(), "little")
+        dim, sign = h % DIM, (1.0 if (h >> 63) else -1.0)
+        vec[dim] = vec.get(dim, 0.0) + sign
+    norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+    return {d: w / norm for d, w in vec.items() if w}
+
+
+class TopicIndex:
+    """Cosine-similarity index over topic embeddings; entries are opaque dicts."""
+
+    def __init__(self):
+        self.entries = []
+        if np is not None:
+            self._cols = np.zeros((DIM, 1024), dtype=np.float32)
+        else:
+            self._postings = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, topic: str, entry: dict):
+        row = len(self.entries)
+        vec = embed_sparse(topic)
+        if np is not None:
+            if row >= self._cols.shape[1]:
+                grown = np.zeros((DIM, self._cols.shape[1] * 2), dtype=np.float32)
+                grown[:, :row] = self._cols
+                self._cols = grown
+            for d, w in vec.items():
+                self._cols[d, row] = w
+        else:
+            for d, w in vec.items():
+                self._postings.setdefault(d, []).append((row, w))
+        self.entries.append(entry)
+
+    def nearest(self, topic: str):
+        """(score, entry) of the most similar topic, or (0.0, None) if empty."""
+        n = len(self.entries)
+        vec = embed_sparse(topic)
+        if not n or not vec:
+            return 0.0, None
+        if np is not None:
+            dims = np.fromiter(vec.keys(), dtype=np.intp, count=len(vec))
+            weights = np.fromiter(vec.values(), dtype=np.float32, count=len(vec))
+            scores = weights @ self._cols[dims, :n]
+            best = int(scores.argmax())
+            return float(scores[best]), self.entries[best]
+        scores = {}
+        for d, w in vec.items():
+            for row, rw in self._postings.get(d, ()):
+                scores[row] = scores.get(row, 0.0) + w * rw
+        if not scores:
+            return 0.0, None
+        best = max(scores, key=scores.get)
+        return scores[best], self.entries[best]
+
+
+# -------- S3-backed cache --------
+
+class ScriptCache:
+    def __init__(self, s3, bucket: str, prefix: str = PREFIX):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+        self._indexes = {}    # params key -> TopicIndex
+        self._seen = set()    # fingerprints already indexed
+        self._log_cursor = None
+        self._log_tail = 0
+        self._loaded = False
+
+    def _get_json(self, key: str):
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(obj["Body"].read().decode("utf-8"))
+
+    def _put_json(self, key: str, doc: dict):
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=json.dumps(doc).encode("utf-8"),
+                           ContentType="application/json")
+
+    def get_exact(self, fp: str):
+        return self._get_json(f"{self.prefix}by-fp/{fp}.json")
+
+    def put(self, fp: str, topic: str, script: str, job_id: str, params: str):
+        now = time.time()
+        self._put_json(f"{self.prefix}by-fp/{fp}.json", {
+            "topic": topic, "script": script, "jobId": job_id, "params": params, "createdAt": int(now),
+        })
+        stamp = time.strftime(_STAMP, time.gmtime(now))
+        self._put_json(f"{self.prefix}log/{stamp}-{fp}.json", {
+            "fp": fp, "topic": topic, "jobId": job_id, "params": params,
+        })
+
+    # -- near-duplicate index --
+    def _index_entry(self, entry: dict):
+        if entry["fp"] in self._seen:
+            return
+        self._seen.add(entry["fp"])
+        self._indexes.setdefault(entry["params"], TopicIndex()).add(entry["topic"], entry)
+
+    def _start_after(self):
+        """LOG_LAG_SEC before the newest log key seen (entries can land out of key order)."""
+        log_prefix = f"{self.prefix}log/"
+        try:
+            newest = calendar.timegm(time.strptime(self._log_cursor[len(log_prefix):][:15], _STAMP))
+        except ValueError:
+            return self._log_cursor
+        return log_prefix + time.strftime(_STAMP, time.gmtime(newest - LOG_LAG_SEC))
+
+    def _load_log_tail(self):
+        args = {"Bucket": self.bucket, "Prefix": f"{self.prefix}log/"}
+        if self._log_cursor:
+            args["StartAfter"] = self._start_after()
+        while True:
+            page = self.s3.list_objects_v2(**args)
+            keys = [obj["Key"] for obj in page.get("Contents", [])]
+            new = [k for k in keys if k.rsplit("-", 1)[-1][:-len(".json")] not in self._seen]
+            if new:
+                with ThreadPoolExecutor(max_workers=min(16, len(new))) as pool:
+                    for entry in pool.map(self._get_json, new):
+                        if entry:
+                            self._index_entry(entry)
+                self._log_tail += len(new)
+            if keys:
+                self._log_cursor = max(keys[-1], self._log_cursor or "")
+            if not page.get("IsTruncated"):
+                break
+            args["ContinuationToken"] = page["NextContinuationToken"]
+
+    def refresh(self):
+        """Load the snapshot on first use, then pick up log entries written since."""
+        if not self._loaded:
+            snap = self._get_json(f"{self.prefix}index.json") or {}
+            for entry in snap.get("entries", []):
+                self._index_entry(entry)
+            self._log_cursor = snap.get("cursor")
+            self._loaded = True
+        self._load_log_tail()
+        if self._log_tail >= COMPACT_EVERY:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrite the snapshot with everything indexed so far. Racing writers are
+        harmless: each snapshot is complete up to its own cursor and readers
+        always replay the log after it.
+        """
+        entries = [e for idx in self._indexes.values() for e in idx.entries]
+        self._put_json(f"{self.prefix}index.json", {"cursor": self._log_cursor, "entries": entries})
+        self._log_tail = 0
+
+    def nearest(self, topic: str, params: str):
+        """(score, entry) of the closest cached topic generated with the same params."""
+        self.refresh()
+        index = self._indexes.get(params)
+        return index.nearest(topic) if index else (0.0, None)
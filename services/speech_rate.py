@@ -0,0 +1,169 @@
+"""
+Spoken-duration estimates for scripts, calibrated per voice from real TTS output.
+
+A narration's length is modelled as
+
+    seconds = s_word * spoken_words + s_sentence * sentence_breaks + s_clause * clause_breaks
+
+where ``spoken_words`` counts numbers by how they are read out ("2024" is
+two words, "3.5%" three), and the break counts are pauses TTS inserts at
+sentence ends (. ! ?) and clause marks (, ; : and dashes). Estimating a
+script is a few regex passes, so script_handler can score every candidate
+before choosing one.
+
+The coefficients are a ridge least-squares fit per voice, kept as running
+sums in s3://MEDIA_BUCKET/config/speech-rate.json:
+
+    {"voices": {"polly/Matthew": {"n": 12.4, "xtx": [[...], ...], "xty": [...]}}, "updatedAt": ...}
+
+tts_handler adds one observation (script features, narration seconds) per
+voice after every narration (``observe``); older observations decay by
+DECAY each time so a voice follows engine changes. The ridge prior pulls
+towards DEFAULT with the weight of PRIOR_WEIGHT typical narrations, so an
+unseen voice estimates with DEFAULT and a voice with a handful of
+observations does not swing wildly.
+"""
+import json
+import math
+import re
+import time
+
+from botocore.exceptions import ClientError
+
+MODEL_KEY = "config/speech-rate.json"
+# Seconds per spoken word / sentence break / clause break for Polly neural
+# narration at its default rate (~150 words per minute overall).
+DEFAULT = (0.36, 0.30, 0.12)
+TYPICAL = (450.0, 30.0, 35.0)   # features of a ~3 minute script, to scale the prior
+PRIOR_WEIGHT = 2.0
+DECAY = 0.98
+MAX_ATTEMPTS = 5
+_CONFLICT = ("PreconditionFailed", "ConditionalRequestConflict")
+_MISSING = ("NoSuchKey", "404", "NotFound")
+
+_TOKEN = re.compile(r"\S+")
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+_SENTENCE = re.compile(r"[.!?]+(?=\s|$)")
+_CLAUSE = re.compile(r"[,;:](?=\s)|\s[-–—]\s|—")
+
+
+# -------- Features and estimates --------
+
+def _number_words(token: str) -> int:
+    """Roughly how many words a numeric token is read as."""
+    words = 0
+    for m in _NUMBER.finditer(token):
+        whole, _, frac = m.group(0).replace(",", "").partition(".")
+        if len(whole) == 4 and not frac:
+            words += 2                                   # years: "twenty twenty-four"
+        else:
+            words += max(1, math.ceil(len(whole) / 2)) + len(frac) + (1 if frac else 0)
+    return words + token.count("%") + token.count("$")
+
+
+def features(text: str):
+    """(spoken_words, sentence_breaks, clause_breaks) for a script."""
+    words = 0
+    for token in _TOKEN.findall(text):
+        words += _number_words(token) if any(c.isdigit() for c in token) else 1
+    return (float(words), float(max(1, len(_SENTENCE.findall(text)))), float(len(_CLAUSE.findall(text))))
+
+
+def estimate(text: str, coef=DEFAULT) -> float:
+    return sum(c * x for c, x in zip(coef, features(text)))
+
+
+def words_for(seconds: float, coef=DEFAULT) -> int:
+    """Words that fill ``seconds`` at the voice's rate, with pauses as in a typical script."""
+    per_word = coef[0] + (coef[1] * TYPICAL[1] + coef[2] * TYPICAL[2]) / TYPICAL[0]
+    return int(round(seconds / per_word))
+
+
+# -------- Calibration --------
+
+def _solve(a, b):
+    """Gaussian elimination with partial pivoting for a small dense system."""
+    n = len(b)
+    m = [list(row) + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        if abs(m[pivot][col]) < 1e-12:
+            return None
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(col + 1, n):
+            f = m[r][col] / m[col][col]
+            for c in range(col, n + 1):
+                m[r][c] -= f * m[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+
+def coefficients(model: dict, voice: str):
+    """
+    Fitted (s_word, s_sentence, s_clause) for ``voice`` ("<provider>/<voice>");
+    the same voice name on another provider if this one was never observed,
+    else DEFAULT.
+    """
+    voices = (model or {}).get("voices", {})
+    stats = voices.get(voice)
+    if stats is None:
+        name = voice.rsplit("/", 1)[-1]
+        stats = next((v for k, v in sorted(voices.items()) if k.rsplit("/", 1)[-1] == name), None)
+    if not stats:
+        return DEFAULT
+    lam = [PRIOR_WEIGHT * t * t for t in TYPICAL]
+    a = [[stats["xtx"][i][j] + (lam[i] if i == j else 0.0) for j in range(3)] for i in range(3)]
+    b = [stats["xty"][i] + lam[i] * DEFAULT[i] for i in range(3)]
+    coef = _solve(a, b)
+    if coef is None:
+        return DEFAULT
+    # Negative pause costs only come from collinear data; keep the estimate sane.
+    return tuple(max(0.0, round(c, 5)) for c in coef)
+
+
+def add_observation(model: dict, voice: str, text: str, seconds: float) -> dict:
+    """Fold one (script, narration seconds) pair into ``model`` in place."""
+    x = features(text)
+    stats = model.setdefault("voices", {}).setdefault(
+        voice, {"n": 0.0, "xtx": [[0.0] * 3 for _ in range(3)], "xty": [0.0] * 3})
+    stats["n"] = stats["n"] * DECAY + 1.0
+    for i in range(3):
+        stats["xty"][i] = stats["xty"][i] * DECAY + x[i] * seconds
+        for j in range(3):
+            stats["xtx"][i][j] = stats["xtx"][i][j] * DECAY + x[i] * x[j]
+    return model
+
+
+def load(s3, bucket: str):
+    """(model, etag); an empty model and None when nothing has been observed yet."""
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=MODEL_KEY)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in _MISSING:
+            return {"voices": {}}, None
+        raise
+    return json.loads(obj["Body"].read().decode("utf-8")), obj["ETag"]
+
+
+def observe(s3, bucket: str, observations) -> dict:
+    """
+    Add [(voice, script text, seconds), ...] to the stored model with a
+    conditional read-modify-write (concurrent TTS runs retry on conflict).
+    Returns the model as written.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        model, etag = load(s3, bucket)
+        for voice, text, seconds in observations:
+            add_observation(model, voice, text, seconds)
+        model["updatedAt"] = int(time.time() * 1000)
+        cond = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            s3.put_object(Bucket=bucket, Key=MODEL_KEY, Body=json.dumps(model).encode("utf-8"),
+                          ContentType="application/json", CacheControl="no-cache", **cond)
+            return model
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in _CONFLICT:
+                raise
+    raise RuntimeError(f"Could not update {MODEL_KEY} after {MAX_ATTEMPTS} attempts")
@@ -0,0 +1,199 @@
+"""
+TTS providers behind one interface, plus the latency bookkeeping tts_handler
+uses to route narrations and hedge slow chunks.
+
+Every provider returns raw 16-bit signed little-endian mono PCM at the
+requested sample rate, so chunks can be concatenated into one WAV whichever
+provider produced them:
+
+    polly       synthesize_speech(OutputFormat="pcm")               8000 / 16000 Hz
+    elevenlabs  POST /v1/text-to-speech/<voiceId>?output_format=pcm_<rate>
+                                                                    16000 / 22050 / 24000 / 44100 Hz
+
+Voices are named the Polly way ("Matthew"). ElevenLabs needs a voice id:
+``voices`` maps names to ids, and a bare 20-character id is used as is.
+
+Hedging: every finished request records its latency per provider,
+normalised per 1000 characters (chunks shorter than NORM_CHARS count as
+NORM_CHARS, since short requests are dominated by fixed overhead). Once a
+provider has ``min_samples``, a chunk still running after that provider's
+p95 (scaled to the chunk) gets one backup request to the same provider and
+voice, and whichever returns first wins. Backups never switch provider:
+a narration that changes voice mid-sentence is worse than a slow one.
+Routing happens per narration instead (``pick``).
+
+Stats live in the warm container; until a provider has enough samples the
+caller's cold deadline applies. The warm-up is short (a narration is only a
+few chunks, so a low-volume container would otherwise sit on the cold
+deadline): with a handful of samples the p95 is simply the slowest one seen,
+a conservative deadline that tightens as the window fills.
+"""
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+NORM_CHARS = 500
+_ELEVEN_ID = re.compile(r"^[A-Za-z0-9]{20}$")
+
+
+# -------- Providers --------
+
+class PollyProvider:
+    name = "polly"
+    rates = ("8000", "16000")
+
+    def __init__(self, client):
+        self.client = client
+
+    def speaks(self, voice: str) -> bool:
+        return not _ELEVEN_ID.match(voice)
+
+    def synthesize(self, text: str, voice: str, sample_rate: str, engine: str = "neural") -> bytes:
+        resp = self.client.synthesize_speech(Text=text, VoiceId=voice, Engine=engine or "neural",
+                                             OutputFormat="pcm", SampleRate=sample_rate)
+        audio_stream = resp.get("AudioStream")
+        return audio_stream.read() if audio_stream else b""
+
+
+class ElevenLabsProvider:
+    name = "elevenlabs"
+    rates = ("16000", "22050", "24000", "44100")
+
+    def __init__(self, api_key, voices: dict = None, model_id: str = "eleven_multilingual_v2",
+                 base_url: str = "https://api.elevenlabs.io", timeout: float = 30.0):
+        """``api_key`` is the key or a zero-argument callable returning it (fetched on first use)."""
+        self._api_key = api_key
+        self.voices = dict(voices or {})
+        self.model_id = model_id
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def voice_id(self, voice: str):
+        if voice in self.voices:
+            return self.voices[voice]
+        return voice if _ELEVEN_ID.match(voice) else None
+
+    def speaks(self, voice: str) -> bool:
+        return self.voice_id(voice) is not None
+
+    def synthesize(self, text: str, voice: str, sample_rate: str, engine: str = None) -> bytes:
+        voice_id = self.voice_id(voice)
+        if voice_id is None:
+            raise ValueError(f"No ElevenLabs voice id for '{voice}' (set ELEVENLABS_VOICES)")
+        if callable(self._api_key):
+            self._api_key = self._api_key()
+        req = urllib.request.Request(
+            f"{self.base_url}/v1/text-to-speech/{voice_id}?output_format=pcm_{sample_rate}",
+            data=json.dumps({"text": text, "model_id": self.model_id}).encode("utf-8"),
+            headers={"xi-api-key": self._api_key, "Content-Type": "application/json", "Accept": "audio/pcm"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.read()
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"ElevenLabs HTTP {e.code}: {e.read()[:200].decode('utf-8', 'replace')}")
+        except OSError as e:  # URLError, connection reset, socket timeout
+            raise RuntimeError(f"ElevenLabs request failed: {e}")
+
+
+# -------- Latency stats --------
+
+class LatencyStats:
+    """Sliding window of per-provider latencies (seconds per 1000 characters)."""
+
+    def __init__(self, window: int = 200, min_samples: int = 5):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, seconds: float, chars: int):
+        with self._lock:
+            q = self._samples.setdefault(provider, deque(maxlen=self.window))
+            q.append(seconds * 1000.0 / max(chars, NORM_CHARS))
+
+    def quantile(self, provider: str, q: float):
+        """None until ``min_samples`` have been recorded."""
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def deadline(self, provider: str, chars: int, cold: float = None):
+        """Seconds to wait for ``chars`` before hedging; ``cold`` while samples are short."""
+        p95 = self.quantile(provider, 0.95)
+        if p95 is None:
+            return cold
+        return p95 * max(chars, NORM_CHARS) / 1000.0
+
+    def summary(self) -> dict:
+        with self._lock:
+            names = list(self._samples)
+        out = {}
+        for name in names:
+            with self._lock:
+                n = len(self._samples[name])
+            out[name] = {"n": n, "p50": self.quantile(name, 0.5), "p95": self.quantile(name, 0.95)}
+        return out
+
+
+# -------- Routing and hedging --------
+
+def pick(providers, voice: str, sample_rate: str, stats: LatencyStats, preferred=None):
+    """
+    Provider for a whole narration: ``preferred`` (a name) if given, else the
+    capable provider with the lowest p95; providers without enough samples
+    rank after measured ones, in the order given.
+    """
+    capable = [p for p in providers if p.speaks(voice) and sample_rate in p.rates]
+    if preferred:
+        for p in capable:
+            if p.name == preferred:
+                return p
+        raise ValueError(f"TTS provider '{preferred}' cannot speak '{voice}' at {sample_rate} Hz")
+    if not capable:
+        raise ValueError(f"No TTS provider can speak '{voice}' at {sample_rate} Hz")
+    ranked = sorted(enumerate(capable), key=lambda ip: (stats.quantile(ip[1].name, 0.95) is None,
+                                                        stats.quantile(ip[1].name, 0.95) or 0.0, ip[0]))
+    return ranked[0][1]
+
+
+_pool = ThreadPoolExecutor(max_workers=16)
+
+
+def synthesize(provider, text: str, voice: str, sample_rate: str, stats: LatencyStats,
+               engine: str = None, hedge: bool = True, cold: float = None):
+    """
+    One chunk as PCM, with at most one backup request past the deadline.
+    Returns (pcm, hedged). A losing request is left to finish in the
+    background; its latency still feeds the stats.
+    """
+    def attempt():
+        t0 = time.perf_counter()
+        pcm = provider.synthesize(text, voice, sample_rate, engine)
+        stats.record(provider.name, time.perf_counter() - t0, len(text))
+        return pcm
+
+    first = _pool.submit(attempt)
+    deadline = stats.deadline(provider.name, len(text), cold) if hedge else None
+    if deadline is None:
+        return first.result(), False
+    done, _ = wait([first], timeout=deadline)
+    if done:
+        return first.result(), False
+
+    backup = _pool.submit(attempt)
+    done, _ = wait([first, backup], return_when=FIRST_COMPLETED)
+    for f in done:
+        if f.exception() is None:
+            return f.result(), True
+    # The first to finish failed; the other one decides.
+    other = backup if first in done else first
+    return other.result(), True
@@ -0,0 +1,10 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# services/ modules import each other as top-level modules, as in the Lambda bundle.
+for path in (ROOT, os.path.join(ROOT, "services")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import threading
+
+import pytest
+
+import broll_pexels
+from harness import stubs
+
+MIB = 1024 * 1024
+PART = 5 * MIB
+
+
+class _Response:
+    def __init__(self, status, headers=None, data=b""):
+        self.status, self.headers, self.data = status, headers or {}, data
+        self.released = self.closed = False
+
+    def read(self, amt=None):
+        if amt is None:
+            out, self.data = self.data, b""
+        else:
+            out, self.data = self.data[:amt], self.data[amt:]
+        return out
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        self.released = True
+
+
+class FakeHTTP:
+    """urllib3 pool stand-in serving byte ranges of ``files``; ``short`` caps each 206 body."""
+
+    def __init__(self, files=None, videos=None, ranges=True, short=None):
+        self.files, self.videos = files or {}, videos or {}
+        self.ranges, self.short = ranges, short
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, headers=None, preload_content=True):
+        with self._lock:
+            self.requests.append((method, url, dict(headers or {})))
+        if "/videos/search" in url:
+            query = url.split("query=", 1)[1].split("&", 1)[0]
+            return _Response(200, data=json.dumps({"videos": self.videos.get(query, [])}).encode())
+        data = self.files[url]
+        if not self.ranges:
+            return _Response(200, {"Content-Length": str(len(data))}, data)
+        a, b = headers["Range"][len("bytes="):].split("-")
+        a, b = int(a), min(int(b), len(data) - 1)
+        if self.short:
+            b = min(b, a + self.short - 1)
+        return _Response(206, {"Content-Range": f"bytes {a}-{b}/{len(data)}"}, data[a:b + 1])
+
+
+def _video(vid, link, duration=12, heights=(360, 720, 2160)):
+    return {"id": vid, "duration": duration,
+            "video_files": [{"id": vid * 10 + i, "file_type": "video/mp4", "height": h, "width": h * 16 // 9,
+                             "link": f"{link}-{h}"} for i, h in enumerate(heights)]}
+
+
+def _bytes(n, seed=0):
+    return hashlib.sha256(str(seed).encode()).digest() * (n // 32) + b"x" * (n % 32)
+
+
+def test_pick_file_prefers_smallest_rendition_tall_enough():
+    video = _video(1, "https://cdn/1")
+    assert broll_pexels.pick_file(video, 720)["height"] == 720
+    assert broll_pexels.pick_file(video, 4000)["height"] == 2160
+    assert broll_pexels.pick_file({"video_files": [{"file_type": "video/webm", "link": "x", "height": 720}]}) is None
+
+
+@pytest.mark.parametrize("ranges,short", [(True, None), (True, 2 * MIB), (False, None)])
+def test_fetch_streams_full_size_parts(ranges, short):
+    data = _bytes(12 * MIB + 123)
+    link = "https://cdn/7-720"
+    http = FakeHTTP({link: data}, ranges=ranges, short=short)
+    s3 = stubs.FakeS3()
+    video, rendition = {"id": 7, "duration": 9}, {"id": 70, "link": link, "width": 1280, "height": 720}
+
+    clip = broll_pexels.fetch(http, s3, "media", video, rendition, part_size=PART)
+    assert clip["dedup"] is None and clip["bytes"] == len(data) == clip["fetched"]
+    assert clip["sha256"] == hashlib.sha256(data).hexdigest()
+    assert s3.get_object(Bucket="media", Key=clip["s3_key"])["Body"].read() == data
+    pointer = json.loads(s3.get_object(Bucket="media", Key=f"broll/sha256/{clip['sha256']}.json")["Body"].read())
+    assert pointer["key"] == clip["s3_key"]
+    assert not s3.uploads
+
+
+def test_fetch_rejects_oversized_files_and_aborts_the_upload():
+    link = "https://cdn/8-720"
+    http = FakeHTTP({link: _bytes(3 * MIB)})
+    s3 = stubs.FakeS3()
+    with pytest.raises(ValueError):
+        broll_pexels.fetch(http, s3, "media", {"id": 8}, {"id": 80, "link": link}, part_size=PART, max_bytes=MIB)
+    assert not s3.uploads
+    assert ("media", "broll/pexels/8-80.mp4") not in s3.objects
+
+
+def test_fetch_skips_stored_source_and_dedups_same_bytes():
+    data = _bytes(6 * MIB, seed=1)
+    http = FakeHTTP({"https://cdn/a": data, "https://cdn/b": data})
+    s3 = stubs.FakeS3()
+    first = broll_pexels.fetch(http, s3, "media", {"id": 1}, {"id": 10, "link": "https://cdn/a"}, part_size=PART)
+
+    # Same source again: a HEAD, no download.
+    n = len(http.requests)
+    again = broll_pexels.fetch(http, s3, "media", {"id": 1}, {"id": 10, "link": "https://cdn/a"}, part_size=PART)
+    assert again["dedup"] == "source" and again["fetched"] == 0 and len(http.requests) == n
+
+    # Other source with the same bytes: points at the first copy, stores nothing new.
+    other = broll_pexels.fetch(http, s3, "media", {"id": 2}, {"id": 20, "link": "https://cdn/b"}, part_size=PART)
+    assert other["dedup"] == "content" and other["s3_key"] == first["s3_key"]
+    assert ("media", "broll/pexels/2-20.mp4") not in s3.objects
+    assert not s3.uploads
+
+
+def test_acquire_replaces_failed_and_duplicate_candidates(monkeypatch):
+    same = _bytes(PART + 10, seed=2)
+    videos = [_video(1, "https://cdn/1"), _video(2, "https://cdn/2"), _video(3, "https://cdn/3"),
+              _video(4, "https://cdn/4")]
+    files = {"https://cdn/1-720": same, "https://cdn/2-720": same,  # 2 duplicates 1's bytes
+             "https://cdn/4-720": _bytes(PART + 20, seed=4)}       # 3 fails (below)
+    http = FakeHTTP(files, videos={"coins": videos[:2], "city": videos[2:]})
+    client = broll_pexels.PexelsClient(lambda: "key", http, base_url="https://api")
+    s3 = stubs.FakeS3()
+    logged = []
+
+    original = broll_pexels.fetch
+
+    def fetch(http_, s3_, bucket, video, rendition, *args):
+        if video["id"] == 3:
+            raise RuntimeError("HTTP 404")
+        return original(http_, s3_, bucket, video, rendition, *args)
+
+    monkeypatch.setattr(broll_pexels, "fetch", fetch)
+    clips = broll_pexels.acquire(client, s3, "media", ["coins", "city"], count=2, workers=1, part_size=PART,
+                                 log=logged.append)
+    assert [c["pexelsId"] for c in clips] == [1, 4]
+    assert len({c["s3_key"] for c in clips}) == 2
+    assert any("pexels video 3" in line for line in logged)
+    searches = [h for m, u, h in http.requests if "/videos/search" in u]
+    assert searches and all(h["Authorization"] == "key" for h in searches)
@@ -0,0 +1,81 @@
+import math
+from array import array
+
+import captions
+
+RATE = 16000
+
+
+def _tone(seconds: float) -> array:
+    n = int(seconds * RATE)
+    return array("h", (int(8000 * math.sin(2 * math.pi * 220 * i / RATE)) for i in range(n)))
+
+
+def _silence(seconds: float) -> array:
+    return array("h", bytes(2 * int(seconds * RATE)))
+
+
+def _pcm(*parts) -> bytes:
+    out = array("h")
+    for p in parts:
+        out.extend(p)
+    return out.tobytes()
+
+
+def test_segments_split_long_sentences_within_two_lines():
+    text = ("Short one. " + "This sentence keeps going with clause after clause, well past the limit, "
+            "so it has to be split into cues that each fit on two lines of subtitles.")
+    parts = captions.segments(text)
+    assert parts[0] == "Short one."
+    assert len(parts) > 2
+    assert all(len(p) <= captions.MAX_LINE * captions.MAX_LINES for p in parts)
+    assert " ".join(parts).split() == text.split()
+
+
+def test_wrap_splits_near_the_middle():
+    assert captions.wrap("fits on one line") == ["fits on one line"]
+    lines = captions.wrap("a fairly long cue text that needs two lines to show")
+    assert len(lines) == 2 and abs(len(lines[0]) - len(lines[1])) <= 6
+
+
+def test_silences_finds_gaps_but_not_short_dips():
+    pcm = _pcm(_tone(0.5), _silence(0.3), _tone(0.5), _silence(0.05), _tone(0.5))
+    gaps = captions.silences(pcm, RATE)
+    assert len(gaps) == 1
+    start, end = gaps[0]
+    assert abs(start - 0.5) < 0.02 and abs(end - 0.8) < 0.02
+
+
+def test_align_places_boundaries_on_pauses_and_offsets_chunks():
+    # The estimate puts the sentence break near the middle, a little before the only real pause.
+    first = _pcm(_tone(1.6), _silence(0.4), _tone(1.0))
+    second = _pcm(_tone(1.5))
+    chunks = ["The first sentence is here. And the second one is here.", "Another chunk."]
+    cues = captions.align(chunks, [first, second], RATE)
+    assert [c[2] for c in cues] == ["The first sentence is here.", "And the second one is here.",
+                                    "Another chunk."]
+    assert 1.6 <= cues[0][1] <= 2.0
+    assert cues[0][1] == cues[1][0]
+    # Cues of the second chunk start where the first chunk's audio ends.
+    assert abs(cues[2][0] - 3.0) < 1e-6 and abs(cues[2][1] - 4.5) < 1e-6
+
+
+def test_align_without_pauses_falls_back_to_the_estimate():
+    cues = captions.align(["One. Two."], [_pcm(_tone(2.0))], RATE)
+    assert len(cues) == 2
+    assert cues[0][0] == 0.0 and abs(cues[-1][1] - 2.0) < 1e-6
+    assert 0.0 < cues[0][1] < 2.0
+
+
+def test_align_skips_empty_chunks_but_keeps_their_time():
+    cues = captions.align(["", "Only cue."], [_pcm(_silence(0.5)), _pcm(_tone(1.0))], RATE)
+    assert cues == [(0.5, 1.5, "Only cue.")]
+
+
+def test_srt_and_webvtt_formats():
+    cues = [(0.0, 1.25, "Hello."), (3661.5, 3662.0, "A cue long enough that it is wrapped over two lines.")]
+    srt = captions.srt(cues)
+    assert srt.startswith("1\n00:00:00,000 --> 00:00:01,250\nHello.\n\n2\n01:01:01,500 --> 01:01:02,000\n")
+    assert srt.count("\n") == 8
+    vtt = captions.webvtt(cues)
+    assert vtt.startswith("WEBVTT\n\n00:00:00.000 --> 00:00:01.250\nHello.")
@@ -0,0 +1,98 @@
+import job_state
+from harness import stubs
+
+
+def _table():
+    return stubs.FakeTable(indexes={job_state.STATUS_INDEX: ("inflightStatus", "updatedAt")})
+
+
+def _status(table, job_id="j1"):
+    return table.items[job_id].get("status")
+
+
+def test_stage_runs_and_finishes():
+    table = _table()
+    t0 = job_state.begin(table, "j1", "script")
+    assert _status(table) == "SCRIPT_RUNNING"
+    assert job_state.complete(table, "j1", "script", t0, scriptKey="jobs/j1/script.txt")
+    assert _status(table) == "SCRIPT_DONE"
+    assert table.items["j1"]["scriptKey"] == "jobs/j1/script.txt"
+    # A retried completion is rejected by the stage's own guard.
+    assert not job_state.complete(table, "j1", "script", t0, scriptKey="other")
+    assert table.items["j1"]["scriptKey"] == "jobs/j1/script.txt"
+
+
+def test_parallel_stage_does_not_overwrite_running_status():
+    table = _table()
+    job_state.begin(table, "j1", "tts")
+    b0 = job_state.begin(table, "j1", "broll")
+    assert _status(table) == "TTS_RUNNING"
+    assert "brollStartedAt" in table.items["j1"]
+    job_state.complete(table, "j1", "broll", b0, edlKey="jobs/j1/edl.json")
+    assert _status(table) == "TTS_RUNNING"
+    assert table.items["j1"]["edlKey"] == "jobs/j1/edl.json"
+    assert [r["jobId"] for r in job_state.jobs_in_status(table, "TTS_RUNNING")] == ["j1"]
+
+
+def test_late_parallel_stage_keeps_failure_in_index():
+    table = _table()
+    job_state.begin(table, "j1", "tts")
+    b0 = job_state.begin(table, "j1", "broll")
+    job_state.fail(table, "j1", "tts", "Polly throttled")
+    assert job_state.complete(table, "j1", "broll", b0, edlKey="jobs/j1/edl.json")
+    assert _status(table) == "TTS_FAILED"
+    assert table.items["j1"]["error"] == "Polly throttled"
+    assert "brollFinishedAt" in table.items["j1"]
+    assert [r["jobId"] for r in job_state.jobs_in_status(table, "TTS_FAILED")] == ["j1"]
+    assert job_state.status_counts(table) == {"TTS_FAILED": 1}
+
+
+def test_second_failure_does_not_replace_first():
+    table = _table()
+    job_state.begin(table, "j1", "tts")
+    job_state.begin(table, "j1", "broll")
+    job_state.fail(table, "j1", "broll", "Pexels down")
+    job_state.fail(table, "j1", "tts", "Polly down")
+    assert _status(table) == "BROLL_FAILED"
+    assert table.items["j1"]["error"] == "Pexels down"
+    assert table.items["j1"]["ttsError"] == "Polly down"
+
+
+def test_failure_replaces_other_stage_running():
+    table = _table()
+    job_state.begin(table, "j1", "tts")
+    job_state.begin(table, "j1", "broll")
+    job_state.fail(table, "j1", "broll", "Pexels down")
+    assert _status(table) == "BROLL_FAILED"
+
+
+def test_retry_replaces_own_failure():
+    table = _table()
+    job_state.begin(table, "j1", "tts")
+    job_state.fail(table, "j1", "tts", "timeout")
+    t1 = job_state.begin(table, "j1", "tts")
+    assert _status(table) == "TTS_RUNNING"
+    job_state.complete(table, "j1", "tts", t1)
+    assert _status(table) == "TTS_DONE"
+    assert job_state.jobs_in_status(table, "TTS_FAILED") == []
+
+
+def test_final_stage_leaves_index():
+    table = _table()
+    t0 = job_state.begin(table, "j1", "upload")
+    job_state.complete(table, "j1", "upload", t0, videoId="abc")
+    assert "inflightStatus" not in table.items["j1"]
+    assert job_state.status_counts(table) == {}
+
+
+def test_apply_many_replays_rejected_items_with_fallback():
+    table = _table()
+    job_state.begin(table, "a", "tts")
+    job_state.fail(table, "a", "tts", "boom")
+    job_state.begin(table, "b", "broll")
+    applied = job_state.apply_many(table, [job_state.complete_update("a", "broll"),
+                                           job_state.complete_update("b", "broll")])
+    assert applied == 2
+    assert _status(table, "a") == "TTS_FAILED"
+    assert "brollFinishedAt" in table.items["a"]
+    assert _status(table, "b") == "BROLL_DONE"
@@ -0,0 +1,68 @@
+import os
+import random
+import threading
+
+import pytest
+
+from harness import stubs
+from harness.replay import _load
+
+
+@pytest.fixture
+def render(monkeypatch, tmp_path):
+    mod = _load("test_render", "renderer/render.py")
+    s3 = stubs.FakeS3()
+    monkeypatch.setattr(mod, "s3", s3)
+    monkeypatch.setattr(mod, "log", lambda msg: None)
+    monkeypatch.setattr(mod, "ASSET_CACHE_DIR", str(tmp_path / "cache"))
+    os.makedirs(mod.ASSET_CACHE_DIR)
+    return mod
+
+
+def _cached(render):
+    return [n for n in os.listdir(render.ASSET_CACHE_DIR) if not n.endswith(".part")]
+
+
+def test_cache_hit_and_new_etag(render, tmp_path):
+    render.s3.put_object(Bucket="b", Key="broll/a.mp4", Body=b"one")
+    render.fetch_asset("b", "broll/a.mp4", str(tmp_path / "out" / "1.mp4"))
+    reads = render.s3.calls["get_object"] + render.s3.calls["download_file"]
+    render.fetch_asset("b", "broll/a.mp4", str(tmp_path / "out" / "2.mp4"))
+    assert render.s3.calls["get_object"] + render.s3.calls["download_file"] == reads
+    assert (tmp_path / "out" / "2.mp4").read_bytes() == b"one"
+
+    # A rewritten object has a new ETag: a new entry, not the stale bytes.
+    render.s3.put_object(Bucket="b", Key="broll/a.mp4", Body=b"two")
+    render.fetch_asset("b", "broll/a.mp4", str(tmp_path / "out" / "3.mp4"))
+    assert (tmp_path / "out" / "3.mp4").read_bytes() == b"two"
+    assert len(_cached(render)) == 2
+
+
+def test_eviction_under_concurrent_jobs(render, monkeypatch, tmp_path):
+    monkeypatch.setattr(render, "ASSET_CACHE_MAX_BYTES", 3500)
+    bodies = {f"c{i}.mp4": bytes([i]) * 1000 for i in range(10)}
+    for key, body in bodies.items():
+        render.s3.put_object(Bucket="b", Key=key, Body=body)
+    errors = []
+
+    def job(t):
+        rng = random.Random(t)
+        for n in range(60):
+            key = f"c{rng.randrange(10)}.mp4"
+            dst = tmp_path / "out" / f"{t}-{n}.mp4"
+            try:
+                render.fetch_asset("b", key, str(dst))
+                assert dst.read_bytes() == bodies[key]
+            except Exception as e:  # surfaced below with the failing thread's context
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=job, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    # Entries held by another job at eviction time may be kept, at most one per thread.
+    assert sum(os.path.getsize(os.path.join(render.ASSET_CACHE_DIR, n)) for n in _cached(render)) <= 3500 + 8 * 1000
+    # Locks are pruned with their entries instead of growing with every key ever seen.
+    assert len(render._cache_locks) == len(_cached(render))
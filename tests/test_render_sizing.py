@@ -0,0 +1,70 @@
+import json
+
+import render_sizing
+from harness import stubs
+
+MODEL = {"alpha": 1.0, "base_s": 10.0, "per_clip_s": 2.0, "mux_k": 0.5,
+         "k": {"main": 2.0, "main+preview": 3.0}, "rss_mib": {"main": 600, "main+preview": 2000}}
+
+
+def test_predict_adds_clips_variants_and_scales_with_cores():
+    assert render_sizing.predict(MODEL, 100, 1, "main", 1) == 10 + 2 + 200
+    assert render_sizing.predict(MODEL, 100, 1, "main", 2) == 10 + 2 + 100
+    assert render_sizing.predict(MODEL, 100, 3, "main", 1, variants=3) == 10 + 6 + (2.0 + 1.0) * 100
+    # An unmeasured profile costs as much as the dearest measured one.
+    assert render_sizing.predict(MODEL, 100, 1, "main+vertical", 1) == render_sizing.predict(MODEL, 100, 1,
+                                                                                             "main+preview", 1)
+
+
+def test_choose_cheapest_in_time_else_fastest():
+    # Linear scaling: every size costs about the same, so the smallest that meets the target wins.
+    assert render_sizing.choose(MODEL, 100, 1, "main", target_s=600)["size"] == "small"
+    assert render_sizing.choose(MODEL, 400, 1, "main", target_s=600)["size"] == "medium"
+    late = render_sizing.choose(MODEL, 5000, 1, "main", target_s=600)
+    assert late["size"] == "large" and late["predictedSec"] > 600
+
+
+def test_choose_skips_sizes_without_memory_headroom():
+    # 2000 MiB * 1.5 + 512 needs more than small's 2048 MiB.
+    assert render_sizing.choose(MODEL, 10, 1, "main+preview")["size"] == "medium"
+    hungry = dict(MODEL, rss_mib={"main": 10000})
+    assert render_sizing.choose(hungry, 10, 1, "main") == {"size": "large", "vcpu": 4, "memoryMiB": 8192,
+                                                           "predictedSec": None, "costUsd": None}
+
+
+def test_fit_recovers_the_generating_model():
+    truth = {"alpha": 0.8, "base_s": 4.0, "per_clip_s": 1.5, "k": {"main": 1.2, "main+preview": 1.8}, "mux_k": 0.3}
+    samples = []
+    for profile, k in truth["k"].items():
+        for cores in (1, 2, 4):
+            for out_s, clips in ((30, 1), (60, 2), (120, 4)):
+                encode = k * out_s / cores ** truth["alpha"]
+                samples.append({"profile": profile, "cores": cores, "outputSec": out_s, "encodeSec": encode,
+                                "wallSec": encode + truth["base_s"] + truth["per_clip_s"] * clips,
+                                "clips": clips, "variants": 1, "rssMiB": 500})
+    encode = (1.2 + 0.3 * 2) * 60 / 2 ** 0.8
+    samples.append({"profile": "main", "cores": 2, "outputSec": 60, "encodeSec": encode, "clips": 1, "variants": 3})
+
+    model = render_sizing.fit(samples)
+    assert abs(model["alpha"] - 0.8) < 0.01
+    assert abs(model["k"]["main"] - 1.2) < 0.01 and abs(model["k"]["main+preview"] - 1.8) < 0.01
+    assert abs(model["mux_k"] - 0.3) < 0.01
+    assert abs(model["per_clip_s"] - 1.5) < 0.01 and abs(model["base_s"] - 4.0) < 0.01
+    assert model["rss_mib"] == {"main": 500, "main+preview": 500} and model["samples"] == len(samples)
+
+
+def test_fit_keeps_base_parameters_it_cannot_determine():
+    base = {"alpha": 0.7, "base_s": 3.0, "per_clip_s": 1.0, "mux_k": 0.2, "k": {"main": 1.0}, "rss_mib": {}}
+    samples = [{"profile": "main+preview", "cores": 2, "outputSec": 60, "encodeSec": 60 * 1.5 / 2 ** 0.7}]
+    model = render_sizing.fit(samples, base)
+    assert model["alpha"] == 0.7 and model["per_clip_s"] == 1.0 and model["mux_k"] == 0.2
+    assert abs(model["k"]["main+preview"] - 1.5) < 0.01
+    assert base["k"] == {"main": 1.0}  # the base model is not modified
+
+
+def test_load_model_prefers_the_bucket_override():
+    s3 = stubs.FakeS3()
+    packaged = render_sizing.load_model(s3, "media")
+    assert "k" in packaged
+    s3.put_object(Bucket="media", Key=render_sizing.MODEL_KEY, Body=json.dumps(MODEL).encode())
+    assert render_sizing.load_model(s3, "media") == MODEL
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from harness import stubs
+from harness.replay import _load
+
+
+@pytest.fixture
+def render(monkeypatch):
+    mod = _load("test_render_worker", "renderer/render.py")
+    monkeypatch.setattr(mod, "log", lambda msg: None)
+    return mod
+
+
+@pytest.mark.parametrize("body", ["not json", json.dumps({"jobId": "j1"}), json.dumps(["j1"]), "null"])
+def test_unreadable_message_is_deleted_and_dropped(render, monkeypatch, body):
+    def render_job(job_id, bucket):
+        raise AssertionError("rendered an unreadable message")
+
+    monkeypatch.setattr(render, "render_job", render_job)
+    sqs, sfn = stubs.FakeSQS(), stubs.FakeStepFunctions()
+    sqs.send_message(QueueUrl="q", MessageBody=body)
+    msg = sqs.receive_message(QueueUrl="q")["Messages"][0]
+    render.handle_message(msg, "media", "q", sqs, sfn)
+    assert sqs.deleted == [msg["ReceiptHandle"]] and sfn.results == {}
+
+
+def test_failed_render_is_reported_and_deleted(render, monkeypatch):
+    def render_job(job_id, bucket):
+        raise RuntimeError("ffmpeg exited 1")
+
+    monkeypatch.setattr(render, "render_job", render_job)
+    sqs, sfn = stubs.FakeSQS(), stubs.FakeStepFunctions()
+    sqs.send_message(QueueUrl="q", MessageBody=json.dumps({"jobId": "j1", "taskToken": "tok"}))
+    msg = sqs.receive_message(QueueUrl="q")["Messages"][0]
+    render.handle_message(msg, "media", "q", sqs, sfn)
+    assert sfn.results["tok"][:2] == ("failure", "RuntimeError")
+    assert sqs.deleted == [msg["ReceiptHandle"]]
@@ -0,0 +1,94 @@
+import script_cache
+from harness import stubs
+
+PARAMS = script_cache.params_key("model", 0.7, 1200, "v1")
+
+
+def test_fingerprint_ignores_case_spacing_and_punctuation():
+    assert (script_cache.fingerprint("How to Buy  REITs?", PARAMS)
+            == script_cache.fingerprint("how to buy reits", PARAMS))
+    assert (script_cache.fingerprint("how to buy reits", PARAMS)
+            != script_cache.fingerprint("how to buy reits", script_cache.params_key("model", 0.2, 1200, "v1")))
+
+
+def test_similarity_of_rewordings_and_question_words():
+    index = script_cache.TopicIndex()
+    index.add("How to buy REITs for beginners", {"topic": "a"})
+    score, entry = index.nearest("how to buy a REIT for beginners")
+    assert entry == {"topic": "a"} and score > 0.99
+    # A different question about the same subject is not a duplicate.
+    score, _ = index.nearest("Why buy REITs")
+    assert score < 0.85
+
+
+def test_empty_index_and_stopword_only_topic():
+    index = script_cache.TopicIndex()
+    assert index.nearest("anything") == (0.0, None)
+    index.add("index funds", {"topic": "b"})
+    assert index.nearest("the and of") == (0.0, None)
+
+
+def test_numpy_and_pure_python_scores_agree(monkeypatch):
+    topics = ["dividend investing basics", "how to buy index funds", "why bonds fall when rates rise"]
+    query = "index fund buying guide"
+    fast = script_cache.TopicIndex()
+    for t in topics:
+        fast.add(t, {"topic": t})
+    s1, e1 = fast.nearest(query)
+    monkeypatch.setattr(script_cache, "np", None)
+    slow = script_cache.TopicIndex()
+    for t in topics:
+        slow.add(t, {"topic": t})
+    s2, e2 = slow.nearest(query)
+    assert e1 == e2
+    assert abs(s1 - s2) < 1e-5
+
+
+def test_cache_round_trip_and_near_duplicate_lookup_across_containers():
+    s3 = stubs.FakeS3()
+    writer = script_cache.ScriptCache(s3, "media")
+    fp = script_cache.fingerprint("How to buy REITs", PARAMS)
+    assert writer.get_exact(fp) is None
+    writer.put(fp, "How to buy REITs", "script text", "j1", PARAMS)
+    assert writer.get_exact(fp)["script"] == "script text"
+
+    # A second container sees the entry through the log, only for the same params.
+    reader = script_cache.ScriptCache(s3, "media")
+    score, entry = reader.nearest("how to buy a REIT", PARAMS)
+    assert entry["fp"] == fp and score > 0.9
+    assert reader.nearest("how to buy a REIT", "other-params") == (0.0, None)
+
+    # Entries written later are picked up by the next lookup, even within the
+    # same second as the newest key already seen (keys then sort by fingerprint).
+    fp2 = script_cache.fingerprint("Bond ladders explained", PARAMS)
+    writer.put(fp2, "Bond ladders explained", "other", "j2", PARAMS)
+    assert reader.nearest("bond ladder explained", PARAMS)[1]["fp"] == fp2
+
+
+def test_compacted_snapshot_is_read_with_the_log_after_it(monkeypatch):
+    monkeypatch.setattr(script_cache, "COMPACT_EVERY", 2)
+    s3 = stubs.FakeS3()
+    cache = script_cache.ScriptCache(s3, "media")
+    for i, topic in enumerate(["alpha topic", "beta topic", "gamma topic"]):
+        cache.put(script_cache.fingerprint(topic, PARAMS), topic, topic, f"j{i}", PARAMS)
+    cache.nearest("alpha topic", PARAMS)
+    assert ("media", "cache/scripts/index.json") in s3.objects
+
+    fresh = script_cache.ScriptCache(s3, "media")
+    assert fresh.nearest("gamma topic", PARAMS)[1]["topic"] == "gamma topic"
+    assert len(fresh._indexes[PARAMS]) == 3
+
+
+def test_default_cache_miss_skips_the_near_duplicate_index(monkeypatch):
+    from harness.replay import ReplayEnv, _Context
+
+    env = ReplayEnv(words=300)
+    svc = env.services
+    assert svc.SCRIPT_NEAR_DUP == "off"
+
+    def nearest(*args, **kwargs):
+        raise AssertionError("near-duplicate index read on a cache miss")
+
+    monkeypatch.setattr(svc.script_cache.ScriptCache, "nearest", nearest)
+    out = svc.handler({"jobId": "miss-1", "topic": "Dividend growth investing"}, _Context("scriptFn"))
+    assert out["ok"] and out["source"] == "bedrock"
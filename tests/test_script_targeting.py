@@ -0,0 +1,73 @@
+import pytest
+
+from harness.replay import BUCKET, ReplayEnv, _Context
+
+
+@pytest.fixture
+def env(monkeypatch):
+    env = ReplayEnv(words=300)
+    svc = env.services
+    # A brief with no duration phrase, as after someone edits the deployed prompt.
+    monkeypatch.setattr(svc, "_script_brief", ("Write a video script about the topic.", "file-test"))
+    return env
+
+
+def _run(env, fn, job):
+    return env.services.handler(job, _Context(fn))
+
+
+def _prompts(env):
+    return [r["body"]["messages"][0]["content"] for r in env.bedrock.requests]
+
+
+def _script_artifact(env, job_id):
+    svc = env.services
+    return svc.job_manifest.load(env.s3, BUCKET, job_id, env.table)[0]["artifacts"]["script"]
+
+
+def _model_written(env):
+    return (BUCKET, env.services.speech_rate.MODEL_KEY) in env.s3.objects
+
+
+def test_single_draft_needs_no_target_or_calibration(env, monkeypatch):
+    svc = env.services
+
+    def no_calibration(voices):
+        raise AssertionError("the speech-rate model was read")
+
+    monkeypatch.setattr(svc, "_speech_coefs", no_calibration)
+    job = {"jobId": "plain-1", "topic": "Index funds explained"}
+    out = _run(env, "scriptFn", job)
+    assert out["ok"] and out["source"] == "bedrock" and "inRange" not in out
+    assert env.bedrock.calls["invoke_model"] == 1
+    assert "Length:" not in _prompts(env)[0]
+    assert "targetSec" not in _script_artifact(env, "plain-1")
+
+    # TTS of an untargeted script leaves the shared calibration object alone.
+    monkeypatch.setattr(svc, "TTS_CAPTIONS", False)
+    _run(env, "ttsFn", job)
+    assert not _model_written(env)
+
+
+def test_targeting_without_a_range_falls_back_to_one_plain_draft(env, monkeypatch):
+    monkeypatch.setattr(env.services, "SCRIPT_TARGET_SEC", "")
+    out = _run(env, "scriptFn", {"jobId": "fallback-1", "topic": "Bond ladders", "scriptCandidates": 3})
+    assert out["ok"] and "inRange" not in out
+    assert env.bedrock.calls["invoke_model"] == 1
+    assert "Length:" not in _prompts(env)[0]
+
+
+def test_targeted_scripts_are_cached_apart_and_calibrate_tts(env, monkeypatch):
+    svc = env.services
+    monkeypatch.setattr(svc, "SCRIPT_TARGET_SEC", "100-140")
+    plain = _run(env, "scriptFn", {"jobId": "t-0", "topic": "REIT basics"})
+    job = {"jobId": "t-1", "topic": "REIT basics", "scriptCandidates": 3}
+    out = _run(env, "scriptFn", job)
+    # Not served from the untargeted entry: the range is part of the cache params.
+    assert plain["source"] == "bedrock" and out["source"] == "bedrock"
+    assert out["targetSec"] == [100.0, 140.0] and out["drafts"] >= 3
+    assert all("Length:" in p for p in _prompts(env)[1:])
+    assert _script_artifact(env, "t-1")["targetSec"] == [100.0, 140.0]
+
+    _run(env, "ttsFn", job)
+    assert _model_written(env)
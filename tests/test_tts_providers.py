@@ -0,0 +1,153 @@
+import socket
+import threading
+import time
+import urllib.error
+
+import pytest
+
+import tts_providers
+from tts_providers import LatencyStats
+
+
+class FakeProvider:
+    """Returns ``len(text)`` bytes of PCM after ``delays`` (one per call, the last repeats)."""
+
+    rates = ("16000",)
+
+    def __init__(self, name="fake", delays=(0.0,), voices=("Matthew",), fail=None):
+        self.name, self.delays, self.voices, self.fail = name, list(delays), voices, fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def speaks(self, voice):
+        return voice in self.voices
+
+    def synthesize(self, text, voice, sample_rate, engine=None):
+        with self._lock:
+            delay = self.delays[min(self.calls, len(self.delays) - 1)]
+            self.calls += 1
+        time.sleep(delay)
+        if self.fail:
+            raise self.fail
+        return b"\0" * len(text)
+
+
+def _warm(stats, name, seconds, n=5):
+    for _ in range(n):
+        stats.record(name, seconds, tts_providers.NORM_CHARS)
+
+
+def test_stats_need_min_samples_and_normalise_per_1000_chars():
+    stats = LatencyStats(min_samples=3)
+    stats.record("p", 1.0, 100)     # short chunk counts as NORM_CHARS: 2.0 s per 1000
+    stats.record("p", 4.0, 2000)    # 2.0 s per 1000
+    assert stats.quantile("p", 0.95) is None
+    assert stats.deadline("p", 1000, cold=7.0) == 7.0
+    stats.record("p", 6.0, 1000)
+    assert stats.quantile("p", 0.5) == 2.0 and stats.quantile("p", 0.95) == 6.0
+    assert stats.deadline("p", 2000) == 12.0
+    assert stats.summary() == {"p": {"n": 3, "p50": 2.0, "p95": 6.0}}
+
+
+def test_stats_window_forgets_old_samples():
+    stats = LatencyStats(window=3, min_samples=1)
+    _warm(stats, "p", 10.0, n=3)
+    _warm(stats, "p", 1.0, n=3)
+    assert stats.quantile("p", 0.95) == 2.0
+
+
+def test_pick_prefers_measured_fast_provider_and_honours_preference():
+    slow, fast, cold = FakeProvider("slow"), FakeProvider("fast"), FakeProvider("cold")
+    stats = LatencyStats(min_samples=2)
+    _warm(stats, "slow", 2.0)
+    _warm(stats, "fast", 0.5)
+    assert tts_providers.pick([cold, slow, fast], "Matthew", "16000", stats) is fast
+    assert tts_providers.pick([cold, slow, fast], "Matthew", "16000", stats, preferred="cold") is cold
+    assert tts_providers.pick([cold], "Matthew", "16000", stats) is cold
+    with pytest.raises(ValueError):
+        tts_providers.pick([slow], "Amy", "16000", stats)
+    with pytest.raises(ValueError):
+        tts_providers.pick([slow], "Matthew", "16000", stats, preferred="elevenlabs")
+    with pytest.raises(ValueError):
+        tts_providers.pick([slow], "Matthew", "24000", stats)
+
+
+def test_no_hedge_until_warm():
+    provider = FakeProvider(delays=(0.2,))
+    pcm, hedged = tts_providers.synthesize(provider, "hello", "Matthew", "16000", LatencyStats(), hedge=True)
+    assert pcm == b"\0" * 5 and not hedged and provider.calls == 1
+
+
+def test_hedge_past_p95_and_first_finisher_wins():
+    provider = FakeProvider(delays=(1.0, 0.0))   # first request stalls, the backup is instant
+    stats = LatencyStats()
+    _warm(stats, provider.name, 0.05)
+    t0 = time.perf_counter()
+    pcm, hedged = tts_providers.synthesize(provider, "hello", "Matthew", "16000", stats)
+    assert hedged and pcm == b"\0" * 5 and provider.calls == 2
+    assert time.perf_counter() - t0 < 0.5
+
+
+def test_hedge_falls_back_to_the_other_request_when_the_first_finisher_fails():
+    class FlakyBackup(FakeProvider):
+        def synthesize(self, text, voice, sample_rate, engine=None):
+            with self._lock:
+                self.calls += 1
+                n = self.calls
+            if n == 2:
+                raise RuntimeError("backup failed")
+            time.sleep(0.3)
+            return b"ok"
+
+    provider = FlakyBackup()
+    stats = LatencyStats()
+    _warm(stats, provider.name, 0.01)
+    assert tts_providers.synthesize(provider, "hello", "Matthew", "16000", stats) == (b"ok", True)
+
+
+def test_cold_deadline_hedges_before_stats_exist():
+    provider = FakeProvider(delays=(1.0, 0.0))
+    pcm, hedged = tts_providers.synthesize(provider, "hi", "Matthew", "16000", LatencyStats(), cold=0.05)
+    assert hedged and provider.calls == 2
+
+
+@pytest.mark.parametrize("error", [urllib.error.URLError("connection refused"), socket.timeout("timed out"),
+                                   ConnectionResetError("reset")])
+def test_elevenlabs_network_errors_become_runtime_errors(monkeypatch, error):
+    def urlopen(req, timeout=None):
+        raise error
+
+    monkeypatch.setattr(tts_providers.urllib.request, "urlopen", urlopen)
+    provider = tts_providers.ElevenLabsProvider("key", voices={"Matthew": "a" * 20})
+    with pytest.raises(RuntimeError, match="ElevenLabs request failed"):
+        provider.synthesize("hello", "Matthew", "16000")
+    with pytest.raises(ValueError):
+        provider.synthesize("hello", "Amy", "16000")
+
+
+def test_narration_falls_back_to_the_next_provider(monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "TTS_CAPTIONS", False)
+    monkeypatch.setattr(app, "TTS_HEDGE", False)
+    down = FakeProvider("elevenlabs", fail=RuntimeError("ElevenLabs request failed: timed out"))
+    polly = FakeProvider("polly")
+    used, (wav, seconds, hedged, cues) = app._narrate(["Hello there.", "Bye."], "Matthew", "neural", "16000",
+                                                      down, [down, polly])
+    assert used is polly and down.calls == 1 and polly.calls == 2
+    assert wav[:4] == b"RIFF" and cues == []
+
+    monkeypatch.setattr(app, "TTS_FALLBACK", False)
+    with pytest.raises(RuntimeError, match="elevenlabs synth failed on chunk 1/2"):
+        app._narrate(["Hello there.", "Bye."], "Matthew", "neural", "16000", down, [down, polly])
+
+
+def test_narration_does_not_hedge_unless_enabled(monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "TTS_CAPTIONS", False)
+    monkeypatch.setattr(app, "TTS_HEDGE_COLD_SEC", 0.01)
+    assert app.TTS_HEDGE is False
+    slow = FakeProvider("polly", delays=(0.1,))
+    used, (wav, seconds, hedged, cues) = app._narrate(["Hello there."], "Matthew", "neural", "16000", slow, [slow])
+    assert not hedged and slow.calls == 1
@@ -0,0 +1,95 @@
+import pytest
+from googleapiclient.errors import HttpError
+
+from harness import stubs
+from harness.replay import _load
+
+SRT = "1\n00:00:00,500 --> 00:00:02,000\nHello.\n\n2\n00:59:59,900 --> 01:00:01,250\nBye.\n"
+
+
+class _Resp(dict):
+    def __init__(self, status):
+        super().__init__()
+        self.status, self.reason = status, "Forbidden"
+
+
+class _DeniedYouTube(stubs.FakeYouTube):
+    def __init__(self, content):
+        super().__init__()
+        self.content = content
+
+    def captions(self):
+        content = self.content
+
+        class Captions:
+            def insert(self, **kwargs):
+                def run():
+                    raise HttpError(_Resp(403), content)
+                return stubs._FakeExecute(run)
+        return Captions()
+
+
+@pytest.fixture
+def up(monkeypatch):
+    mod = _load("test_upload_app", "lambdas/uploadFn/app.py")
+    s3 = stubs.FakeS3()
+    s3.put_object(Bucket="media", Key="jobs/j1/captions.srt", Body=SRT.encode())
+    monkeypatch.setattr(mod, "S3", s3)
+    monkeypatch.setattr(mod, "MEDIA_BUCKET", "media")
+    monkeypatch.setattr(mod, "JOBS_TABLE", None)
+    monkeypatch.setattr(mod, "MediaFileUpload", stubs.FakeMediaFileUpload)
+    return mod
+
+
+def _manifest(intro=None):
+    out = {"key": "jobs/j1/out.mp4"}
+    if intro:
+        out["introSec"] = intro
+    return {"artifacts": {"captions": {"key": "jobs/j1/captions.srt", "language": "en"}, "out": out}}
+
+
+def _youtube():
+    yt = stubs.FakeYouTube()
+    yt.videos_inserted.append({"id": "v1"})
+    return yt
+
+
+def test_shift_srt_moves_every_stamp(up):
+    shifted = up._shift_srt(SRT, 4.25)
+    assert "00:00:04,750 --> 00:00:06,250" in shifted
+    assert "01:00:04,150 --> 01:00:05,500" in shifted
+    assert up._shift_srt(SRT, 0) == SRT
+
+
+def test_captions_are_shifted_by_the_intro(up):
+    yt = _youtube()
+    result = up._publish_captions("j1", "v1", _manifest(intro=3.5), {}, yt)
+    text = yt.caption_tracks[result["captionId"]]["text"]
+    assert text.startswith("1\n00:00:04,000 --> 00:00:05,500\nHello.")
+
+    yt = _youtube()
+    result = up._publish_captions("j1", "v1", _manifest(), {}, yt)
+    assert yt.caption_tracks[result["captionId"]]["text"] == SRT
+
+
+def test_published_track_is_skipped_only_for_the_same_file_and_intro(up):
+    etag = up.S3.head_object(Bucket="media", Key="jobs/j1/captions.srt")["ETag"]
+    record = {"videoId": "v1", "videoCaptionId": "cap-1", "videoCaptionsEtag": f"{etag}+3.5"}
+    assert up._publish_captions("j1", "v1", _manifest(intro=3.5), record, _youtube()) == {
+        "captionId": "cap-1", "captionsSkipped": True}
+    yt = _youtube()
+    yt.caption_tracks["cap-1"] = {"snippet": {"videoId": "v1"}, "text": ""}
+    up._publish_captions("j1", "v1", _manifest(intro=5), record, yt)
+    assert yt.calls["captions.update"] == 1 and yt.caption_tracks["cap-1"]["text"].startswith("1\n00:00:05,500")
+
+
+def test_missing_force_ssl_scope_skips_captions(up, capsys):
+    yt = _DeniedYouTube(b'{"error": {"code": 403, "message": "Request had insufficient authentication scopes.", '
+                        b'"errors": [{"reason": "insufficientPermissions"}]}}')
+    assert up._publish_captions("j1", "v1", _manifest(), {}, yt) == {"captionsError": "missing youtube.force-ssl scope"}
+    assert "youtube.force-ssl" in capsys.readouterr().out
+
+    # Any other 403 is reported as it is.
+    yt = _DeniedYouTube(b'{"error": {"code": 403, "message": "Forbidden", "errors": [{"reason": "forbidden"}]}}')
+    result = up._publish_captions("j1", "v1", _manifest(), {}, yt)
+    assert "force-ssl" not in result["captionsError"]